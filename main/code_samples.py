@@ -53,6 +53,46 @@ start
 end
 '''
 
+test_scoping = '''
+start
+  Declarations
+    num x = 1
+  later(1)
+  shadow(2)
+  output x
+end
+
+later(num k)
+  Declarations
+    num a = x + k
+    num x = 10
+    num b = x * 2
+  output a, x, b
+return
+
+shadow(num k)
+  Declarations
+    num x = 5
+  for x = 0 to k step 1
+    output x
+  endfor
+  set x = 99
+  for x = 0 to k step 1
+    output x
+  endfor
+  output x
+return
+'''
+
+test_unset = '''
+start
+  Declarations
+    num y
+  output "before"
+  output y
+end
+'''
+
 sample = '''
 start
   Declarations
@@ -0,0 +1,674 @@
+from time import perf_counter
+from statistics import median
+import tracemalloc
+from pslexer import lex, scan, TokenStore
+from psparser import KEYWORDS, KEYOPS, Parser, Postparser, INFIX_PRECEDENCE, PREFIX_PRECEDENCE, INFIX_TREE, PREFIX_TREE
+from psincremental import IncrementalParser
+from psstream import stream_tree
+from psparallel import parallel_tree
+from psgrammar import CompiledParser
+from psfused import FusedParser, CompiledFusedParser, fused_tree
+from psiterative import iterative_tree, IterativeTypeChecker
+from pstyper import TypeChecker
+from psinterpreter import Interpreter
+from psresolve import UNBOUND
+import pstranspile
+import psvm
+import psoptimize
+from psmagic import magic_parse_tree
+from psnodes import Node, to_nodes, to_dicts
+import psflat
+import pscache
+import json
+import os
+import tempfile
+
+'''
+rough throughput measurements for the front end and interpreter
+run this file directly; every bench_* function prints its own table
+'''
+
+PROCEDURE_TEMPLATE = '''
+proc{i}(num arg)
+  Declarations
+    num SCALE = {i}
+    num total = 0
+    num values[8]
+  for index = 0 to 7 step 1
+    set values[index] = index * SCALE + arg
+  endfor
+  while total < 100 AND arg > 0
+    set total = total + values[total % 8] + 1
+  endwhile
+  case total % 3
+    0: output "zero", {i}
+    1: output "one", {i}
+    default: output "many", {i}, total
+  endcase
+return
+'''
+START_TEMPLATE = '''
+start
+  Declarations
+    num count = 0
+  do
+    set count = count + 1
+  until count >= 3
+{calls}
+end
+'''
+
+def generate_program(procedures: int) -> str:
+    '''a syntactically & type-correct program with the given number of procedures; roughly 19 lines each'''
+    calls = "\n".join(f"  proc{i}(count)" for i in range(procedures))
+    parts = [START_TEMPLATE.format(calls=calls)]
+    for i in range(procedures):
+        parts.append(PROCEDURE_TEMPLATE.format(i=i))
+    return "".join(parts)
+
+LOOP_TEMPLATE = '''
+start
+  Declarations
+    num N = {iterations}
+    num SIZE = 16
+    num counts[SIZE]
+    num total = 0
+    num i = 0
+    num j
+    float mean = 0.0
+  for j = 0 to SIZE step 1
+    set counts[j] = 0
+  endfor
+  while i < N
+    for j = 0 to 10 step 1
+      set total = total + i * j % 7 - j / 3
+    endfor
+    set counts[i % SIZE] = counts[i % SIZE] + 1
+    case i % 4
+      0: tally(i)
+      default: set total = total - 1
+    endcase
+    set i = i + 1
+  endwhile
+  do
+    set i = i - 3
+    set mean = mean + 0.5
+  until i < 0
+  output total, counts, mean
+end
+
+tally(num value)
+  Declarations
+    num half
+  set half = value / 2
+  set total = total + half
+return
+'''
+
+def generate_loops(iterations: int) -> str:
+    '''a loop- and call-heavy program whose outer loop runs ITERATIONS times'''
+    return LOOP_TEMPLATE.format(iterations=iterations)
+
+class QuietInterpreter(Interpreter):
+    '''an Interpreter whose console output goes nowhere'''
+    @classmethod
+    def canonical_print(cls, *args):
+        pass
+
+STEPS_TEMPLATE = '''start
+  Declarations
+    num last = 0
+    float f = 0.0
+  {loop}
+end
+'''
+STEPS_LOOPS = {
+    "up": "for i = 0 to {iterations} step 1\n    set last = i\n  endfor",
+    "down": "for i = {iterations} to 0 step -1\n    set last = i\n  endfor",
+    "float": "for g = 0.0 to {iterations}.0 step 1.0\n    set f = g\n  endfor",
+    "body": "for i = 0 to {iterations} step 1\n    set last = i * 3 + 1\n    set last = (last - i) * 2\n    set f = f + 0.5\n    set last = last + i\n  endfor",
+}
+
+def generate_steps(kind: str, iterations: int) -> str:
+    '''a program of one for-step loop (of STEPS_LOOPS KIND) with ITERATIONS steps'''
+    return STEPS_TEMPLATE.format(loop=STEPS_LOOPS[kind].format(iterations=iterations))
+
+class SteppingInterpreter(QuietInterpreter):
+    '''a QuietInterpreter running every for-step loop as it used to: one index multiplication (and negation) per step'''
+    def do_for_step(self, stmt):
+        start_val, stop_val, step_val = (self.eval_expr(part) for part in stmt["range"])
+        slot = self.addresses[id(stmt)]
+        if step_val == 0:
+            raise ZeroDivisionError("step value cannot be zero")
+        if (start_val == stop_val) or (start_val < stop_val) != (0 < step_val):
+            return
+        negative = step_val < 0
+        if negative:
+            step_val, start_val, stop_val = -step_val, -start_val, -stop_val
+        index = 0
+        parameter = start_val
+        current_local = self.var_stack[-1]
+        while parameter < stop_val:
+            if negative:
+                parameter = -parameter
+            current_local[slot] = parameter
+            self.do_body(stmt["body"])
+            index += 1
+            parameter = start_val + step_val * index
+        current_local[slot] = UNBOUND
+
+INVARIANT_TEMPLATE = '''start
+  Declarations
+    num width = {size}
+    num total = 0
+    string name = "invariant"
+    num cells[{cells}]
+  for row = 0 to width step 1
+    for column = 0 to width step 1
+      set cells[row * width + column] = row * (width + 1) + length(name) * 2
+      set total = total + (width * width - 1) % 7
+    endfor
+  endfor
+  output total, cells[width]
+end
+'''
+
+def generate_invariants(size: int) -> str:
+    '''a program of two nested for-step loops over SIZE steps each, full of expressions the inner loop doesn't change'''
+    return INVARIANT_TEMPLATE.format(size=size, cells=size*size)
+
+CALLS_TEMPLATE = '''start
+  Declarations
+    num SCALE = 3
+    num total = 0
+  for i = 0 to {iterations} step 1
+    advance(i)
+  endfor
+  output total
+end
+
+advance(num value)
+  Declarations
+    num LIMIT = SCALE * 4 + 1
+    num OFFSET = LIMIT - SCALE
+    string LABEL = "step"
+    float ratio = 0.5
+    num scratch[4]
+    num result
+  set scratch[0] = value
+  set result = value % LIMIT + OFFSET
+  set total = total + result
+return
+'''
+
+def generate_calls(iterations: int) -> str:
+    '''a program calling a procedure with constant, garbage and uninitialized declarations ITERATIONS times'''
+    return CALLS_TEMPLATE.format(iterations=iterations)
+
+class RebuildingInterpreter(QuietInterpreter):
+    '''a QuietInterpreter building every call's frame as it used to: every declaration's type and value, every time'''
+    def call_function(self, code, args):
+        layout = self.resolution.procedures[code["name"]]
+        new_local = layout.frame()
+        for pair, arg in zip(code["args"], args):
+            if pair["suffixes"]:
+                self.build_type(pair)
+            new_local[layout.slots[pair["name"]]] = arg
+        self.var_stack.append(new_local)
+        self.layout_stack.append(layout)
+        self.read_declarations(code["body"]["declarations"])
+        self.do_body(code["body"])
+        self.var_stack.pop(-1)
+        self.layout_stack.pop(-1)
+
+def generate_nested(depth: int) -> str:
+    '''a program whose only statement sits DEPTH alternating if/while bodies deep'''
+    lines = ["start", "  Declarations", "    num x = 0"]
+    for level in range(depth):
+        lines.append("  " * (level+1) + ("if x < 1 then" if level % 2 == 0 else "while x < 1"))
+    lines.append("  " * (depth+1) + "set x = x + 1")
+    for level in reversed(range(depth)):
+        lines.append("  " * (level+1) + ("endif" if level % 2 == 0 else "endwhile"))
+    lines.append("end")
+    return "\n".join(lines) + "\n"
+
+def timed(function, *args, repeat: int=3) -> tuple[float, object]:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        begin = perf_counter()
+        result = function(*args)
+        best = min(best, perf_counter() - begin)
+    return best, result
+
+def timed_pair(first, second, repeat: int=15) -> tuple[float, float, float]:
+    '''median times of FIRST and SECOND, run alternately so drift hits both alike, and the median of their per-round ratios'''
+    times = ([], [])
+    for _ in range(repeat):
+        for function, kept in zip((first, second), times):
+            begin = perf_counter()
+            function()
+            kept.append(perf_counter() - begin)
+    return median(times[0]), median(times[1]), median(a / b for a, b in zip(*times))
+
+def bench_lexers(sizes=(100, 1000, 3000)):
+    print("lexer throughput (tokens/second)")
+    print(f"{'lines':>8} {'tokens':>8} {'lex':>12} {'scan':>12} {'speedup':>8}")
+    for size in sizes:
+        code = generate_program(size)
+        old_time, old_tokens = timed(lambda: list(lex(code, KEYWORDS, KEYOPS)))
+        new_time, new_tokens = timed(lambda: list(scan(code, KEYWORDS, KEYOPS)))
+        if old_tokens != new_tokens:
+            raise AssertionError("'scan' diverged from 'lex'")
+        count = len(new_tokens)
+        print(f"{code.count(chr(10)):>8} {count:>8} {count/old_time:>12.0f} {count/new_time:>12.0f} {old_time/new_time:>7.2f}x")
+
+def traced_peak(function, *args) -> tuple[int, object]:
+    '''bytes still allocated by the result of FUNCTION, measured with tracemalloc'''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+def bench_token_store(sizes=(1000, 3000)):
+    print("token storage: list of tuples vs packed TokenStore")
+    print(f"{'tokens':>8} {'list KiB':>10} {'packed KiB':>11} {'ratio':>6} {'parse list':>11} {'parse packed':>13}")
+    for size in sizes:
+        code = generate_program(size)
+        list_bytes, tokens = traced_peak(lambda: list(scan(code, KEYWORDS, KEYOPS)))
+        packed_bytes, _ = traced_peak(lambda: TokenStore.scan(code, KEYWORDS, KEYOPS))
+        list_time, _ = timed(Parser.parse, code, False, repeat=1)
+        packed_time, _ = timed(Parser.parse, code, True, repeat=1)
+        print(f"{len(tokens):>8} {list_bytes/1024:>10.0f} {packed_bytes/1024:>11.0f} {list_bytes/packed_bytes:>5.1f}x {list_time:>10.2f}s {packed_time:>12.2f}s")
+
+def bench_incremental(sizes=(100, 1000, 4000)):
+    print("edit latency: full Parser.parse vs IncrementalParser.edit (rename inside the last procedure)")
+    print(f"{'lines':>8} {'full':>10} {'edit':>10} {'speedup':>8}")
+    for size in sizes:
+        code = generate_program(size)
+        incremental = IncrementalParser(code)
+        where = code.rindex("total + values")
+        full_time, expected = timed(Parser.parse, code[:where] + "totals" + code[where+5:], repeat=1)
+        def edit():
+            incremental.edit(where, where+5, "totals")
+            result = incremental.result
+            incremental.edit(where, where+6, "total")
+            return result
+        edit_time, result = timed(edit)
+        if result != expected:
+            raise AssertionError("incremental result diverged from Parser.parse")
+        print(f"{code.count(chr(10)):>8} {full_time*1000:>8.1f}ms {edit_time/2*1000:>8.2f}ms {full_time/(edit_time/2):>7.0f}x")
+
+def traced_max(function, *args) -> tuple[int, object]:
+    '''peak bytes allocated while FUNCTION runs, measured with tracemalloc'''
+    tracemalloc.start()
+    result = function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, result
+
+def bench_stream(sizes=(300, 1000)):
+    print("peak memory of the front end: whole file vs stream_tree")
+    print(f"{'lines':>8} {'whole MiB':>10} {'stream MiB':>11} {'tree MiB':>9}")
+    for size in sizes:
+        code = generate_program(size)
+        with tempfile.NamedTemporaryFile("w", suffix=".ps", delete=False) as file:
+            file.write(code)
+        try:
+            def whole():
+                with open(file.name, "r") as source:
+                    text = source.read()
+                return Postparser(0).p_file(Parser.parse(text)[2])
+            whole_peak, expected = traced_max(whole)
+            stream_peak, tree = traced_max(stream_tree, file.name)
+            tree_bytes, _ = traced_peak(lambda: Postparser(0).p_file(Parser.parse(code)[2]))
+        finally:
+            os.remove(file.name)
+        if tree != expected:
+            raise AssertionError("stream_tree diverged from Parser.parse + Postparser")
+        print(f"{code.count(chr(10)):>8} {whole_peak/2**20:>10.1f} {stream_peak/2**20:>11.1f} {tree_bytes/2**20:>9.1f}")
+
+def bench_parallel(size=3000, workers=(1, 2, 4, 8)):
+    code = generate_program(size)
+    print(f"parallel front end, {code.count(chr(10))} lines, {os.cpu_count()} cpus available")
+    serial_time, expected = timed(lambda: Postparser(0).p_file(Parser.parse(code)[2]), repeat=1)
+    print(f"{'workers':>8} {'seconds':>8} {'speedup':>8}")
+    print(f"{'serial':>8} {serial_time:>8.2f} {1:>7.2f}x")
+    for count in workers:
+        parallel_time, tree = timed(parallel_tree, code, count, repeat=1)
+        if tree != expected:
+            raise AssertionError("parallel_tree diverged from the serial front end")
+        print(f"{count:>8} {parallel_time:>8.2f} {serial_time/parallel_time:>7.2f}x")
+
+class AmbiguousParser(Parser):
+    '''
+    both alternatives of 'nest' begin with 'inner', so plain backtracking parses every level twice per
+    enclosing attempt: 2**depth work. the real GENERAL table has no such overlap (see bench_packrat)
+    '''
+    GENERAL = {
+        "nest": ("option", {
+            "comma": ("all", [("rule", "inner"), ("type", ",")]),
+            "semicolon": ("all", [("rule", "inner"), ("type", ";")]),
+        }),
+        "inner": ("option", {
+            "group": ("all", [("type", "("), ("rule", "nest"), ("type", ")")]),
+            "leaf": ("type", "name"),
+        }),
+    }
+
+def bench_packrat(depths=(8, 12, 16, 18), size=1000):
+    print("packrat memoization on a grammar with overlapping alternatives")
+    print(f"{'depth':>6} {'plain':>10} {'packrat':>10}")
+    for depth in depths:
+        tokens = list(scan("(" * depth + "a ;" + ") ;" * depth, KEYWORDS, KEYOPS))
+        plain_time, expected = timed(lambda: AmbiguousParser(tokens).p_general(0, ("rule", "nest")), repeat=1)
+        packrat_time, result = timed(lambda: AmbiguousParser(tokens, True).p_general(0, ("rule", "nest")), repeat=1)
+        if result != expected:
+            raise AssertionError("packrat result diverged")
+        print(f"{depth:>6} {plain_time*1000:>8.1f}ms {packrat_time*1000:>8.2f}ms")
+    code = generate_program(size)
+    plain_time, expected = timed(Parser.parse, code, False, False, repeat=1)
+    packrat_time, result = timed(Parser.parse, code, False, True, repeat=1)
+    if result != expected:
+        raise AssertionError("packrat result diverged")
+    print(f"the real grammar never re-runs a named rule at the same index; on {code.count(chr(10))} lines:")
+    print(f"plain {plain_time:.2f}s, packrat {packrat_time:.2f}s")
+
+def bench_compiled(sizes=(300, 1000)):
+    print("parsing pre-lexed tokens: interpreted p_general vs compiled GENERAL (medians of alternating runs)")
+    print(f"{'lines':>8} {'Parser':>8} {'Compiled':>9} {'speedup':>8} {'packrat speedup':>16}")
+    for size in sizes:
+        code = generate_program(size)
+        tokens = list(scan(code, KEYWORDS, KEYOPS))
+        expected = Parser(tokens).p_root(0, "file")
+        if CompiledParser(tokens).p_root(0, "file") != expected or CompiledParser(tokens, True).p_root(0, "file") != expected:
+            raise AssertionError("compiled parser diverged")
+        plain_time, compiled_time, ratio = timed_pair(lambda: Parser(tokens).p_root(0, "file"), lambda: CompiledParser(tokens).p_root(0, "file"))
+        _, _, packrat_ratio = timed_pair(lambda: Parser(tokens, True).p_root(0, "file"), lambda: CompiledParser(tokens, True).p_root(0, "file"))
+        print(f"{code.count(chr(10)):>8} {plain_time:>7.2f}s {compiled_time:>8.2f}s {ratio:>7.2f}x {packrat_ratio:>15.2f}x")
+
+class OrderedParser(Parser):
+    '''option rules tried in table order, as before FIRST-set dispatch'''
+    DISPATCH = {}
+
+class CountingParser(Parser):
+    '''counts p_general calls and how many of them fail'''
+    def __init__(self, src):
+        super().__init__(src)
+        self.calls = 0
+        self.failed = 0
+    def p_general(self, index, rule):
+        self.calls += 1
+        result = super().p_general(index, rule)
+        self.failed += not result[0]
+        return result
+
+class CountingOrderedParser(CountingParser):
+    DISPATCH = {}
+
+def bench_dispatch(size=1000):
+    print("option rules: ordered trial vs FIRST-set dispatch")
+    code = generate_program(size)
+    tokens = list(scan(code, KEYWORDS, KEYOPS))
+    ordered, dispatched = CountingOrderedParser(tokens), CountingParser(tokens)
+    if ordered.p_root(0, "file") != dispatched.p_root(0, "file"):
+        raise AssertionError("dispatch diverged from ordered trial")
+    ordered_time, _ = timed(lambda: OrderedParser(tokens).p_root(0, "file"), repeat=5)
+    dispatched_time, _ = timed(lambda: Parser(tokens).p_root(0, "file"), repeat=5)
+    compiled_time, _ = timed(lambda: CompiledParser(tokens).p_root(0, "file"), repeat=5)
+    print(f"{'':>10} {'calls':>9} {'failed':>9} {'time':>7}")
+    print(f"{'ordered':>10} {ordered.calls:>9} {ordered.failed:>9} {ordered_time:>6.2f}s")
+    print(f"{'dispatch':>10} {dispatched.calls:>9} {dispatched.failed:>9} {dispatched_time:>6.2f}s")
+    print(f"{'compiled':>10} {'':>9} {'':>9} {compiled_time:>6.2f}s")
+
+def bench_fused(sizes=(300, 1000)):
+    print("pre-lexed tokens to the final tree: Parser + Postparser vs fused parsing")
+    print(f"{'lines':>8} {'parser':>9} {'two-pass':>9} {'fused':>7} {'peak two-pass':>14} {'peak fused':>11}")
+    for size in sizes:
+        code = generate_program(size)
+        tokens = list(scan(code, KEYWORDS, KEYOPS))
+        for name, plain, fused in (("plain", Parser, FusedParser), ("compiled", CompiledParser, CompiledFusedParser)):
+            two_pass = lambda: Postparser(0).p_file(plain(tokens).p_root(0, "file")[2])
+            one_pass = lambda: fused.file_tree(fused(tokens).p_root(0, "file")[2])
+            two_time, expected = timed(two_pass)
+            fused_time, result = timed(one_pass)
+            if result != expected:
+                raise AssertionError("fused parser diverged")
+            two_peak, _ = traced_max(two_pass)
+            fused_peak, _ = traced_max(one_pass)
+            print(f"{code.count(chr(10)):>8} {name:>9} {two_time:>8.2f}s {fused_time:>6.2f}s {two_peak/2**20:>12.1f}MB {fused_peak/2**20:>9.1f}MB")
+
+def bench_iterative(depths=(100, 300, 1000, 3000), size=1000):
+    print("deeply nested bodies: recursive vs iterative parse + type check")
+    print(f"{'depth':>6} {'recursive':>14} {'iterative':>10}")
+    for depth in depths:
+        code = generate_nested(depth)
+        try:
+            recursive_time, _ = timed(lambda: TypeChecker.check_file(fused_tree(code, False)), repeat=1)
+            recursive = f"{recursive_time*1000:>8.1f}ms"
+        except RecursionError:
+            recursive = "RecursionError"
+        iterative_time, _ = timed(lambda: IterativeTypeChecker.check_file(iterative_tree(code)), repeat=1)
+        print(f"{depth:>6} {recursive:>14} {iterative_time*1000:>8.1f}ms")
+    code = generate_program(size)
+    recursive_time, expected = timed(fused_tree, code, False, repeat=1)
+    iterative_time, result = timed(iterative_tree, code, repeat=1)
+    if result != expected:
+        raise AssertionError("iterative parser diverged")
+    print(f"on {code.count(chr(10))} ordinary lines: recursive {recursive_time:.2f}s, iterative {iterative_time:.2f}s")
+
+def bench_magic(lengths=(100, 1000, 10000, 100000)):
+    print("resolving operator chains (t - NOT t * -t ...) with magic_parse_tree")
+    print(f"{'terms':>7} {'time':>9} {'per term':>9}")
+    operators = ["-", "*", "AND", "<", "+", "OR"]
+    for length in lengths:
+        parts = [{"type": "num", "value": 0}]
+        for i in range(1, length):
+            parts.append(operators[i % len(operators)])
+            if i % 3 == 0:
+                parts.append("-" if i % 2 else "NOT")
+            parts.append({"type": "num", "value": i})
+        elapsed, _ = timed(magic_parse_tree, parts, INFIX_PRECEDENCE, PREFIX_PRECEDENCE, INFIX_TREE, PREFIX_TREE)
+        print(f"{length:>7} {elapsed*1000:>7.1f}ms {elapsed/length*1e6:>7.2f}us")
+
+def bench_visitors(sizes=(1000, 3000)):
+    print("post-parse and type-check throughput")
+    print(f"{'lines':>8} {'Postparser':>11} {'TypeChecker':>12} {'nodes/s':>9}")
+    for size in sizes:
+        code = generate_program(size)
+        raw_tree = Parser.parse(code)[2]
+        post_time, tree = timed(lambda: Postparser(0).p_file(raw_tree))
+        check_time, _ = timed(TypeChecker.check_file, tree)
+        nodes = str(tree).count("'type'")
+        print(f"{code.count(chr(10)):>8} {post_time:>10.3f}s {check_time:>11.3f}s {nodes/(post_time+check_time):>9.0f}")
+
+def bench_nodes(sizes=(300, 1000)):
+    print("dict tree vs __slots__ node tree: size, conversion, and reading every field of every node")
+    print(f"{'lines':>8} {'dicts':>10} {'nodes':>10} {'to_nodes':>9} {'to_dicts':>9} {'dict read':>10} {'node read':>10}")
+    def read_dicts(tree):
+        # the string-keyed lookups the interpreter makes
+        if isinstance(tree, list):
+            for item in tree:
+                read_dicts(item)
+        elif isinstance(tree, dict):
+            for key in tree:
+                read_dicts(tree[key])
+    def read_nodes(tree):
+        if isinstance(tree, list):
+            for item in tree:
+                read_nodes(item)
+        elif isinstance(tree, Node):
+            for slot in tree.__slots__:
+                read_nodes(getattr(tree, slot))
+        elif isinstance(tree, dict):
+            for key in tree:
+                read_nodes(tree[key])
+    for size in sizes:
+        code = generate_program(size)
+        dict_bytes, tree = traced_peak(fused_tree, code)
+        node_bytes, nodes = traced_peak(lambda: to_nodes(fused_tree(code)))
+        to_time, _ = timed(to_nodes, tree)
+        back_time, back = timed(to_dicts, nodes)
+        assert back == tree
+        dict_time, _ = timed(read_dicts, tree)
+        node_time, _ = timed(read_nodes, nodes)
+        print(f"{code.count(chr(10)):>8} {dict_bytes/1e6:>8.1f}MB {node_bytes/1e6:>8.1f}MB {to_time:>8.3f}s {back_time:>8.3f}s {dict_time:>9.3f}s {node_time:>9.3f}s")
+    # the TypeChecker and Interpreter read nodes through Node.__getitem__, a python call per field: nodes save memory, not time
+    print("interpreting a loop-heavy program: dict tree vs node tree")
+    print(f"{'iterations':>10} {'dicts':>8} {'nodes':>8} {'slowdown':>9}")
+    for size in (1000, 3000):
+        code = generate_loops(size)
+        tree, nodes = fused_tree(code), to_nodes(fused_tree(code))
+        dict_time, _ = timed(lambda: QuietInterpreter(tree).start())
+        node_time, _ = timed(lambda: QuietInterpreter(nodes).start())
+        print(f"{size:>10} {dict_time:>7.3f}s {node_time:>7.3f}s {node_time/dict_time:>8.2f}x")
+
+def bench_flat(sizes=(300, 1000)):
+    print("loading a stored tree: json of the dict tree vs a memory-mapped flat buffer")
+    print(f"{'lines':>8} {'json':>9} {'flat':>9} {'json load':>10} {'flat load':>10} {'json held':>10} {'flat held':>10} {'flat walk':>10}")
+    def walk(tree):
+        if isinstance(tree, (list, psflat.FlatList)):
+            for item in tree:
+                walk(item)
+        elif isinstance(tree, psflat.FlatNode):
+            for key in tree.cls.KEYS:
+                walk(tree[key])
+    for size in sizes:
+        code = generate_program(size)
+        tree = fused_tree(code)
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = os.path.join(directory, "tree.json")
+            flat_path = os.path.join(directory, "tree.flat")
+            with open(json_path, "w") as file:
+                json.dump(tree, file)
+            psflat.dump(tree, flat_path)
+            def load_json():
+                with open(json_path) as file:
+                    return json.load(file)
+            json_time, _ = timed(load_json)
+            def load_flat():
+                psflat.load(flat_path).close()
+            def walk_flat():
+                with psflat.load(flat_path) as flat:
+                    walk(flat.root())
+            json_time, _ = timed(load_json)
+            flat_time, _ = timed(load_flat)
+            json_bytes, _ = traced_peak(load_json)
+            flat_bytes, flat = traced_peak(psflat.load, flat_path)
+            with flat:
+                assert flat.to_tree() == tree
+            walk_time, _ = timed(walk_flat)
+            json_size, flat_size = os.path.getsize(json_path), os.path.getsize(flat_path)
+            print(f"{code.count(chr(10)):>8} {json_size/1e6:>7.1f}MB {flat_size/1e6:>7.1f}MB {json_time:>9.3f}s {flat_time:>9.5f}s"
+                  f" {json_bytes/1e6:>8.1f}MB {flat_bytes/1e6:>8.3f}MB {walk_time:>9.3f}s")
+
+def bench_cache(sizes=(300, 1000, 3000)):
+    print("front end (parse & type check) vs a hit in the compiled-program cache")
+    print(f"{'lines':>8} {'front end':>10} {'key':>9} {'hit':>9} {'entry':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            code = generate_program(size)
+            def front_end():
+                tree = fused_tree(code)
+                return tree, TypeChecker.check_file(tree)
+            front_time, (tree, types) = timed(front_end)
+            key_time, key = timed(pscache.source_key, None, code)
+            pscache.put(directory, key, tree, types)
+            hit_time, _ = timed(pscache.get, directory, key)
+            entry_size = os.path.getsize(pscache.entry_path(directory, key))
+            print(f"{code.count(chr(10)):>8} {front_time:>9.3f}s {key_time*1000:>7.2f}ms {hit_time*1000:>7.2f}ms {entry_size/1e6:>7.2f}MB")
+
+def bench_transpile(sizes=(1000, 10000)):
+    print("running loop-heavy programs: tree-walking Interpreter vs the python backend")
+    print(f"{'iterations':>10} {'interpreter':>12} {'transpile':>10} {'python':>9} {'speedup':>8}")
+    for size in sizes:
+        tree = fused_tree(generate_loops(size))
+        types = TypeChecker.check_file(tree)
+        walk_time, _ = timed(lambda: QuietInterpreter(tree).start())
+        compile_time, code = timed(pstranspile.compile_program, tree, types)
+        run_time, _ = timed(lambda: pstranspile.Runtime(QuietInterpreter).run(code))
+        print(f"{size:>10} {walk_time:>11.3f}s {compile_time*1000:>8.1f}ms {run_time:>8.3f}s {walk_time/run_time:>7.1f}x")
+
+def bench_vm(sizes=(1000, 10000)):
+    print("running loop-heavy programs: tree-walking Interpreter vs bytecode VM vs the python backend")
+    print(f"{'iterations':>10} {'interpreter':>12} {'compile':>8} {'vm':>8} {'python':>8} {'vm speedup':>11}")
+    for size in sizes:
+        tree = fused_tree(generate_loops(size))
+        types = TypeChecker.check_file(tree)
+        walk_time, _ = timed(lambda: QuietInterpreter(tree).start())
+        compile_time, code = timed(psvm.compile_program, tree, types)
+        vm_time, _ = timed(lambda: psvm.VM(code, pstranspile.Runtime(QuietInterpreter)).run())
+        python = pstranspile.compile_program(tree, types)
+        python_time, _ = timed(lambda: pstranspile.Runtime(QuietInterpreter).run(python))
+        print(f"{size:>10} {walk_time:>11.3f}s {compile_time*1000:>6.1f}ms {vm_time:>7.3f}s {python_time:>7.3f}s {walk_time/vm_time:>10.1f}x")
+
+class RecordingInterpreter(QuietInterpreter):
+    '''a QuietInterpreter that keeps what it prints'''
+    def start(self):
+        self.printed = []
+        super().start()
+        return self.printed
+    def canonical_print(self, *args):
+        self.printed.append(args)
+
+class RecordingSteppingInterpreter(RecordingInterpreter, SteppingInterpreter):
+    pass
+
+def bench_for_step(sizes=(10000, 100000)):
+    # the saving is a fixed cost per step: about 10-15% on integer loops with a one-statement body,
+    # a few percent on float loops, and lost in the noise once the body does any real work ("body")
+    print("for-step loops: stepping by index multiplication vs a native range (floats: a generator)")
+    print("median of 15 alternating runs each; speedup is the median of the per-run ratios")
+    print(f"{'loop':>6} {'steps':>8} {'stepping':>9} {'native':>7} {'speedup':>8}")
+    for kind in STEPS_LOOPS:
+        for size in sizes:
+            tree = fused_tree(generate_steps(kind, size))
+            if RecordingSteppingInterpreter(tree).start() != RecordingInterpreter(tree).start():
+                raise AssertionError("the loops diverged")
+            stepping_time, native_time, ratio = timed_pair(lambda: SteppingInterpreter(tree).start(), lambda: QuietInterpreter(tree).start())
+            print(f"{kind:>6} {size:>8} {stepping_time:>8.3f}s {native_time:>6.3f}s {ratio:>7.2f}x")
+
+def bench_optimize(sizes=(1000, 10000)):
+    print("loop-heavy programs: the checked tree vs the tree psoptimize folded")
+    print(f"{'iterations':>10} {'changes':>8} {'optimize':>9} {'checked':>8} {'folded':>7} {'speedup':>8}")
+    for size in sizes:
+        tree = fused_tree(generate_loops(size))
+        TypeChecker.check_file(tree)
+        optimize_time, (folded, report) = timed(psoptimize.optimize, tree)
+        if RecordingInterpreter(tree).start() != RecordingInterpreter(folded).start():
+            raise AssertionError("the folded tree diverged")
+        checked_time, _ = timed(lambda: QuietInterpreter(tree).start())
+        folded_time, _ = timed(lambda: QuietInterpreter(folded).start())
+        print(f"{size:>10} {len(report):>8} {optimize_time*1000:>7.1f}ms {checked_time:>7.3f}s {folded_time:>6.3f}s {checked_time/folded_time:>7.2f}x")
+
+def bench_hoist(sizes=(100, 300)):
+    print("nested loops: the checked tree vs the tree psoptimize.hoist moved invariants out of")
+    print(f"{'width':>6} {'hoisted':>8} {'hoist':>7} {'checked':>8} {'hoisted':>8} {'speedup':>8}")
+    for size in sizes:
+        tree = fused_tree(generate_invariants(size))
+        types = TypeChecker.check_file(tree)
+        hoist_time, (moved, _, report) = timed(psoptimize.hoist, tree, types)
+        if RecordingInterpreter(tree).start() != RecordingInterpreter(moved).start():
+            raise AssertionError("the hoisted tree diverged")
+        checked_time, _ = timed(lambda: QuietInterpreter(tree).start())
+        moved_time, _ = timed(lambda: QuietInterpreter(moved).start())
+        print(f"{size:>6} {len(report):>8} {hoist_time*1000:>5.1f}ms {checked_time:>7.3f}s {moved_time:>7.3f}s {checked_time/moved_time:>7.2f}x")
+
+def bench_frames(sizes=(10000, 50000)):
+    print("call-heavy programs: rebuilding every frame vs copying each procedure's frame template")
+    print(f"{'calls':>8} {'rebuilt':>8} {'template':>9} {'speedup':>8}")
+    for size in sizes:
+        tree = fused_tree(generate_calls(size))
+        TypeChecker.check_file(tree)
+        rebuilt_time, _ = timed(lambda: RebuildingInterpreter(tree).start(), repeat=5)
+        template_time, _ = timed(lambda: QuietInterpreter(tree).start(), repeat=5)
+        print(f"{size:>8} {rebuilt_time:>7.3f}s {template_time:>8.3f}s {rebuilt_time/template_time:>7.2f}x")
+
+BENCHMARKS = [bench_lexers, bench_token_store, bench_incremental, bench_stream, bench_parallel, bench_packrat, bench_compiled, bench_dispatch, bench_fused, bench_iterative, bench_magic, bench_visitors, bench_nodes, bench_flat, bench_cache, bench_transpile, bench_vm, bench_for_step, bench_optimize, bench_hoist, bench_frames]
+
+if __name__ == "__main__":
+    for bench in BENCHMARKS:
+        bench()
+        print()
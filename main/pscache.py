@@ -0,0 +1,171 @@
+import hashlib
+import importlib.util
+import os
+import struct
+import tempfile
+import time
+import psflat
+from pstyper import Type, Any, Basic, List, Procedure, Function, ListFunction
+
+'''
+on-disk cache of checked programs
+
+after a successful type check, the tree and the type tables are stored, as one psflat buffer, in DIRECTORY/KEY.psc;
+KEY hashes the source together with VERSION (a hash of the pipeline's own modules, so editing the pipeline invalidates every entry).
+a later run with the same key maps the file and goes straight to execution.
+
+entries are written to a temporary file in DIRECTORY and renamed over KEY.psc, so a reader only ever sees a complete entry;
+concurrent writers of one key race harmlessly (their entries are identical), and unreadable or foreign entries count as misses.
+a hit touches the entry's mtime, and each store evicts the least recently used entries until DIRECTORY fits in MAX_BYTES;
+an entry another process removes or still has open is simply skipped.
+'''
+
+PIPELINE = "pslexer psparser psgrammar psfused psiterative psstream psparallel psmagic psvisitor pstyper psnodes psflat pscache pstranspile psresolve psoptimize psinterpreter".split()
+SUFFIX = ".psc"
+# every kind of entry: checked programs, and the code objects of pstranspile
+SUFFIXES = (SUFFIX, ".pspy")
+MAX_BYTES = 64 * 2**20
+# temporary files older than this (in seconds) were left by a writer that died, and are removed when evicting
+STALE = 3600
+
+def pipeline_version(modules: list[str]=PIPELINE) -> str:
+    '''a hash of the source of MODULES'''
+    digest = hashlib.sha256()
+    for name in modules:
+        with open(importlib.util.find_spec(name).origin, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+VERSION = pipeline_version()
+
+def source_key(path: str=None, code: str=None) -> str:
+    '''the cache key of the file at PATH (hashed in chunks) or of CODE'''
+    digest = hashlib.sha256(f"{VERSION}\0".encode("utf-8"))
+    if path is not None:
+        with open(path, "rb") as file:
+            while chunk := file.read(2**16):
+                digest.update(chunk)
+    else:
+        digest.update(code.encode("utf-8"))
+    return digest.hexdigest()
+
+# TYPES: Type instances as nested lists, which psflat can store
+def type_to_data(t: Type) -> list:
+    match t:
+        case Any():
+            return ["any"]
+        case Basic():
+            return ["basic", t.name]
+        case List():
+            return ["list", type_to_data(t.elem), t.static_size]
+        case Procedure():
+            return ["proc", [type_to_data(arg) for arg in t.args]]
+        case Function():
+            return ["function", [type_to_data(arg) for arg in t.args], type_to_data(t.result)]
+        case ListFunction():
+            return ["listfunction", t.name]
+        case x:
+            raise NotImplementedError(f"type {x!r}")
+def data_to_type(data) -> Type:
+    match data[0]:
+        case "any":
+            return Any()
+        case "basic":
+            return Basic(data[1])
+        case "list":
+            return List(data_to_type(data[1]), data[2])
+        case "proc":
+            return Procedure([data_to_type(arg) for arg in data[1]])
+        case "function":
+            return Function([data_to_type(arg) for arg in data[1]], data_to_type(data[2]))
+        case "listfunction":
+            return ListFunction(data[1])
+        case x:
+            raise NotImplementedError(f"type {x!r}")
+def types_to_data(types: tuple) -> list:
+    '''the result of TypeChecker.check_file, in storable form'''
+    constants, global_variables, partial_decls = types
+    table = lambda types: dict((name, type_to_data(t)) for name, t in types.items())
+    return [table(constants), table(global_variables), dict((name, [table(con), table(var)]) for name, (con, var) in partial_decls.items())]
+def data_to_types(data) -> tuple:
+    constants, global_variables, partial_decls = data
+    table = lambda data: dict((name, data_to_type(t)) for name, t in data.items())
+    return table(constants), table(global_variables), dict((name, (table(con), table(var))) for name, (con, var) in partial_decls.items())
+
+def entry_path(directory: str, key: str) -> str:
+    return os.path.join(directory, key + SUFFIX)
+
+def get(directory: str, key: str) -> tuple | None:
+    '''(tree, types) stored under KEY, with the tree read straight out of the mapped entry; None on a miss'''
+    path = entry_path(directory, key)
+    flat = None
+    try:
+        flat = psflat.load(path)
+        entry = flat.root()
+        if entry.get("key") != key:
+            raise KeyError(key)
+        tree, types = entry["tree"], data_to_types(psflat.to_python(entry["types"]))
+    except (OSError, ValueError, TypeError, KeyError, IndexError, AttributeError, NotImplementedError, struct.error):
+        if flat is not None:
+            flat.close()
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return tree, types
+
+def put(directory: str, key: str, tree, types: tuple, max_bytes: int=MAX_BYTES):
+    '''store TREE and TYPES under KEY atomically, then evict down to MAX_BYTES'''
+    data = psflat.encode({"key": key, "tree": tree, "types": types_to_data(types)})
+    put_bytes(directory, key + SUFFIX, data, max_bytes)
+
+def get_bytes(directory: str, name: str) -> bytes | None:
+    '''the contents of the entry NAME (which ends in one of SUFFIXES), or None on a miss'''
+    path = os.path.join(directory, name)
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+        os.utime(path)
+    except OSError:
+        return None
+    return data
+
+def put_bytes(directory: str, name: str, data: bytes, max_bytes: int=MAX_BYTES):
+    '''store DATA as the entry NAME atomically, then evict down to MAX_BYTES'''
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(data)
+        os.replace(temporary, os.path.join(directory, name))
+    except OSError:
+        # e.g. the entry is mapped by another process on a platform that forbids replacing it
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        return
+    evict(directory, max_bytes)
+
+def evict(directory: str, max_bytes: int=MAX_BYTES):
+    '''remove the least recently used entries of DIRECTORY until the rest fit in MAX_BYTES'''
+    entries = []
+    now = time.time()
+    for entry in os.scandir(directory):
+        try:
+            stat = entry.stat()
+            if entry.name.endswith(SUFFIXES):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif entry.name.endswith(".tmp") and now - stat.st_mtime > STALE:
+                os.remove(entry.path)
+        except OSError:
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
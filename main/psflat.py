@@ -0,0 +1,274 @@
+from array import array
+from collections.abc import Sequence
+import hashlib
+import mmap
+import struct
+import psnodes
+from psnodes import Node
+
+'''
+flat AST buffers
+
+a Postparser tree (dicts or psnodes) is stored as a struct of arrays, one entry per value in post-order:
+    kinds[i]     what value i is: a constant, a list, a plain dict, or one of the psnodes classes
+    first[i]     where its children start in 'children'; for constants, its index in the constant pool
+    count[i]     how many children it has
+    children     value indices; a node's children are its fields in KEYS order, a dict's are alternating keys and values
+the constant pool holds ints, floats, and deduplicated utf-8 strings (names, operators, literals).
+the root is the last value written.
+
+dump writes the arrays into one file, each 8-byte aligned after a header of MAGIC, SCHEMA and a table of (offset, size) pairs;
+SCHEMA hashes the value kinds and the fields of every class in CLASSES, so a buffer written against other psnodes classes is rejected on load.
+load maps that file and casts memoryviews over it, so nothing is parsed or copied, and processes loading the same file share its pages.
+FlatNode and FlatList read values straight out of the buffers, with the read-only interface of psnodes (node["type"], get, in),
+so the TypeChecker and Interpreter can run on a loaded tree directly.
+'''
+
+MAGIC = b"PSFLAT02"
+# constants; every other kind is NODE + the index of its class in CLASSES
+NONE, FALSE, TRUE, INT, BIGINT, FLOAT, STR, LIST, DICT = range(9)
+NODE = 9
+# the node kinds, by index; new classes go at the end, so existing indices never move
+CLASSES: tuple[type, ...] = (
+    psnodes.File, psnodes.Start, psnodes.Procedure, psnodes.MainBody,
+    psnodes.Declaration, psnodes.Predicate, psnodes.ElementType, psnodes.ArraySuffix,
+    psnodes.Body, psnodes.If, psnodes.While, psnodes.Do, psnodes.For, psnodes.Case, psnodes.CaseBranch,
+    psnodes.Set, psnodes.Input, psnodes.Output, psnodes.Open, psnodes.Close, psnodes.ExprStmt,
+    psnodes.Variable, psnodes.SubscriptLval,
+    psnodes.Infix, psnodes.Prefix, psnodes.Term, psnodes.Num, psnodes.Float, psnodes.String, psnodes.Bool,
+    psnodes.Name, psnodes.Group, psnodes.ListExpr,
+    psnodes.Subscript, psnodes.Call,
+)
+if set(CLASSES) != set(Node.KINDS.values()):
+    raise TypeError(f"psflat.CLASSES does not list every psnodes class: {set(Node.KINDS.values()) ^ set(CLASSES)}")
+INDICES: dict[type, int] = dict((cls, n) for n, cls in enumerate(CLASSES))
+POSITIONS = tuple(dict((key, n) for n, key in enumerate(cls.KEYS)) for cls in CLASSES)
+# section name -> array typecode, in file order
+SECTIONS = {"kinds": "B", "first": "i", "count": "i", "children": "i", "ints": "q", "floats": "d", "offsets": "i", "strings": "B"}
+SCHEMA = hashlib.sha256(repr((NODE, list(SECTIONS.items()), [(cls.TYPE, cls.KEYS) for cls in CLASSES])).encode()).digest()[:8]
+HEADER = struct.Struct(f"<8s8s{2*len(SECTIONS)}Q")
+
+class Encoder:
+    '''appends values to the flat arrays, returning their indices'''
+    def __init__(self):
+        for name, code in SECTIONS.items():
+            setattr(self, name, array(code))
+        self.offsets.append(0)
+        self.pool: dict[str, int] = {}
+    def string(self, value: str) -> int:
+        if value not in self.pool:
+            self.pool[value] = len(self.pool)
+            self.strings.frombytes(value.encode("utf-8"))
+            self.offsets.append(len(self.strings))
+        return self.pool[value]
+    def add(self, kind: int, first: int=0, count: int=0) -> int:
+        self.kinds.append(kind)
+        self.first.append(first)
+        self.count.append(count)
+        return len(self.kinds) - 1
+    def add_children(self, kind: int, items: list[int]) -> int:
+        start = len(self.children)
+        self.children.extend(items)
+        return self.add(kind, start, len(items))
+    def encode(self, value) -> int:
+        match value:
+            case None:
+                return self.add(NONE)
+            case bool():
+                return self.add(TRUE if value else FALSE)
+            case int() if -2**63 <= value < 2**63:
+                self.ints.append(value)
+                return self.add(INT, len(self.ints) - 1)
+            case int():
+                return self.add(BIGINT, self.string(str(value)))
+            case float():
+                self.floats.append(value)
+                return self.add(FLOAT, len(self.floats) - 1)
+            case str():
+                return self.add(STR, self.string(value))
+            case list():
+                return self.add_children(LIST, [self.encode(item) for item in value])
+            case Node():
+                items = [self.encode(value[key]) for key in value.KEYS]
+                return self.add_children(NODE + INDICES[type(value)], items)
+            case dict():
+                keys = frozenset(value)
+                kind = value.get("type")
+                cls = Node.KINDS.get((kind if isinstance(kind, str) else None, keys)) or Node.KINDS.get((None, keys))
+                if cls is not None:
+                    items = [self.encode(value[key]) for key in cls.KEYS]
+                    return self.add_children(NODE + INDICES[cls], items)
+                items = []
+                for key, item in value.items():
+                    items.append(self.encode(key))
+                    items.append(self.encode(item))
+                return self.add_children(DICT, items)
+            case x:
+                raise TypeError(f"cannot flatten {type(x).__name__} {x!r}")
+    def to_bytes(self) -> bytes:
+        sections = [getattr(self, name).tobytes() for name in SECTIONS]
+        table = []
+        offset = HEADER.size
+        for data in sections:
+            offset += -offset % 8
+            table += [offset, len(data)]
+            offset += len(data)
+        out = bytearray(HEADER.pack(MAGIC, SCHEMA, *table))
+        for start, data in zip(table[::2], sections):
+            out += bytes(start - len(out)) + data
+        return bytes(out)
+
+def encode(tree) -> bytes:
+    '''the flat buffer of TREE (or any part of one)'''
+    encoder = Encoder()
+    encoder.encode(tree)
+    return encoder.to_bytes()
+
+def dump(tree, path: str):
+    '''write the flat buffer of TREE to PATH'''
+    with open(path, "wb") as file:
+        file.write(encode(tree))
+
+def load(path: str) -> "FlatTree":
+    '''map the flat buffer at PATH read-only'''
+    with open(path, "rb") as file:
+        return FlatTree(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+class FlatTree:
+    '''the arrays of a flat buffer, as memoryviews over it'''
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.view = view = memoryview(buffer)
+        magic, schema, *table = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"not a flat AST buffer: {magic!r}")
+        if schema != SCHEMA:
+            raise ValueError(f"flat AST buffer written for other node classes: schema {schema.hex()}, expected {SCHEMA.hex()}")
+        for (name, code), start, size in zip(SECTIONS.items(), table[::2], table[1::2]):
+            setattr(self, name, view[start:start+size].cast(code))
+        self.decoded: dict[int, str] = {} # string pool index -> str
+        self.views: dict[int, object] = {} # value index -> FlatNode | FlatList
+    def close(self):
+        '''release the buffer (unmapping it, if load mapped it); views into it can no longer be read'''
+        for name in SECTIONS:
+            getattr(self, name).release()
+        self.view.release()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def string(self, index: int) -> str:
+        if index not in self.decoded:
+            self.decoded[index] = bytes(self.strings[self.offsets[index]:self.offsets[index+1]]).decode("utf-8")
+        return self.decoded[index]
+    def root(self):
+        return self.value(len(self.kinds) - 1)
+    def value(self, index: int):
+        '''value INDEX: constants as python values, nodes and lists as (cached) views'''
+        kind = self.kinds[index]
+        if kind >= NODE or kind == LIST:
+            if index not in self.views:
+                self.views[index] = FlatNode(self, index) if kind >= NODE else FlatList(self, index)
+            return self.views[index]
+        if kind == STR:
+            return self.string(self.first[index])
+        if kind == INT:
+            return self.ints[self.first[index]]
+        if kind == NONE:
+            return None
+        if kind == FALSE or kind == TRUE:
+            return kind == TRUE
+        if kind == FLOAT:
+            return self.floats[self.first[index]]
+        if kind == BIGINT:
+            return int(self.string(self.first[index]))
+        if kind == DICT:
+            start = self.first[index]
+            items = [self.value(child) for child in self.children[start:start+self.count[index]]]
+            return dict(zip(items[::2], items[1::2]))
+        raise ValueError(f"unknown value kind {kind} at {index}")
+    def to_tree(self, index: int=None):
+        '''value INDEX (by default the root) decoded into the dict form'''
+        return to_python(self.value(len(self.kinds) - 1 if index is None else index))
+
+class FlatNode:
+    '''a psnodes-like view of one node in a FlatTree'''
+    __slots__ = ("tree", "index", "cls")
+    def __init__(self, tree: FlatTree, index: int):
+        self.tree = tree
+        self.index = index
+        self.cls = CLASSES[tree.kinds[index] - NODE]
+    def field(self, position: int):
+        return self.tree.value(self.tree.children[self.tree.first[self.index] + position])
+    def __getitem__(self, key: str):
+        if key == "type" and self.cls.TYPE is not None:
+            return self.cls.TYPE
+        try:
+            position = POSITIONS[self.tree.kinds[self.index] - NODE][key]
+        except KeyError:
+            raise KeyError(key) from None
+        return self.field(position)
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    def __contains__(self, key: str) -> bool:
+        return key in self.cls.ATTRS or key == "type" and self.cls.TYPE is not None
+    def keys(self) -> list[str]:
+        return (["type"] if self.cls.TYPE is not None else []) + list(self.cls.KEYS)
+    def to_dict(self) -> dict:
+        result = {} if self.cls.TYPE is None else {"type": self.cls.TYPE}
+        for position, key in enumerate(self.cls.KEYS):
+            result[key] = to_python(self.field(position))
+        return result
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (FlatNode, Node, dict)):
+            return self.to_dict() == to_python(other)
+        return NotImplemented
+    __hash__ = None
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+class FlatList(Sequence):
+    '''a read-only list view of one list in a FlatTree'''
+    __slots__ = ("tree", "start", "length")
+    def __init__(self, tree: FlatTree, index: int):
+        self.tree = tree
+        self.start = tree.first[index]
+        self.length = tree.count[index]
+    def __len__(self) -> int:
+        return self.length
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return self.tree.value(self.tree.children[self.start + index])
+    def to_list(self) -> list:
+        return [to_python(item) for item in self]
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (FlatList, list)):
+            return self.to_list() == to_python(other)
+        return NotImplemented
+    __hash__ = None
+    def __repr__(self) -> str:
+        return repr(self.to_list())
+
+def to_python(value):
+    '''the dict form of a flat view, a node tree, or a dict tree'''
+    if isinstance(value, FlatNode):
+        return value.to_dict()
+    if isinstance(value, FlatList):
+        return value.to_list()
+    if isinstance(value, list):
+        return [to_python(item) for item in value]
+    if isinstance(value, Node):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return dict((key, to_python(item)) for key, item in value.items())
+    return value
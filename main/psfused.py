@@ -0,0 +1,174 @@
+from psparser import Parser, SIMPLE_TYPES, RESULT, TREE, convert_literal_new
+from psgrammar import CompiledParser, compile_rules
+
+'''
+fused front end
+
+the GENERAL table is wrapped so that every named rule passes its raw result through a ("filter", ("b_NAME", RULE)),
+and the b_ method turns it into the node Postparser.p_NAME would build from it.
+sub-rules are built before the rules containing them, so each b_ method only rearranges nodes that are already final:
+the raw tree of the whole file never exists, and nothing is walked a second time.
+rules whose raw result already has the final shape (subscript, suffix, condition) are left alone.
+'''
+
+BUILT = """start procedure mainbody body if else while for case case_case default_case do set input output open close
+stmt lval term atom call Declarations decline predicate arraytypesuffix elementtype""".split()
+
+def fuse(general: dict, built: list[str]=BUILT) -> dict:
+    '''GENERAL with every rule in BUILT wrapped in its b_ filter'''
+    fused = dict(general)
+    for name in built:
+        fused[name] = ("filter", (f"b_{name}", general[name]))
+    return fused
+
+class FusedParser(Parser):
+    '''Parser whose named rules return Postparser nodes instead of raw trees'''
+    GENERAL = fuse(Parser.GENERAL)
+    def __init__(self, src, packrat: bool=False, trace=False):
+        super().__init__(src, packrat, trace)
+        for name in BUILT:
+            self.funcs[f"b_{name}"] = getattr(self, f"b_{name}")
+    @staticmethod
+    def head_suffix(head, suffix):
+        return {"type": "term", "head": head, "suffix": suffix}
+    @staticmethod
+    def file_tree(items: list) -> TREE:
+        '''the result of the 'file' rule, as Postparser.p_file would return it'''
+        starts = []
+        procedures = []
+        for item in items:
+            match item["type"]:
+                case "start":
+                    starts.append(item["value"])
+                case "procedure":
+                    procedures.append(item["value"])
+        return {"starts": starts, "procedures": procedures}
+    @staticmethod
+    def magic_term(part):
+        # terms are already built
+        return part["value"]
+    # BUILDERS: (index, raw result with final children) -> RESULT
+    def b_start(self, index, tree) -> RESULT:
+        _, mainbody, _ = tree
+        return True, index, {"type": "start", "body": mainbody}
+    def b_procedure(self, index, tree) -> RESULT:
+        raw_name, predicates, mainbody, _ = tree
+        return True, index, {"type": "procedure", "name": raw_name["value"], "args": predicates[::2], "body": mainbody}
+    def b_mainbody(self, index, tree) -> RESULT:
+        _, maybedec, raw_stmts, _, _ = tree
+        decls = maybedec[0] if maybedec else []
+        return True, index, {"declarations": decls, "statements": raw_stmts[1::2]}
+    def b_Declarations(self, index, tree) -> RESULT:
+        _, raw_lines = tree
+        return True, index, raw_lines[::2]
+    def b_decline(self, index, tree) -> RESULT:
+        predicate, minitial = tree
+        initial = minitial[0][1] if minitial else None
+        return True, index, {"predicate": predicate, "initial": initial}
+    def b_predicate(self, index, tree) -> RESULT:
+        element_type, varname, suffixes = tree
+        return True, index, {"name": varname["value"], "element": element_type, "suffixes": suffixes}
+    def b_elementtype(self, index, tree) -> RESULT:
+        if tree["type"] in SIMPLE_TYPES:
+            return True, index, {"type": tree["type"]}
+        if tree["type"] == "proc":
+            raise NotImplementedError("'type' expression beginning with 'proc' (rule 'proctype')")
+        raise NotImplementedError(tree["type"])
+    def b_arraytypesuffix(self, index, tree) -> RESULT:
+        return True, index, {"type": "array", "size": tree[0] if tree else None}
+    def b_term(self, index, tree) -> RESULT:
+        atom, suffixes = tree
+        for suffix in suffixes:
+            atom = self.head_suffix(atom, suffix)
+        return True, index, atom
+    def b_atom(self, index, tree) -> RESULT:
+        x = tree["type"]
+        match x:
+            case "num" | "float" | "string" | "bool":
+                return True, index, convert_literal_new((x, tree["value"]["value"]))
+            case "name":
+                return True, index, {"type": x, "value": tree["value"]["value"]}
+            case "group":
+                return True, index, tree
+            case "list":
+                return True, index, {"type": "list", "value": tree["value"][::2]}
+            case x:
+                raise NotImplementedError(f"atom type {repr(x)}")
+    def b_call(self, index, tree) -> RESULT:
+        return True, index, tree[::2]
+    def b_stmt(self, index, tree) -> RESULT:
+        if tree["type"] == "exprstmt":
+            return True, index, tree
+        return True, index, tree["value"]
+    def b_body(self, index, tree) -> RESULT:
+        match tree["type"]:
+            case "indented":
+                stmts = tree["value"][::2]
+            case "unindented":
+                stmts = [tree["value"]]
+            case x:
+                raise NotImplementedError(f"body type {repr(x)}")
+        return True, index, {"type": "body", "statements": stmts}
+    def b_if(self, index, tree) -> RESULT:
+        _, condition, _, body, m_else, _, _ = tree
+        alternative = m_else[0] if m_else else None
+        return True, index, {"type": "if", "condition": condition, "body": body, "else": alternative}
+    def b_else(self, index, tree) -> RESULT:
+        _, _, body = tree
+        return True, index, body
+    def b_while(self, index, tree) -> RESULT:
+        _, condition, body, _, _ = tree
+        return True, index, {"type": "while", "condition": condition, "body": body}
+    def b_do(self, index, tree) -> RESULT:
+        _, body, _, _, condition = tree
+        return True, index, {"type": "do", "condition": condition, "body": body}
+    def b_for(self, index, tree) -> RESULT:
+        _, name, _, initial, _, final, _, step, body, _, _ = tree
+        return True, index, {"type": "for", "variable": name["value"], "range": [initial, final, step], "body": body}
+    def b_case(self, index, tree) -> RESULT:
+        _, variable, _, mcases, _, mdefault, _, _, _ = tree
+        cases = mcases[0][::2] if mcases else []
+        default = mdefault[0] if mdefault else None
+        return True, index, {"type": "case", "variable": variable, "cases": cases, "default": default}
+    def b_case_case(self, index, tree) -> RESULT:
+        test, _, body = tree
+        return True, index, {"type": "case", "test": test, "body": body}
+    def b_default_case(self, index, tree) -> RESULT:
+        _, _, body = tree
+        return True, index, body
+    def b_set(self, index, tree) -> RESULT:
+        _, lval, _, expr = tree
+        return True, index, {"type": "set", "lval": lval, "expr": expr}
+    def b_lval(self, index, tree) -> RESULT:
+        name, subscripts = tree
+        if not subscripts:
+            return True, index, {"type": "variable", "name": name["value"]}
+        head = {"type": "name", "value": name["value"]}
+        for part in subscripts[:-1]:
+            head = self.head_suffix(head, part)
+        return True, index, {"type": "subscript", "head": head, "index": subscripts[-1]}
+    def b_input(self, index, tree) -> RESULT:
+        _, raw_targets, maybe_file = tree
+        file = maybe_file[0][1] if maybe_file else None
+        return True, index, {"type": "input", "values": [target["value"] for target in raw_targets[::2]], "file": file}
+    def b_output(self, index, tree) -> RESULT:
+        _, raw_targets, maybe_file = tree
+        file = maybe_file[0][1] if maybe_file else None
+        return True, index, {"type": "output", "values": raw_targets[::2], "file": file}
+    def b_open(self, index, tree) -> RESULT:
+        _, name, atom = tree
+        return True, index, {"type": "open", "name": name["value"], "path": atom}
+    def b_close(self, index, tree) -> RESULT:
+        _, name = tree
+        return True, index, {"type": "close", "name": name["value"]}
+
+class CompiledFusedParser(FusedParser, CompiledParser):
+    '''FusedParser running the compiled form of its GENERAL table'''
+    RULES = compile_rules(FusedParser.GENERAL)
+    CODES = dict((function.__code__, name) for name, function in RULES.items() if FusedParser.GENERAL[name][0] != "rule")
+
+def fused_tree(code: str, compiled: bool=True, packed: bool=False) -> TREE:
+    '''the post-parsed tree of CODE, as Postparser.p_file would return it'''
+    parser = CompiledFusedParser if compiled else FusedParser
+    _, _, items = parser.parse(code, packed)
+    return FusedParser.file_tree(items)
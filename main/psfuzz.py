@@ -0,0 +1,387 @@
+import math
+import random
+from time import perf_counter
+from psmagic import decide_kinds, magic_parse_tree
+from psparser import Parser, INFIX_PRECEDENCE, PREFIX_PRECEDENCE, INFIX_TREE, PREFIX_TREE, TOKEN, EOF
+
+'''
+fuzzing & scaling harness
+
+run this file directly; every fuzz_* function prints what it checked and returns what it found.
+differential checks compare an implementation against a deliberately simple reference;
+scaling checks time growing inputs and flag growth faster than SUPERLINEAR on a log-log fit.
+'''
+
+SUPERLINEAR = 1.3 # fitted exponent above which growth counts as super-linear
+OPERATORS = sorted(set(INFIX_PRECEDENCE) | set(PREFIX_PRECEDENCE))
+INFIXES = sorted(INFIX_PRECEDENCE)
+PREFIXES = sorted(PREFIX_PRECEDENCE)
+
+def scaling_exponent(samples: list[tuple[int, float]]) -> float:
+    '''least-squares slope of log(time) against log(size)'''
+    xs = [math.log(size) for size, _ in samples]
+    ys = [math.log(max(elapsed, 1e-9)) for _, elapsed in samples]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x-mx) * (y-my) for x, y in zip(xs, ys)) / sum((x-mx) ** 2 for x in xs)
+
+def best_time(function, *args, repeat: int=3) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        function(*args)
+        best = min(best, perf_counter() - start)
+    return best
+
+# EXPRESSION RESOLVER
+
+def random_parts(length: int, rng: random.Random, valid: bool=True) -> list:
+    '''
+    LENGTH terms for magic_parse_tree
+    valid: follow (prefix* term) (infix prefix* term)*; otherwise terms and any operators in any order
+    '-' is both prefix and infix, so it is drawn often in either position
+    '''
+    parts = []
+    for i in range(length):
+        if not valid:
+            parts.append(rng.choice(OPERATORS) if rng.random() < 0.5 else {"type": "num", "value": i})
+            continue
+        if i:
+            parts.append("-" if rng.random() < 0.3 else rng.choice(list(INFIX_PRECEDENCE)))
+        while rng.random() < 0.25:
+            parts.append("-" if rng.random() < 0.5 else rng.choice(list(PREFIX_PRECEDENCE)))
+        parts.append({"type": "num", "value": i})
+    return parts
+
+def reference_resolve(parts: list, infixes=INFIX_PRECEDENCE, prefixes=PREFIX_PRECEDENCE):
+    '''
+    textbook precedence climbing over PARTS; None where magic_parse_tree reports an error
+    an operator is a prefix wherever a term is expected and an infix everywhere else;
+    an infix is taken while its left binding is strictly above the current minimum
+    '''
+    position = 0
+    def term(minimum: int):
+        nonlocal position
+        if position >= len(parts):
+            return None
+        part = parts[position]
+        position += 1
+        if not isinstance(part, str):
+            left = part
+        elif part in prefixes:
+            right = term(prefixes[part])
+            if right is None:
+                return None
+            left = PREFIX_TREE(part, right)
+        else:
+            return None
+        while position < len(parts):
+            op = parts[position]
+            if not isinstance(op, str) or op not in infixes:
+                return None
+            left_bind, right_bind = infixes[op]
+            if left_bind <= minimum:
+                break
+            position += 1
+            right = term(right_bind)
+            if right is None:
+                return None
+            left = INFIX_TREE(op, left, right)
+        return left
+    result = term(-1)
+    return result if position == len(parts) else None
+
+def fuzz_resolver(trials: int=20000, max_length: int=40, seed: int=0, resolve=magic_parse_tree) -> list:
+    '''compare RESOLVE (magic_parse_tree's signature) with reference_resolve on random sequences; returns the mismatching sequences'''
+    rng = random.Random(seed)
+    mismatches = []
+    valid_count = 0
+    for trial in range(trials):
+        parts = random_parts(rng.randint(1, max_length), rng, valid=trial % 2 == 0)
+        result = resolve(parts, INFIX_PRECEDENCE, PREFIX_PRECEDENCE, INFIX_TREE, PREFIX_TREE)
+        if result["type"] == "err":
+            result = None
+        expected = reference_resolve(parts)
+        valid_count += expected is not None
+        if result != expected:
+            mismatches.append(parts)
+    print(f"resolver: {trials} sequences ({valid_count} valid), {len(mismatches)} mismatches")
+    return mismatches
+
+def time_resolver(lengths=(250, 500, 1000, 2000, 4000, 8000), seed: int=0, resolve=magic_parse_tree) -> dict[str, list[tuple[int, float]]]:
+    '''time decide_kinds and RESOLVE on valid sequences of each length'''
+    rng = random.Random(seed)
+    samples = {"decide_kinds": [], resolve.__name__: []}
+    for length in lengths:
+        parts = random_parts(length, rng)
+        keys = [8 if not isinstance(part, str) else (4 if part in INFIX_PRECEDENCE else 0) | (2 if part in PREFIX_PRECEDENCE else 0) for part in parts]
+        samples["decide_kinds"].append((length, best_time(decide_kinds, keys)))
+        samples[resolve.__name__].append((length, best_time(resolve, parts, INFIX_PRECEDENCE, PREFIX_PRECEDENCE, INFIX_TREE, PREFIX_TREE)))
+    return samples
+
+def fuzz_resolver_scaling(lengths=(250, 500, 1000, 2000, 4000, 8000), resolve=magic_parse_tree) -> list[str]:
+    '''print time against length; returns the names of functions growing super-linearly'''
+    flagged = []
+    samples = time_resolver(lengths, resolve=resolve)
+    print(f"{'length':>8} " + " ".join(f"{name:>17}" for name in samples))
+    for i, length in enumerate(lengths):
+        print(f"{length:>8} " + " ".join(f"{rows[i][1]*1000:>15.2f}ms" for rows in samples.values()))
+    for name, rows in samples.items():
+        exponent = scaling_exponent(rows)
+        verdict = "SUPER-LINEAR" if exponent > SUPERLINEAR else "ok"
+        print(f"{name}: time ~ length^{exponent:.2f} {verdict}")
+        if exponent > SUPERLINEAR:
+            flagged.append(name)
+    return flagged
+
+# GRAMMAR
+
+SAMPLE_VALUES = {"name": "x", "literal_num": "1", "literal_float": "1.5", "literal_string": '"s"', "literal_bool": "true",
+                 "op": "+", "indent": " ", "dedent": " "}
+PUMPS = (8, 16, 32, 64) # repetition counts of the pumped slice
+BUDGET = 200_000 # p_general calls after which a parse counts as runaway
+
+class Runaway(Exception):
+    pass
+
+class GrammarFuzzer:
+    '''
+    random token sequences derived from a GENERAL table
+    past DEPTH, every rule takes its shortest way out, so derivations always end
+    '''
+    def __init__(self, general: dict, rng: random.Random, depth: int=10):
+        self.general = general
+        self.rng = rng
+        self.depth = depth
+        self.shortest = dict((name, math.inf) for name in general)
+        changed = True
+        while changed:
+            changed = False
+            for name, rule in general.items():
+                size = self.size(rule)
+                if size < self.shortest[name]:
+                    self.shortest[name] = size
+                    changed = True
+    def size(self, rule) -> float:
+        '''the fewest tokens RULE can succeed on'''
+        key, arg = rule
+        match key:
+            case "rule":
+                return self.shortest[arg]
+            case "type":
+                return 1
+            case "filter":
+                return self.size(arg[1])
+            case "maybe" | "repeat" | "cycle":
+                return 0
+            case "split":
+                return self.size(arg[0])
+            case "all":
+                return sum(self.size(part) for part in (arg[0] if isinstance(arg, tuple) else arg))
+            case "list":
+                left, right, _, elem, _ = arg
+                return self.size(left) + self.size(elem) + self.size(right)
+            case "option":
+                parts = arg[0] if isinstance(arg, tuple) else arg
+                return min(self.size(part) for part in parts.values())
+            case "obligatory":
+                return self.size(arg[0])
+            case "ABA":
+                return self.size(arg[2])
+            case x:
+                raise NotImplementedError(f"undefined parse instruction '{x}'")
+    def generate(self, rule, depth: int|None=None) -> list[TOKEN]:
+        rng = self.rng
+        depth = self.depth if depth is None else depth
+        deep = depth <= 0
+        key, arg = rule
+        match key:
+            case "rule":
+                return self.generate(self.general[arg], depth-1)
+            case "type":
+                kind = arg[0] if isinstance(arg, tuple) else arg
+                return [(kind, SAMPLE_VALUES.get(kind, kind))]
+            case "filter" if arg[0] == "magic":
+                return self.expression(arg[1], depth)
+            case "filter":
+                return self.generate(arg[1], depth)
+            case "maybe":
+                return [] if deep or rng.random() < 0.5 else self.generate(arg, depth)
+            case "repeat":
+                return [token for _ in range(0 if deep else rng.randint(0, 3)) for token in self.generate(arg, depth)]
+            case "cycle":
+                tokens = []
+                for _ in range(0 if deep else rng.randint(0, 3)):
+                    for part in arg:
+                        tokens += self.generate(part, depth)
+                return tokens
+            case "split":
+                primary, secondary, _ = arg
+                tokens = self.generate(primary, depth)
+                for _ in range(0 if deep else rng.randint(0, 2)):
+                    tokens += self.generate(secondary, depth) + self.generate(primary, depth)
+                return tokens
+            case "all":
+                return [token for part in (arg[0] if isinstance(arg, tuple) else arg) for token in self.generate(part, depth)]
+            case "list":
+                left, right, sep, elem, _ = arg
+                middle = self.generate(elem, depth) if sep is None else self.generate(("cycle", [elem, sep]), depth)
+                return self.generate(left, depth) + middle + self.generate(right, depth)
+            case "option":
+                parts = list((arg[0] if isinstance(arg, tuple) else arg).values())
+                if deep:
+                    return self.generate(min(parts, key=self.size), depth)
+                return self.generate(rng.choice(parts), depth)
+            case "obligatory":
+                return self.generate(arg[0], depth)
+            case "ABA":
+                left, sep, right = arg
+                if rng.random() < 0.5:
+                    return self.generate(right, depth)
+                tokens = self.generate(left, depth)
+                if not deep and rng.random() < 0.5:
+                    tokens += self.generate(sep, depth) + self.generate(right, depth)
+                return tokens
+            case x:
+                raise NotImplementedError(f"undefined parse instruction '{x}'")
+
+    def expression(self, rule, depth: int) -> list[TOKEN]:
+        '''
+        tokens for the magic filter's RULE, ("repeat", ("option", {"term": TERM, ...})), that magic_parse_tree can resolve:
+        (prefix* term) (infix prefix* term)*, since arbitrary runs of terms and operators almost never are
+        '''
+        term = rule[1][1]["term"]
+        deep = depth <= 0
+        tokens = []
+        for i in range(1 + (0 if deep else self.rng.randint(0, 2))):
+            if i:
+                tokens.append(self.operator(INFIXES))
+            while not deep and self.rng.random() < 0.2:
+                tokens.append(self.operator(PREFIXES))
+            tokens += self.generate(term, depth)
+        return tokens
+    def operator(self, names: list[str]) -> TOKEN:
+        op = self.rng.choice(names)
+        # '=' has a token type of its own; every other operator, symbol or keyword, lexes as "op"
+        return ("=", op) if op == "=" else ("op", op)
+
+def parse_run(parser: type, root: str, tokens: list[TOKEN]) -> tuple[int, bool, int]:
+    '''
+    (p_general calls spent, whether ROOT matched all of TOKENS, furthest index any rule was tried at) for parsing TOKENS;
+    the parse may fail either way. raises Runaway past BUDGET calls
+    '''
+    calls = 0
+    furthest = 0
+    class Counting(parser):
+        def p_general(self, index, rule):
+            nonlocal calls, furthest
+            calls += 1
+            if calls > BUDGET:
+                raise Runaway(calls)
+            furthest = max(furthest, index)
+            return super().p_general(index, rule)
+    try:
+        ok, index, _ = Counting(tokens + [EOF]).p_general(0, ("rule", root))
+        complete = ok and index == len(tokens)
+    except (SyntaxError, RecursionError, NotImplementedError):
+        complete = False
+    return calls, complete, furthest
+
+def parse_cost(parser: type, root: str, tokens: list[TOKEN]) -> int:
+    '''p_general calls spent parsing TOKENS from ROOT, whether or not the parse succeeds; raises Runaway past BUDGET'''
+    return parse_run(parser, root, tokens)[0]
+
+def pumped(prefix: list, pump: list, suffix: list, count: int) -> list:
+    return prefix + pump * count + suffix
+
+def superlinear(parser: type, root: str, prefix: list, pump: list, suffix: list) -> bool:
+    '''
+    whether parse cost grows faster than SUPERLINEAR in the number of times PUMP is repeated
+    (not in the total length: a parse failing inside the pumped slice never pays for the suffix)
+    '''
+    samples = []
+    for count in PUMPS:
+        try:
+            samples.append((count, parse_cost(parser, root, pumped(prefix, pump, suffix, count))))
+        except Runaway:
+            return True
+    return scaling_exponent(samples) > SUPERLINEAR
+
+def minimize(parser: type, root: str, prefix: list, pump: list, suffix: list) -> tuple[list, list, list]:
+    '''drop chunks of PREFIX, PUMP and SUFFIX for as long as the growth stays super-linear'''
+    parts = [prefix, pump, suffix]
+    for which in (1, 0, 2):
+        chunk = max(len(parts[which]) // 2, 1)
+        while chunk:
+            i = 0
+            while i < len(parts[which]):
+                trial = list(parts)
+                trial[which] = parts[which][:i] + parts[which][i+chunk:]
+                if trial[1] and superlinear(parser, root, *trial):
+                    parts = trial
+                else:
+                    i += chunk
+            chunk //= 2
+    return parts[0], parts[1], parts[2]
+
+def reproducer(prefix: list, pump: list, suffix: list) -> str:
+    show = lambda tokens: " ".join(repr(value) for _, value in tokens)
+    return f"{show(prefix)} ({show(pump)})*N {show(suffix)}"
+
+def balanced(tokens: list[TOKEN]) -> bool:
+    '''whether every indent in TOKENS is closed by a later dedent in TOKENS, so repeating them keeps the nesting valid'''
+    depth = 0
+    for kind, _ in tokens:
+        depth += (kind == "indent") - (kind == "dedent")
+        if depth < 0:
+            return False
+    return depth == 0
+
+def fuzz_grammar(parser: type=Parser, root: str="file", programs: int=60, pumps_per_program: int=4, seed: int=0) -> list[str]:
+    '''
+    derive random programs from parser.GENERAL, repeat random slices of each, and look for parse cost
+    growing super-linearly in the repetition; every hit is minimized and returned as a reproducer.
+    only slices keeping indents balanced, and starting before the point where the program's parse gave up, are pumped:
+    a slice past that point is never parsed, so its repetition costs nothing
+    '''
+    rng = random.Random(seed)
+    fuzzer = GrammarFuzzer(parser.GENERAL, rng)
+    found = []
+    complete = 0
+    pumped_count = 0
+    for _ in range(programs):
+        tokens = []
+        while not tokens:
+            tokens = fuzzer.generate(("rule", root))
+        _, ok, furthest = parse_run(parser, root, tokens)
+        complete += ok
+        end = len(tokens) if ok else furthest
+        for _ in range(pumps_per_program):
+            for _ in range(20): # tries at a balanced slice
+                i = rng.randrange(len(tokens))
+                j = min(len(tokens), i + rng.randint(1, 8))
+                if i <= end and balanced(tokens[i:j]):
+                    break
+            else:
+                continue
+            prefix, pump, suffix = tokens[:i], tokens[i:j], tokens[j:]
+            pumped_count += 1
+            if superlinear(parser, root, prefix, pump, suffix):
+                found.append(reproducer(*minimize(parser, root, prefix, pump, suffix)))
+    found = sorted(set(found))
+    print(f"grammar of {parser.__name__} from {root!r}: {programs} programs ({complete/programs:.0%} parse completely), "
+          f"{pumped_count} pumps, {len(found)} super-linear")
+    for line in found:
+        print("   ", line)
+    return found
+
+def fuzz_ambiguous() -> list[str]:
+    '''the detector must find psbench.AmbiguousParser, which is exponential without packrat'''
+    from psbench import AmbiguousParser
+    return fuzz_grammar(AmbiguousParser, "nest", programs=20)
+
+FUZZERS = [fuzz_resolver, fuzz_resolver_scaling, fuzz_grammar, fuzz_ambiguous]
+
+if __name__ == "__main__":
+    for fuzz in FUZZERS:
+        fuzz()
+        print()
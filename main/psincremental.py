@@ -0,0 +1,308 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import accumulate
+from pslexer import scan_spans
+from psparser import Parser, KEYWORDS, KEYOPS, TOKEN, TREE, RESULT
+
+'''
+incremental front end for editor integrations
+
+the source is split into lines at every checkpoint reported by 'scan_spans'
+(the end of each run of newlines), each holding its own text, its tokens, and the lexer state it starts in.
+after an edit, lexing resumes at the line holding the edit's start and stops
+as soon as it reaches a line start that existed before the edit in the same state;
+every token from there on is known to be unchanged.
+the lexer only ever sees a window of text: the edited line, then as many following lines as it needs, doubled on each retry.
+
+the raw tree of the 'file' rule is a list of top-level items (start, procedure, newline).
+every item ends with a terminal ('end', 'return', '\n'), so parsing an item never reads past it.
+only items overlapping the changed tokens are re-parsed, again until an old item boundary is reached;
+the parser reads tokens through a view that pulls them out of the lines as it goes.
+
+lines and items live in Chunks: blocks of at most 2*BLOCK entries that keep their entries' sizes and totals,
+so finding the line at a char offset or the item at a token index, and splicing in the new ones, touches one block's entries
+and takes C-level prefix sums over the block totals (a thousand or so for megabytes of source).
+an edit costs time in proportion to the re-lexed lines and re-parsed items, plus that small per-block term;
+the whole source is only joined when 'src' is read, and an edit that fails to lex or parse leaves the next edit to rebuild from scratch.
+'''
+
+STATE = tuple[bool, int, tuple[str, ...]] # (recent_nl, parens, indent stack)
+LINE = tuple[str, list[TOKEN], STATE] # (text, tokens, lexer state at the line start)
+ITEM = tuple[int, TREE] # (token count, raw tree)
+INITIAL_STATE: STATE = (False, 0, ("",))
+FILE_ITEM = Parser.GENERAL["file"][1]
+WINDOW = 8 # lines lexed past the edit on the first try
+
+class Chunks:
+    '''
+    a list kept as blocks of entries; every entry weighs WEIGH(entry) -> tuple of AXES ints,
+    and an entry's start on an axis is the sum of that axis over the entries before it.
+    each block keeps its entries' weights and the totals, so positions are found with C-level prefix sums over blocks, then within one block.
+    'replace' swaps in new blocks instead of changing old ones, so a snapshot only copies the lists of blocks
+    '''
+    BLOCK = 256
+    def __init__(self, axes: int, weigh, entries=()):
+        self.axes = axes
+        self.weigh = weigh
+        self.blocks: list[list] = []
+        self.weights: list[tuple[list[int], ...]] = [] # per block, per axis: the weight of each entry
+        self.sums: list[list[int]] = [[] for _ in range(axes)] # per axis, per block: the total weight
+        self.lengths: list[int] = [] # per block: the number of entries
+        self.replace(0, 0, list(entries))
+    def __len__(self) -> int:
+        return sum(self.lengths)
+    def snapshot(self) -> "Chunks":
+        '''a copy that later replacements leave alone'''
+        copy = Chunks(self.axes, self.weigh)
+        copy.blocks = list(self.blocks)
+        copy.weights = list(self.weights)
+        copy.sums = [list(sums) for sums in self.sums]
+        copy.lengths = list(self.lengths)
+        return copy
+    def total(self) -> tuple[int, ...]:
+        return tuple(sum(sums) for sums in self.sums)
+    def locate(self, index: int) -> tuple[int, int]:
+        '''(block, position within it) of entry INDEX; (len(blocks), 0) past the end'''
+        ends = list(accumulate(self.lengths))
+        b = bisect_right(ends, index)
+        if b == len(ends):
+            return b, 0
+        return b, index - (ends[b-1] if b else 0)
+    def find(self, axis: int, position: int) -> tuple[int, tuple[int, ...]]:
+        '''(index, starts) of the last entry whose start on AXIS is at most POSITION, and the start of that entry on every axis'''
+        if not self.blocks:
+            return 0, (0,) * self.axes
+        b = min(bisect_right(list(accumulate(self.sums[axis])), position), len(self.blocks) - 1)
+        starts = [sum(sums[:b]) for sums in self.sums]
+        weights = self.weights[b]
+        i = min(bisect_right(list(accumulate(weights[axis])), position - starts[axis]), self.lengths[b] - 1)
+        return sum(self.lengths[:b]) + i, tuple(start + sum(column[:i]) for start, column in zip(starts, weights))
+    def entries(self, index: int):
+        '''the entries from INDEX on'''
+        b, i = self.locate(index)
+        for block in self.blocks[b:]:
+            yield from block[i:]
+            i = 0
+    def replace(self, start: int, end: int, entries: list):
+        '''self[start:end] = ENTRIES'''
+        b, i = self.locate(start)
+        c, j = self.locate(end)
+        if c < len(self.blocks):
+            merged = self.blocks[b][:i] + entries + self.blocks[c][j:]
+            c += 1
+        else:
+            merged = (self.blocks[b][:i] if b < len(self.blocks) else []) + entries
+        size = self.BLOCK
+        if len(merged) > 2 * size:
+            pieces = [merged[k:k+size] for k in range(0, len(merged), size)]
+        else:
+            pieces = [merged] if merged else []
+        weights = [tuple(map(list, zip(*map(self.weigh, piece)))) for piece in pieces]
+        self.blocks[b:c] = pieces
+        self.weights[b:c] = weights
+        for axis, sums in enumerate(self.sums):
+            sums[b:c] = [sum(columns[axis]) for columns in weights]
+        self.lengths[b:c] = [len(piece) for piece in pieces]
+
+def line_weight(line: LINE) -> tuple[int, int]:
+    return len(line[0]), len(line[1])
+
+def item_weight(item: ITEM) -> tuple[int]:
+    return (item[0],)
+
+class TokenView(Sequence):
+    '''the tokens of LINES from token START on, read out of the lines only as far as they are indexed'''
+    def __init__(self, lines: Chunks, start: int):
+        self.length = lines.total()[1] - start
+        index, (_, first) = lines.find(1, start)
+        self.source = lines.entries(index)
+        self.tokens: list[TOKEN] = []
+        self.skip = start - first
+    def fill(self, size: int):
+        while len(self.tokens) < size:
+            tokens = next(self.source)[1]
+            if self.skip:
+                tokens, self.skip = tokens[self.skip:], max(self.skip - len(tokens), 0)
+            self.tokens += tokens
+    def __len__(self) -> int:
+        return self.length
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self.fill(min(index.indices(self.length)[1], self.length))
+            return self.tokens[index]
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        self.fill(index + 1)
+        return self.tokens[index]
+
+class Trees(Sequence):
+    '''the raw trees of a Chunks of items, equal to the list Parser.parse would return'''
+    def __init__(self, items: Chunks):
+        self.items = items
+    def __len__(self) -> int:
+        return len(self.items)
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if index < 0:
+            raise IndexError(index)
+        for _, tree in self.items.entries(index):
+            return tree
+        raise IndexError(index)
+    def __iter__(self):
+        return (tree for _, tree in self.items.entries(0))
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Trees, list)):
+            return list(self) == list(other)
+        return NotImplemented
+    __hash__ = None
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+class IncrementalParser:
+    def __init__(self, code: str):
+        self.lines = Chunks(2, line_weight)
+        self.items = Chunks(1, item_weight)
+        self.stale: str | None = None # the source, while lines and items are out of date
+        self.rebuild(code)
+    @property
+    def src(self) -> str:
+        '''the current source, joined from the lines'''
+        if self.stale is not None:
+            return self.stale
+        return "".join(text for text, _, _ in self.lines.entries(0))
+    @property
+    def result(self) -> RESULT:
+        '''the same result Parser.parse(self.src) would return, with the trees as a read-only sequence'''
+        return True, self.items.total()[0], Trees(self.items.snapshot())
+    def rebuild(self, code: str):
+        self.stale = code
+        lines, _ = self.lex_lines(code, INITIAL_STATE, None)
+        self.lines = Chunks(2, line_weight, lines)
+        self.items = Chunks(1, item_weight)
+        self.reparse(0, 0, self.lines.total()[1])
+        self.stale = None
+    def edit(self, start: int, end: int, text: str) -> RESULT:
+        '''replace src[start:end] with TEXT, then bring tokens and tree up to date'''
+        if self.stale is not None:
+            self.rebuild(self.stale[:start] + text + self.stale[end:])
+            return self.result
+        relexed = False
+        try:
+            first, old_end, new_count = self.relex(start, end, text)
+            relexed = True
+            self.reparse(first, old_end, new_count)
+        except Exception as e:
+            # start from scratch on the next edit
+            src = self.src
+            self.stale = src if relexed else src[:start] + text + src[end:]
+            raise e
+        return self.result
+    # LEXING
+    @staticmethod
+    def lex_lines(window: str, state: STATE, stop) -> tuple[list[LINE], int|None]:
+        '''
+        lex WINDOW from its start in lexer STATE, grouping tokens by line
+        STOP(offset, state) -> bool is consulted at each new line start; when true, lexing halts there
+        returns (lines, offset of the line lexing halted at or None if the end of WINDOW was reached)
+        '''
+        recent_nl, parens, indent = state
+        checkpoints = []
+        lines = []
+        tokens = []
+        seen = 0
+        line_start, line_state = 0, state
+        for token, _, _ in scan_spans(window, KEYWORDS, KEYOPS, 0, list(indent), parens, recent_nl, checkpoints):
+            while seen < len(checkpoints):
+                at, parens, indent = checkpoints[seen]
+                seen += 1
+                lines.append((window[line_start:at], tokens, line_state))
+                line_start, line_state, tokens = at, (parens == 0, parens, indent), []
+                if stop is not None and stop(line_start, line_state):
+                    return lines, line_start
+            tokens.append(token)
+        lines.append((window[line_start:], tokens, line_state))
+        return lines, None
+    def relex(self, start: int, end: int, text: str) -> tuple[int, int, int]:
+        '''
+        re-lex after src[start:end] was replaced by TEXT
+        returns (first changed token, end of the changed tokens before the edit, number of tokens replacing them)
+        '''
+        lines = self.lines
+        size = len(lines)
+        k, (line_start, first) = lines.find(0, start)
+        m, _ = lines.find(0, end)
+        old = lines.entries(k)
+        edited = [next(old) for _ in range(k, m + 1)]
+        head = "".join(line[0] for line in edited)
+        head = head[:start - line_start] + text + head[end - line_start:]
+        counts = [len(line[1]) for line in edited] # token counts of the old lines from k on, as far as they were read
+        following: list[STATE] = [] # states of the old lines after m in the window
+        boundaries: dict[int, int] = {} # window offset of an old line start after the edit -> its index
+        window = head
+        extra = WINDOW
+        while True:
+            added = []
+            offset = len(window)
+            for line in old:
+                boundaries[offset] = m + 1 + len(following)
+                following.append(line[2])
+                counts.append(len(line[1]))
+                added.append(line[0])
+                offset += len(line[0])
+                if len(following) >= extra:
+                    break
+            window += "".join(added)
+            complete = m + 1 + len(following) >= size
+            synced = size
+            def stop(at: int, state: STATE) -> bool:
+                nonlocal synced
+                j = boundaries.get(at)
+                if j is not None and following[j - m - 1] == state:
+                    synced = j
+                    return True
+                return False
+            try:
+                new_lines, halted = self.lex_lines(window, edited[0][2], stop)
+            except SyntaxError:
+                # a token cut off by the end of the window fails here too
+                if complete:
+                    raise
+                halted = None
+            if halted is not None or complete:
+                break
+            extra *= 2
+        old_end = first + sum(counts[:synced - k]) if synced < size else lines.total()[1]
+        lines.replace(k, synced, new_lines)
+        return first, old_end, sum(len(line[1]) for line in new_lines)
+    # PARSING
+    def reparse(self, first: int, old_end: int, new_count: int):
+        '''re-parse the top-level items touching tokens [first, old_end), which now occupy NEW_COUNT tokens'''
+        items = self.items
+        size = len(items)
+        i, (start,) = items.find(0, first)
+        # positions from here on are relative to START, the first re-parsed item
+        shift = new_count - (old_end - first)
+        changed_end = first - start + new_count
+        parser = Parser(TokenView(self.lines, start))
+        old = items.entries(i)
+        old_start = 0 # of item SYNCED, before the edit
+        synced = i
+        index = 0
+        new_items = []
+        while True:
+            if index >= changed_end:
+                while old_start < index - shift and synced < size:
+                    old_start += next(old)[0]
+                    synced += 1
+                if old_start == index - shift:
+                    break
+            ok, after, tree = parser.p_general(index, FILE_ITEM)
+            if not ok:
+                synced = size
+                break
+            new_items.append((after - index, tree))
+            index = after
+        items.replace(i, synced, new_items)
@@ -1,5 +1,6 @@
 from pstyper import Type, Any, Basic, List, Procedure, Function, ListFunction, SIMPLE_TYPES
 import json
+from psresolve import resolve, Resolver, Layout, UNBOUND, LOCAL, GLOBAL, BUILTIN
 
 BUILTINS = {
     "isNumeric": str.isnumeric,
@@ -34,12 +35,19 @@ def accept_number_input(print_function, input_function, support_float) -> int|fl
     print_function("using input=0")
     return 0
 
-class Variable:
-    def __init__(self, type: Type, value=None):
-        if not isinstance(type, Type):
-            raise TypeError(type)
-        self.type = type
-        self.value = value
+# how a frame template builds each declaration's value, in order
+VALUE, GARBAGE, CONSTANT, DECLARE = range(4)
+IMMUTABLE = (int, float, str, bool)
+
+class Template:
+    '''a procedure, prepared once for every call to it'''
+    __slots__ = ("layout", "frame", "params", "sized", "steps")
+    def __init__(self, layout: Layout, frame: list, params: list[int], sized: list, steps: list[tuple]):
+        self.layout = layout
+        self.frame = frame # copied for each call: unbound, or the values of leading declarations that never change
+        self.params = params # the arguments' slots
+        self.sized = sized # arguments whose array sizes are still evaluated, in the caller's frame
+        self.steps = steps # (kind, slot, value, type, or declaration) for the rest of the declarations
 
 class Interpreter:
     @staticmethod
@@ -88,7 +96,20 @@ class Interpreter:
         self.open_files = {}
         self.main_body = parse_tree["starts"][0]["body"]
         self.procedures = dict((i["name"], i) for i in parse_tree["procedures"])
-        self.var_stack = [{"eof": Variable(Basic("bool"), False)}]
+        # frames are lists of values, laid out by psresolve; layout_stack holds the Layout of each frame in var_stack
+        self.resolution = resolve(parse_tree, BUILTINS)
+        self.addresses = self.resolution.addresses
+        main = self.resolution.main
+        self.var_stack = [main.frame()]
+        self.var_stack[0][main.slots["eof"]] = False
+        self.layout_stack = [main]
+        self.templates: dict[str, Template] = {}
+        # the start block's constants: once its declarations have run, nothing can change them
+        loops = Layout(None)
+        for stmt in self.main_body["statements"]:
+            Resolver.loop_variables(loops, stmt)
+        names = [decl["predicate"]["name"] for decl in self.main_body["declarations"]]
+        self.main_constants = set(name for name in names if name == name.upper() and names.count(name) == 1) - set(loops.slots)
     def start(self):
         self.read_declarations(self.main_body["declarations"])
         try:
@@ -100,15 +121,17 @@ class Interpreter:
             raise e
     def read_declarations(self, decls):
         for dec in decls:
-            pred = dec["predicate"]
-            var_name = pred["name"]
-            var_type = self.build_type(pred)
-            initial_value = dec.get("initial")
-            if initial_value is None:
-                initial_value = var_type.get_garbage()
-            else:
-                initial_value = self.eval_expr(initial_value)
-            self.var_stack[-1][var_name] = Variable(var_type, initial_value)
+            self.read_declaration(dec)
+    def read_declaration(self, dec):
+        pred = dec["predicate"]
+        var_name = pred["name"]
+        var_type = self.build_type(pred)
+        initial_value = dec.get("initial")
+        if initial_value is None:
+            initial_value = var_type.get_garbage()
+        else:
+            initial_value = self.eval_expr(initial_value)
+        self.var_stack[-1][self.layout_stack[-1].slots[var_name]] = initial_value
     def build_type(self, pred) -> Type:
         raw_element, raw_suffixes = pred["element"], pred["suffixes"]
         element = self.decide_type(raw_element)
@@ -129,13 +152,13 @@ class Interpreter:
                 return List(elem, value)
             case x:
                 raise NotImplementedError(f"type-suffix {repr(x)}")
-    def select_open_mode(self, name: str):
-        var = self.get_var(name)
-        if var.type == Basic("InputFile"):
+    def select_open_mode(self, stmt):
+        _, _, var_type = self.binding(self.addresses[id(stmt)])
+        if var_type == Basic("InputFile"):
             return "r"
-        if var.type == Basic("OutputFile"):
+        if var_type == Basic("OutputFile"):
             return "w"
-        raise TypeError("unsupported file type", var.type)
+        raise TypeError("unsupported file type", var_type)
     def do_statement(self, stmt):
         if stmt is None: return
         match stmt["type"]:
@@ -158,7 +181,7 @@ class Interpreter:
             case "output":
                 self.do_output(stmt)
             case "open":
-                mode = self.select_open_mode(stmt["name"])
+                mode = self.select_open_mode(stmt)
                 self.do_open(stmt, mode)
             case "close":
                 self.do_close(stmt)
@@ -191,30 +214,38 @@ class Interpreter:
         start_val = self.eval_expr(start_expr)
         stop_val = self.eval_expr(stop_expr)
         step_val = self.eval_expr(step_expr)
-        var_name = stmt["variable"]
+        slot = self.addresses[id(stmt)]
         if step_val == 0:
             raise ZeroDivisionError("step value cannot be zero")
         if (start_val == stop_val) or (start_val < stop_val) != (0 < step_val):
             return # empty range
+        if type(start_val) is int and type(stop_val) is int and type(step_val) is int:
+            values = range(start_val, stop_val, step_val)
+        else:
+            values = self.float_steps(start_val, stop_val, step_val)
+        current_local = self.var_stack[-1]
+        statements = stmt["body"]["statements"]
+        do_statement = self.do_statement
+        for parameter in values:
+            current_local[slot] = parameter
+            for sub in statements:
+                do_statement(sub)
+        # the variable only exists within the loop
+        current_local[slot] = UNBOUND
+    @staticmethod
+    def float_steps(start_val, stop_val, step_val):
+        # why go through all this trouble?
+        # python doesn't support float ranges;
+        # this is the most stable and error-resistant way to implement them
         negative = step_val < 0
         if negative: # ensure the loop condition comparison works as expected
             step_val, start_val, stop_val = -step_val, -start_val, -stop_val
         index = 0
         parameter = start_val
-        current_local = self.var_stack[-1]
-        # why go through all this trouble?
-        # python doesn't support float ranges;
-        # this is the most stable and error-resistant way to implement them
         while parameter < stop_val:
-            if negative:
-                parameter = -parameter
-            current_local[var_name] = Variable(Basic("num"), parameter)
-            self.do_body(stmt["body"])
+            yield -parameter if negative else parameter
             index += 1
             parameter = start_val + step_val * index
-        # in case the loop never triggered for any reason, check
-        if var_name in current_local:
-            del current_local[var_name]
     def do_case(self, stmt):
         arg_value = self.eval_expr(stmt["variable"])
         chosen_body = stmt["default"]
@@ -230,10 +261,11 @@ class Interpreter:
     def do_input(self, stmt):
         variables = []
         seen = set()
-        for name in stmt["values"]:
+        for address in self.addresses[id(stmt)]:
+            name = address[2]
             if name in seen:
                 raise NameError("cannot assign to the same variable multiple times in the same input statement")
-            variables.append(self.get_var(name))
+            variables.append(self.binding(address))
             seen.add(name)
         # read input
         destination = stmt["file"]
@@ -243,7 +275,8 @@ class Interpreter:
         file = self.eval_atom(destination)
         string = file.readline()
         if not string:
-            self.get_var("eof").value = True
+            frame, slot, _ = self.get_var("eof")
+            frame[slot] = True
             return
         if string[-1] == "\n":
             string = string[:-1]
@@ -252,36 +285,50 @@ class Interpreter:
             print("Input warning: not enough values for variables")
         elif len(results) > len(variables):
             print("Input warning: too many values for variables")
-        for v,r in zip(variables, results):
-            if v.type == Basic("num"):
-                v.value = int(r)
-            elif v.type == Basic("float"):
-                v.value = float(r)
-            elif v.type == Basic("string"):
-                v.value = r
+        for (frame, slot, var_type),r in zip(variables, results):
+            if var_type == Basic("num"):
+                frame[slot] = int(r)
+            elif var_type == Basic("float"):
+                frame[slot] = float(r)
+            elif var_type == Basic("string"):
+                frame[slot] = r
             else:
                 raise NotImplementedError("undefined input type")
     def probe_console_input(self, variables):
         if len(variables) != 1:
             raise NotImplementedError # TODO: take input and parse it out to a list of variables
-        only_var = variables[0]
+        frame, slot, var_type = variables[0]
         results = []
-        if only_var.type == Basic("num"):
+        if var_type == Basic("num"):
             results.append(accept_number_input(self.canonical_print, self.canonical_input, False))
-        elif only_var.type == Basic("float"):
+        elif var_type == Basic("float"):
             results.append(float(accept_number_input(self.canonical_print, self.canonical_input, True)))
-        elif only_var.type == Basic("string"):
+        elif var_type == Basic("string"):
             results.append(input())
         else:
             raise NotImplementedError("undefined input type")
-        for v,r in zip(variables, results):
-            v.value = r
+        frame[slot] = results[0]
         return results
-    def get_var(self, name) -> Variable | None:
-        for vars in reversed(self.var_stack):
-            if name in vars:
-                return vars[name]
-        raise NameError(f"writing to undeclared variable {repr(name)}")
+    # variables: a binding is (frame, slot, declared type)
+    def find_var(self, name) -> tuple | None:
+        for frame, layout in zip(reversed(self.var_stack), reversed(self.layout_stack)):
+            slot = layout.slots.get(name)
+            if slot is not None and frame[slot] is not UNBOUND:
+                return frame, slot, layout.types[slot]
+        return None
+    def get_var(self, name) -> tuple:
+        binding = self.find_var(name)
+        if binding is None:
+            raise NameError(f"writing to undeclared variable {repr(name)}")
+        return binding
+    def binding(self, address) -> tuple:
+        kind, slot, name = address
+        if kind == LOCAL or kind == GLOBAL:
+            depth = -1 if kind == LOCAL else 0
+            frame = self.var_stack[depth]
+            if frame[slot] is not UNBOUND:
+                return frame, slot, self.layout_stack[depth].types[slot]
+        return self.get_var(name)
     def do_output(self, stmt):
         parts = []
         for part in stmt["values"]:
@@ -297,12 +344,13 @@ class Interpreter:
         path = self.eval_atom(stmt["path"])
         if path in self.open_files:
             raise PermissionError("cannot open a file while it's open")
-        var = self.get_var(stmt["name"])
+        frame, slot, _ = self.binding(self.addresses[id(stmt)])
         file = open(path, mode)
-        var.value = file
+        frame[slot] = file
         self.open_files[path] = file
     def do_close(self, stmt):
-        file = self.get_var(stmt["name"]).value
+        frame, slot, _ = self.binding(self.addresses[id(stmt)])
+        file = frame[slot]
         key = None
         for k,v in self.open_files.items():
             if v == file:
@@ -315,26 +363,46 @@ class Interpreter:
     def read_var(self, name):
         if name in BUILTINS:
             return BUILTINS[name]
-        for vars in reversed(self.var_stack):
-            if name in vars:
-                result = vars[name].value
-                if result is None:
-                    raise NameError(f"{repr(name)} read before assignment")
-                return result
+        binding = self.find_var(name)
+        if binding is not None:
+            frame, slot, _ = binding
+            if frame[slot] is None:
+                raise NameError(f"{repr(name)} read before assignment")
+            return frame[slot]
         if name in self.procedures:
             return self.procedures[name]
         raise NameError(f"{repr(name)} referenced before declaration- how did this escape the typechecker?")
+    def read_address(self, address):
+        kind, slot, name = address
+        if kind == LOCAL:
+            result = self.var_stack[-1][slot]
+        elif kind == GLOBAL:
+            result = self.var_stack[0][slot]
+        elif kind == BUILTIN:
+            return slot
+        else:
+            return self.read_var(name)
+        if result is UNBOUND: # not bound in its own frame at the moment; look further out
+            return self.read_var(name)
+        if result is None:
+            raise NameError(f"{repr(name)} read before assignment")
+        return result
     # special
     def assign_to_lval(self, lval, value):
         match lval["type"]:
             case "variable":
-                name = lval["name"]
-                if name in BUILTINS:
+                kind, slot, name = self.addresses[id(lval)]
+                if kind == BUILTIN:
                     raise TypeError(f"cannot assign to builtin constant {name}")
-                for vars in reversed(self.var_stack):
-                    if name in vars:
-                        vars[name].value = value
+                if kind == LOCAL or kind == GLOBAL:
+                    frame = self.var_stack[-1 if kind == LOCAL else 0]
+                    if frame[slot] is not UNBOUND:
+                        frame[slot] = value
                         return
+                binding = self.find_var(name)
+                if binding is not None:
+                    frame, slot, _ = binding
+                    frame[slot] = value
             case "subscript":
                 head = self.eval_term(lval["head"])
                 index = self.eval_expr(lval["index"])
@@ -407,11 +475,10 @@ class Interpreter:
         return head
     def eval_atom(self, atom):
         match atom["type"]:
-            case "num" | "float" | "string" | "bool":
+            case "num" | "float" | "string" | "bool" | "const": # const: a list psoptimize built ahead of time
                 return atom["value"]
             case "name":
-                name = atom["value"]
-                return self.read_var(name)
+                return self.read_address(self.addresses[id(atom)])
             case "group":
                 return self.eval_expr(atom["value"])
             case "list":
@@ -430,17 +497,98 @@ class Interpreter:
                 args = []
                 for arg in suff["value"]:
                     args.append(self.eval_expr(arg))
-                if isinstance(head, dict):
+                if not callable(head): # a procedure's tree
                     return self.call_function(head, args)
                 return head(*args)
             case x:
                 raise NotImplementedError(f"suffix type {repr(x)}")
     def call_function(self, code, args):
-        new_local = {}
-        for pair, arg in zip(code["args"], args):
-            t = self.build_type(pair)
-            new_local[pair["name"]] = Variable(t, arg)
+        template = self.templates.get(code["name"]) or self.template(code)
+        for pair in template.sized:
+            self.build_type(pair)
+        new_local = template.frame.copy()
+        for slot, arg in zip(template.params, args):
+            new_local[slot] = arg
         self.var_stack.append(new_local)
-        self.read_declarations(code["body"]["declarations"])
+        self.layout_stack.append(template.layout)
+        steps = template.steps
+        for n, (kind, slot, payload) in enumerate(steps):
+            if kind == VALUE:
+                new_local[slot] = payload
+            elif kind == GARBAGE:
+                new_local[slot] = payload.get_garbage()
+            elif kind == CONSTANT:
+                value = new_local[slot] = self.eval_expr(payload)
+                if type(value) in IMMUTABLE:
+                    steps[n] = (VALUE, slot, value)
+            else:
+                self.read_declaration(payload)
         self.do_body(code["body"])
         self.var_stack.pop(-1)
+        self.layout_stack.pop(-1)
+    def template(self, code) -> Template:
+        '''prepare CODE (a procedure) for calls: nothing about it that's the same every time is done twice'''
+        layout = self.resolution.procedures[code["name"]]
+        frame = layout.frame()
+        params = [layout.slots[pair["name"]] for pair in code["args"]]
+        sized = [pair for pair in code["args"] if any(suff["size"] is not None for suff in pair["suffixes"])]
+        loops = Layout(None)
+        for stmt in code["body"]["statements"]:
+            Resolver.loop_variables(loops, stmt)
+        decls = code["body"]["declarations"]
+        names = [pair["name"] for pair in code["args"]] + [dec["predicate"]["name"] for dec in decls]
+        # names that hold their declaration's value until the statements run
+        trusted = set(name for name in names if names.count(name) == 1) - set(loops.slots)
+        known = set() # trusted names whose value is the same in every call
+        steps = []
+        leading = True # until a declaration has to be evaluated, unbound slots can't be looked up
+        for dec in decls:
+            pred, initial = dec["predicate"], dec["initial"]
+            name = pred["name"]
+            slot = layout.slots[name]
+            if not all(suff["size"] is None or suff["size"]["type"] == "num" for suff in pred["suffixes"]):
+                steps.append((DECLARE, slot, dec))
+                leading = False
+                continue
+            if initial is None:
+                value_type = self.build_type(pred)
+                if isinstance(value_type, List):
+                    steps.append((GARBAGE, slot, value_type))
+                    continue
+                step = (VALUE, slot, None)
+            elif initial["type"] in ("num", "float", "string", "bool", "const"):
+                step = (VALUE, slot, initial["value"])
+            elif self.fixed(initial, known):
+                step = (CONSTANT, slot, initial)
+            else:
+                steps.append((DECLARE, slot, dec))
+                leading = False
+                continue
+            if name in trusted:
+                known.add(name)
+            if leading and step[0] == VALUE and name in trusted:
+                frame[slot] = step[2]
+            else:
+                steps.append(step)
+        template = self.templates[code["name"]] = Template(layout, frame, params, sized, steps)
+        return template
+    def fixed(self, expr, known: set[str]) -> bool:
+        '''whether EXPR is the same in every call: pure, and only reads KNOWN locals and the start block's constants'''
+        match expr["type"]:
+            case "num" | "float" | "string" | "bool" | "const":
+                return True
+            case "infix":
+                return self.fixed(expr["left"], known) and self.fixed(expr["right"], known)
+            case "prefix":
+                return self.fixed(expr["right"], known)
+            case "group":
+                return self.fixed(expr["value"], known)
+            case "name":
+                kind, _, name = self.addresses[id(expr)]
+                return (kind == LOCAL and name in known) or (kind == GLOBAL and name in self.main_constants)
+            case "term":
+                head, suff = expr["head"], expr["suffix"]
+                if suff["type"] != "call" or head["type"] != "name" or self.addresses[id(head)][0] != BUILTIN:
+                    return False
+                return all(self.fixed(arg, known) for arg in suff["value"])
+        return False
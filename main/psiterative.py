@@ -0,0 +1,204 @@
+import ast
+import inspect
+import textwrap
+from psparser import Parser, RESULT, TREE
+from psfused import FusedParser
+from pstyper import TypeChecker
+
+'''
+recursion-free front end for deeply nested programs
+
+every recursive method gets a generator twin that yields where it used to recurse,
+and a loop drives a stack of such generators: nesting depth is limited by memory instead of the recursion limit,
+and no python frame is entered per level of the tree.
+the twins are not written out: 'derive' recompiles the original method's source with each recursive call replaced by a yield,
+so Parser.p_general and the TypeChecker handler tables stay the only copy of every rule.
+only the calls that recurse are rewritten: sub-parses (self.p_general), and TypeChecker dispatchers or handlers fetched from its tables.
+this needs the .py sources of psparser and pstyper at import time; where they are not shipped, importing psiterative fails with an ImportError.
+parsing yields (index, rule) and is sent the RESULT; type checking yields sub-generators and is sent their Type.
+
+the fused builders (see psfused) never recurse, so IterativeFusedParser covers post-parsing as well;
+the raw tree + Postparser route stays recursive.
+expressions are resolved by psmagic.magic_parse_tree, which keeps its own operator stack as well.
+'''
+
+class Suspender(ast.NodeTransformer):
+    '''
+    turns the calls SUSPENDS picks into yields of what it returns for them, after renaming self.X to self.RENAMES[X]
+    SUSPENDS(call, handlers) also gets the local names bound to something read from one of the tables self.TABLES,
+    so a handler fetched from a dispatch table can be told apart from any other call
+    '''
+    def __init__(self, suspends, renames: dict[str, str], tables=()):
+        self.suspends = suspends
+        self.renames = renames
+        self.tables = set(tables)
+        self.handlers: set[str] = set()
+        self.found = False
+    def collect(self, definition):
+        for node in ast.walk(definition):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                if any(is_self_attribute(part, self.tables) for part in ast.walk(node.value)):
+                    self.handlers.add(node.targets[0].id)
+    def visit_Attribute(self, node):
+        self.generic_visit(node)
+        if is_self_attribute(node, self.renames):
+            node.attr = self.renames[node.attr]
+        return node
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        value = self.suspends(node, self.handlers)
+        if value is None:
+            return node
+        self.found = True
+        return ast.Yield(value)
+
+def is_self_attribute(node, names) -> bool:
+    '''whether NODE is self.X for some X in NAMES'''
+    return isinstance(node, ast.Attribute) and node.attr in names and isinstance(node.value, ast.Name) and node.value.id == "self"
+
+def derive(function, name: str, suspends, renames: dict[str, str]={}, tables=()):
+    '''
+    FUNCTION recompiled as the generator NAME: each call SUSPENDS maps to an expression becomes a yield of that expression,
+    and whatever is sent back stands in for the call's result (see Suspender).
+    it runs in FUNCTION's globals and keeps its line numbers, so tracebacks point at the original source.
+    the source has to be there to read: without it, importing this module fails
+    '''
+    code = inspect.unwrap(function).__code__
+    try:
+        source = inspect.getsource(function)
+    except (OSError, TypeError) as e:
+        raise ImportError(f"psiterative builds {name} from the source of {function.__qualname__}, which cannot be read: {e}") from e
+    tree = ast.parse(textwrap.dedent(source))
+    ast.increment_lineno(tree, code.co_firstlineno - 1)
+    definition = tree.body[0]
+    definition.name = name
+    definition.decorator_list = []
+    suspender = Suspender(suspends, renames, tables)
+    suspender.collect(definition)
+    suspender.visit(definition)
+    if not suspender.found:
+        # still a generator, returning at its first step
+        definition.body.append(ast.If(ast.Constant(False), [ast.Expr(ast.Yield())], []))
+    namespace = {}
+    exec(compile(ast.fix_missing_locations(tree), code.co_filename, "exec"), function.__globals__, namespace)
+    generator = namespace[name]
+    generator.__qualname__ = f"{function.__qualname__.rpartition('.')[0]}.{name}".lstrip(".")
+    return generator
+
+class IterativeParser(Parser):
+    '''
+    Parser whose p_general keeps its own stack of suspended calls
+    self.stack always holds the active rules, so error messages cost nothing extra and trace only adds the callback
+    '''
+    def __init__(self, src, packrat: bool=False, trace=False):
+        super().__init__(src, packrat)
+        self.trace = trace
+        self.stack = []
+        self.p_general = self.p_iterative
+    def p_iterative(self, index, rule) -> RESULT:
+        stack = self.stack
+        base = len(stack)
+        memo = self.memo
+        trace = self.trace if callable(self.trace) else None
+        general = Parser.p_general
+        calls = [] # (generator, memo table or None)
+        try:
+            while True:
+                # begin p_general(index, rule): either its value is known at once, or a generator is pushed
+                value = None
+                key = rule[0]
+                table = None
+                if key == "rule" and memo is not None:
+                    table = memo.get(index)
+                    if table is None:
+                        table = memo[index] = {}
+                    else:
+                        value = table.get(rule[1])
+                if value is None:
+                    stack.append(rule)
+                    if trace is not None:
+                        trace(stack, index)
+                    if key == "type":
+                        value = general(self, index, rule)
+                        stack.pop()
+                    else:
+                        calls.append((self.g_general(index, rule), table))
+                # resume the innermost call until it asks for another sub-parse
+                while True:
+                    if not calls:
+                        return value
+                    generator, table = calls[-1]
+                    try:
+                        index, rule = generator.send(value)
+                        break
+                    except StopIteration as done:
+                        calls.pop()
+                        value = done.value
+                        if table is not None:
+                            table[stack[-1][1]] = value
+                        stack.pop()
+        except BaseException:
+            del stack[base:]
+            raise
+    # Parser.p_general, suspending at every sub-parse: it yields (index, rule) and is sent the RESULT
+    g_general = derive(Parser.p_general, "g_general", lambda call, _: ast.Tuple(call.args, ast.Load()) if is_self_attribute(call.func, {"p_general"}) else None)
+
+class IterativeFusedParser(IterativeParser, FusedParser):
+    '''FusedParser without recursion: parses straight to the final tree at any depth'''
+
+def iterative_tree(code: str, packed: bool=False) -> TREE:
+    '''the post-parsed tree of CODE, as Postparser.p_file would return it'''
+    _, _, items = IterativeFusedParser.parse(code, packed)
+    return FusedParser.file_tree(items)
+
+def run(generator):
+    '''drive a generator that yields sub-generators and is sent their return values; returns its own'''
+    calls = [generator]
+    value = None
+    while True:
+        try:
+            request = calls[-1].send(value)
+        except StopIteration as done:
+            calls.pop()
+            if not calls:
+                return done.value
+            value = done.value
+            continue
+        calls.append(request)
+        value = None
+
+# TypeChecker methods that pick a handler; the others are the handlers in its tables
+DISPATCHERS = "check_body check_else check_stmt check_expr check_cond check_term check_atom check_lval apply_suffix".split()
+
+def iterative_checks(cls):
+    '''
+    class decorator for a TypeChecker subclass: every dispatcher and handler it inherits gets a g_ generator twin,
+    each table TABLE a G_TABLE of those twins, and each dispatcher becomes 'run' over its twin.
+    a twin suspends at exactly two kinds of call: self.DISPATCHER(...), and a handler fetched from one of the tables;
+    every other call (helpers, isinstance, ...) runs as it is
+    '''
+    handlers = set(name for table in cls.HANDLERS.values() for name in table.values())
+    renames = dict((name, f"g_{name}") for name in DISPATCHERS) | dict((table, f"G_{table}") for table in cls.HANDLERS)
+    twins = set(f"g_{name}" for name in DISPATCHERS)
+    def suspends(call, fetched):
+        if is_self_attribute(call.func, twins) or isinstance(call.func, ast.Name) and call.func.id in fetched:
+            return call
+        return None
+    for name in set(DISPATCHERS) | handlers:
+        setattr(cls, f"g_{name}", derive(getattr(cls, name), f"g_{name}", suspends, renames, cls.HANDLERS))
+    for table, kinds in cls.HANDLERS.items():
+        setattr(cls, f"G_{table}", dict((kind, getattr(cls, f"g_{name}")) for kind, name in kinds.items()))
+    for name in DISPATCHERS:
+        setattr(cls, name, entry(getattr(cls, f"g_{name}"), name))
+    return cls
+
+def entry(generator, name: str):
+    '''a method that runs GENERATOR to completion'''
+    def check(self, *args):
+        return run(generator(self, *args))
+    check.__name__ = check.__qualname__ = name
+    return check
+
+@iterative_checks
+class IterativeTypeChecker(TypeChecker):
+    '''TypeChecker whose statement and expression checks are g_ generators driven by 'run' '''
@@ -1,4 +1,6 @@
 from typing import Iterator
+from array import array
+import re
 
 '''
 tokens provided:
@@ -112,6 +114,203 @@ def lex(src: str, keywords: set[str], keyops: set[str]) -> Iterator[TOKEN]:
             raise SyntaxError(f"unexpected char at {index}: {repr(src[index:index+20])}")
     yield ("EOF", "")
 
+# the master pattern mirrors the order of the probes in 'lex'
+# names are restricted to ascii-led alphanumerics, which is what 'lex' reaches in practice
+MASTER = re.compile(r"""
+    (?P<comment>//[^\n]*)
+    |(?P<newline>[\n\r]+)
+    |(?P<space>[ \t]+)
+    |(?P<name>[A-Za-z][^\W_]*)
+    |(?P<num>[0-9]+(?:\.[0-9]*)?|\.[0-9]*)
+    |(?P<string>"[^"\\]*")
+    |(?P<escaped>")
+    |(?P<symbol><=|>=|<>|[~/%^&*()\-=+\[\]{}<>,.;:])
+    """, re.VERBOSE)
+
+def scan(src: str, keywords: set[str], keyops: set[str]) -> Iterator[TOKEN]:
+    '''
+    single-pass replacement for 'lex' driven by one compiled master pattern
+    yields exactly the same token stream, INDENT/DEDENT/newline tokens included
+    '''
+    for token, _, _ in scan_spans(src, keywords, keyops):
+        yield token
+
+SPAN = tuple[TOKEN, int, int]
+
+def scan_spans(src: str, keywords: set[str], keyops: set[str], index: int=0,
+               indent: list[str]|None=None, parens: int=0, recent_nl: bool=False,
+               checkpoints: list|None=None) -> Iterator[SPAN]:
+    '''
+    'scan', additionally reporting the [start, end) source offsets of every token
+    synthesized tokens (newline, indent, dedent, EOF) are empty spans placed before the next real token
+    strings containing escapes are handed off to 'pop_string'
+    index, indent, parens, recent_nl: resume lexing from a previously recorded line start
+    checkpoints: if given, (offset, parens, indent) is appended at every line start (the end of each newline run)
+        lexing from such an offset with (indent, parens, parens == 0) reproduces the rest of the stream
+    '''
+    _match = MASTER.match
+    _SPECIAL_KEYS = SPECIAL_KEYS
+    _OPENERS = OPENERS
+    _CLOSERS = CLOSERS
+    _NEWLINE = ("\n", "\n")
+    _INDENT = ("indent", " ")
+    _DEDENT = ("dedent", " ")
+    names = {"true": ("literal_bool", "true"), "false": ("literal_bool", "false")}
+    names.update((k, (k, k)) for k in keywords)
+    names.update((k, ("op", k)) for k in keyops)
+    symbols = dict((s, (_SPECIAL_KEYS.get(s, s), s)) for v in SPECIAL_SYMBOLS.values() for s in v)
+    end = len(src)
+    if indent is None:
+        indent = [""]
+    recent_ws = ""
+    while index < end:
+        m = _match(src, index)
+        if m is None:
+            raise SyntaxError(f"unexpected char at {index}: {repr(src[index:index+20])}")
+        kind = m.lastgroup
+        previous = index
+        index = m.end()
+        if kind == "space":
+            recent_ws = m.group()
+            continue
+        if kind == "newline":
+            recent_nl = parens == 0
+            recent_ws = ""
+            if checkpoints is not None:
+                checkpoints.append((index, parens, tuple(indent)))
+            continue
+        if kind == "comment":
+            continue
+        if recent_nl:
+            while True:
+                ind = indent[-1]
+                if ind == recent_ws:
+                    yield _NEWLINE, previous, previous
+                    break
+                elif recent_ws.startswith(ind):
+                    indent.append(recent_ws)
+                    yield _INDENT, previous, previous
+                    break
+                elif not ind.startswith(recent_ws):
+                    raise IndentationError(f"incompatible dedent detected from {repr(ind)} to {repr(recent_ws)}")
+                indent.pop()
+                yield _DEDENT, previous, previous
+            recent_nl = False
+        token = m.group()
+        match kind:
+            case "name":
+                yield names.get(token) or ("name", token), previous, index
+            case "symbol":
+                if token in _OPENERS:
+                    parens += 1
+                elif token in _CLOSERS:
+                    parens -= 1
+                yield symbols[token], previous, index
+            case "num":
+                if src[index:index+1] == ".":
+                    raise SyntaxError(f"multiple dots detected while parsing number at {previous}:{index}")
+                yield ("." if token == "." else "literal_num" if "." not in token else "literal_float", token), previous, index
+            case "string":
+                yield ("literal_string", token), previous, index
+            case "escaped":
+                index, token, err = pop_string(src, previous)
+                if err:
+                    raise SyntaxError(f"{err} while parsing string at {previous}:{index}")
+                yield ("literal_string", token), previous, index
+    yield ("EOF", ""), end, end
+
+def scan_stream(read, keywords: set[str], keyops: set[str], chunk_size: int=1<<16) -> Iterator[TOKEN]:
+    '''
+    'scan' over text pulled from READ(size) -> str, which returns "" at EOF
+    each chunk is lexed up to its last line start and the partial line is carried into the next chunk,
+    so only about one chunk of source is held at a time
+    a lexing error with no line start before it keeps the buffer growing; it is raised once EOF is reached
+    '''
+    pending = ""
+    indent, parens, recent_nl = [""], 0, False
+    while True:
+        chunk = read(chunk_size)
+        if not chunk:
+            for token, _, _ in scan_spans(pending, keywords, keyops, 0, indent, parens, recent_nl):
+                yield token
+            return
+        buffer = pending + chunk
+        checkpoints = []
+        spans = []
+        try:
+            for span in scan_spans(buffer, keywords, keyops, 0, list(indent), parens, recent_nl, checkpoints):
+                spans.append(span)
+        except SyntaxError:
+            pass # possibly a string cut off by the chunk boundary; everything before the last line start is sound
+        if not checkpoints:
+            pending = buffer
+            continue
+        cut, parens, last_indent = checkpoints[-1]
+        for token, start, _ in spans:
+            if start >= cut:
+                break
+            yield token
+        pending = buffer[cut:]
+        indent, recent_nl = list(last_indent), parens == 0
+
+# interned token kinds; ids are stable for the lifetime of the process
+KIND_IDS: dict[str, int] = {}
+KIND_NAMES: list[str] = []
+
+def intern_kind(kind: str) -> int:
+    if kind not in KIND_IDS:
+        KIND_IDS[kind] = len(KIND_NAMES)
+        KIND_NAMES.append(kind)
+    return KIND_IDS[kind]
+
+class TokenStore:
+    '''
+    packed alternative to list[TOKEN]
+    kinds: interned token kinds, one unsigned short per token
+    starts, ends: offsets into the source; a token's value is src[start:end]
+    values: the rare tokens whose value is not a source slice (strings containing escapes)
+    synthesized tokens (newline, indent, dedent, EOF) have fixed values and need no entry
+    '''
+    SYNTHESIZED = {"\n": "\n", "indent": " ", "dedent": " ", "EOF": ""}
+    def __init__(self, src: str, spans: Iterator[SPAN]):
+        self.src = src
+        self.kinds = array("H")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.values: dict[int, str] = {}
+        _intern = intern_kind
+        _SYNTHESIZED = self.SYNTHESIZED
+        kinds, starts, ends, values = self.kinds, self.starts, self.ends, self.values
+        for (ttype, tvalue), start, end in spans:
+            if ttype not in _SYNTHESIZED and (end - start != len(tvalue) or src[start:end] != tvalue):
+                values[len(kinds)] = tvalue
+            kinds.append(_intern(ttype))
+            starts.append(start)
+            ends.append(end)
+    @classmethod
+    def scan(cls, src: str, keywords: set[str], keyops: set[str]) -> "TokenStore":
+        return cls(src, scan_spans(src, keywords, keyops))
+    def __len__(self) -> int:
+        return len(self.kinds)
+    def kind(self, index: int) -> str:
+        return KIND_NAMES[self.kinds[index]]
+    def value(self, index: int) -> str:
+        kind = KIND_NAMES[self.kinds[index]]
+        if kind in self.SYNTHESIZED:
+            return self.SYNTHESIZED[kind]
+        if index in self.values:
+            return self.values[index]
+        return self.src[self.starts[index]:self.ends[index]]
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return (KIND_NAMES[self.kinds[index]], self.value(index))
+    def __iter__(self) -> Iterator[TOKEN]:
+        for i in range(len(self)):
+            yield self[i]
+
 def discard_comments(src: str, index: int) -> int:
     if src[index:index+2] == "//":
         index, _ = pop_comment(src, index)
@@ -75,44 +75,31 @@ def magic_parse_tree(terms, infixes, prefixes, infix_function, prefix_function):
     ... until the prefix has been merged away, revealing the infix to the righter world.
     '''
     # TASK: given the grammar (2* 8) (4 (2* 8))*, resolve this into a tree by merging according to pratt-like rules
-    terms = list(terms) # list mutability will now be abused in a recursive function algorithm
-    def pop(index: int):
-        priorities.pop(index)
-        return terms.pop(index)
-    def associate(index: int, binding: int, argument: bool):
-        '''
-        TASK: guarantee that term[INDEX] is the maximal consolidated expression with binding not weaker than BINDING
-        this function CAN benefit greatly from tail-call optimization, only the input variables are needed after each recursive call
-        argument: position (index-1) contains a consolidated term
-        binding: precedence impact from the left
-            if argument: this impact is from (index-2)
-            else: this impact is from (index-1)
-        '''
-        if index >= len(terms):
-            return
-        left_bind, right_bind = priorities[index]
-        if left_bind == -1:
-            if right_bind != -1: # prefix
-                associate(index+1, right_bind, False)
-                z = pop(index+1)
-                terms[index] = prefix_function(terms[index], z)
-                priorities[index] = TP
-            # whether a prefix was found or not, terms[index] is now a term and not a prefix.
-            associate(index+1, binding, True)
-        elif binding < left_bind and argument:
-            '''
-            as an aside, this is the sole reason lefts & rights cannot be equal:
-                to prevent any imagination of handling <= DIFFERENTLY to <;
-                to prevent all "off by one" errors and to make fully explicit the left or right associativity of all operators.
-            '''
-            # we are looking at an operator AND the precedence impact of the next left operator is weaker than this operator
-            associate(index+1, right_bind, False) # per the TASK: guarantee the right argument is maximal yet valid
-            z = pop(index+1) # this is safe because every [4] in keys is eventually flanked by terms
-            y = pop(index)
-            terms[index-1] = infix_function(y, terms[index-1], z)
-            associate(index-1, binding, argument) # after producing this infix expression, regress and review.
-    associate(0, -1, False)
-    if len(terms) != 1:
+    # one left-to-right pass over an operand stack and an operator stack:
+    # an operator waiting on the stack has already read its left side; it is merged as soon as
+    # the next infix does not bind strictly tighter from the left than the waiting operator binds to the right.
+    operands = []
+    operators: list[tuple[str, int, int]] = [] # (operator, key, right binding)
+    def merge():
+        op, key, _ = operators.pop()
+        z = operands.pop()
+        if key == 2:
+            operands.append(prefix_function(op, z))
+        else:
+            operands.append(infix_function(op, operands.pop(), z))
+    for (left_bind, right_bind), key, term in zip(priorities, keys, terms):
+        match key:
+            case 8:
+                operands.append(term)
+            case 2:
+                operators.append((term, key, right_bind))
+            case 4:
+                while operators and operators[-1][2] >= left_bind:
+                    merge()
+                operators.append((term, key, right_bind))
+    while operators:
+        merge()
+    if len(operands) != 1:
         return {"type": "err", "message": "association error: algorithm failed to resolve terms and operators into a single tree",
-                "argument": terms}
-    return terms[0]
+                "argument": operands}
+    return operands[0]
@@ -1,45 +1,132 @@
 from psparser import Parser, Postparser
 from pstyper import TypeChecker, Type
-from code_samples import sample, old_sample, test_sample, test_output, test_input
+from code_samples import sample, old_sample, test_sample, test_output, test_input, test_scoping, test_unset
 from psinterpreter import Interpreter
+from psstream import stream_tree
+from psparallel import parallel_tree
+from psgrammar import CompiledParser
+from psfused import CompiledFusedParser
+from psiterative import IterativeFusedParser, IterativeTypeChecker
+import psflat
+import pscache
+import pstranspile
+import psvm
+import psoptimize
 
 # location of input code
 CODE_PATH = ""
+# location of a tree written by psflat (see FLAT_DESTINATION); when set, it is memory-mapped and run instead of CODE_PATH
+FLAT_PATH = ""
+# when set, checked programs are cached in this directory (e.g. "__pscache__"), and unchanged sources skip straight to execution
+CACHE_DIRECTORY = ""
+# lex & parse CODE_PATH in chunks, never holding the whole source, token list or raw tree
+STREAM = False
+# when nonzero, lex & parse top-level items across this many processes
+WORKERS = 0
+# build the final tree while parsing; the raw tree is only built (and post-parsed) when RAW_DESTINATION is set
+FUSED = True
+# parse & type check with explicit stacks instead of recursion, for very deeply nested (machine-generated) programs
+ITERATIVE = False
+# run checked programs as python code (see pstranspile) instead of walking the tree
+TRANSPILE = False
+# run checked programs on the bytecode VM (see psvm) instead of walking the tree; TRANSPILE takes precedence
+VM = False
+# fold constants and remove dead branches (see psoptimize) before running
+OPTIMIZE = False
+# compute loop-invariant expressions once, before their loops (see psoptimize.hoist); after OPTIMIZE when both are set
+HOIST = False
 # destinations to debug various intermediate steps
 RAW_DESTINATION = ""
 TREE_DESTINATION = ""
 TYPE_DESTINATION = ""
+# what OPTIMIZE and HOIST changed
+OPTIMIZE_DESTINATION = ""
+# where to write the tree as a flat buffer, for FLAT_PATH in later runs (or in other processes)
+FLAT_DESTINATION = ""
 
 def maybe_store(path, content):
     if path:
         with open(path, "w") as file:
             file.write(str(content))
 
-def interpret(path: str=None, code: str=None):
-    if path is not None:
-        with open(path, "r") as file:
-            code = file.read()
-    if code is None:
-        quit()
-    ok, _, raw_tree = Parser.parse(code)
-    if not ok:
-        print("Parse failed")
-        quit()
-    maybe_store(RAW_DESTINATION, raw_tree)
-    tree = Postparser(0).p_file(raw_tree)
+def interpret(path: str=None, code: str=None, stream: bool=False, workers: int=0, fused: bool=True, iterative: bool=False, flat: str=None, cache: str=None, transpile: bool=False, vm: bool=False, optimize: bool=False, hoist: bool=False):
+    key = None
+    if cache and not flat and (path is not None or code is not None):
+        key = pscache.source_key(path, code)
+        cached = pscache.get(cache, key)
+        if cached is not None:
+            tree, types = cached
+            maybe_store(TREE_DESTINATION, tree)
+            maybe_store(TYPE_DESTINATION, types)
+            execute(tree, types, transpile, cache, key, vm, optimize, hoist)
+            return
+    else:
+        cache = None
+    if flat:
+        # read straight out of the mapped buffer; nothing is parsed
+        tree = psflat.load(flat).root()
+    elif stream and path is not None:
+        # the raw tree is never assembled in streaming or parallel mode, so RAW_DESTINATION is not written
+        tree = stream_tree(path)
+    else:
+        if path is not None:
+            with open(path, "r") as file:
+                code = file.read()
+        if code is None:
+            quit()
+        if workers:
+            tree = parallel_tree(code, workers)
+        elif fused and not RAW_DESTINATION:
+            parser = IterativeFusedParser if iterative else CompiledFusedParser
+            ok, _, items = parser.parse(code)
+            if not ok:
+                print("Parse failed")
+                quit()
+            tree = parser.file_tree(items)
+        else:
+            ok, _, raw_tree = CompiledParser.parse(code)
+            if not ok:
+                print("Parse failed")
+                quit()
+            maybe_store(RAW_DESTINATION, raw_tree)
+            tree = Postparser(0).p_file(raw_tree)
     maybe_store(TREE_DESTINATION, tree)
+    if FLAT_DESTINATION and not flat:
+        psflat.dump(tree, FLAT_DESTINATION)
     try:
-        types = TypeChecker.check_file(tree)
+        types = (IterativeTypeChecker if iterative else TypeChecker).check_file(tree)
     except Exception as e:
         print(e)
         print("Type Check failed")
         quit()
     maybe_store(TYPE_DESTINATION, types)
-    Interpreter(tree).start()
+    if cache:
+        pscache.put(cache, key, tree, types)
+    execute(tree, types, transpile, cache, key, vm, optimize, hoist)
+
+def execute(tree, types, transpile: bool=False, cache: str=None, key: str=None, vm: bool=False, optimize: bool=False, hoist: bool=False):
+    report = []
+    if optimize:
+        tree, report = psoptimize.optimize(tree)
+        key = key and key + ".optimized"
+    if hoist:
+        tree, types, moved = psoptimize.hoist(tree, types)
+        report += moved
+        key = key and key + ".hoisted"
+    if optimize or hoist:
+        maybe_store(OPTIMIZE_DESTINATION, "\n".join(report))
+    if transpile:
+        pstranspile.run(tree, types, cache, key)
+    elif vm:
+        psvm.run(tree, types)
+    else:
+        Interpreter(tree).start()
 
 if __name__ == "__main__":
-    if CODE_PATH:
-        interpret(path=CODE_PATH)
+    if FLAT_PATH:
+        interpret(flat=FLAT_PATH, iterative=ITERATIVE, transpile=TRANSPILE, vm=VM, optimize=OPTIMIZE, hoist=HOIST)
+    elif CODE_PATH:
+        interpret(path=CODE_PATH, stream=STREAM, workers=WORKERS, fused=FUSED, iterative=ITERATIVE, cache=CACHE_DIRECTORY, transpile=TRANSPILE, vm=VM, optimize=OPTIMIZE, hoist=HOIST)
     else:
-        interpret(code=sample)
+        interpret(code=sample, workers=WORKERS, fused=FUSED, iterative=ITERATIVE, cache=CACHE_DIRECTORY, transpile=TRANSPILE, vm=VM, optimize=OPTIMIZE, hoist=HOIST)
 
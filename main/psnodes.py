@@ -0,0 +1,195 @@
+import keyword
+
+'''
+__slots__ classes for the AST
+
+one class per node kind; a node holds its fields in slots instead of a dict, which makes it several times smaller
+and lets new code read node.condition instead of node["condition"].
+'to_nodes' and 'to_dicts' convert losslessly between this form and the JSON-compatible dicts Postparser builds:
+field order is kept, repr(node) is the repr of its dict, and dicts no class matches (or plain values) pass through as they are.
+nodes can also be read like the dicts they replace (node["type"], node.get("initial"), "else" in node),
+so the TypeChecker and Interpreter run on either form.
+the point is memory, not speed: those dict-style reads are python calls, so walking a node tree that way
+(as the TypeChecker and Interpreter do) is about twice as slow as walking dicts.
+this is a conversion and storage library: psmain always runs dict trees, and nodes are for holding many trees at once.
+
+a class names its dict keys in __slots__ (keywords get a trailing underscore: 'else' -> else_);
+TYPE is the dict's "type", or None when the dict has none or, listing "type" in __slots__, stores its own.
+'''
+
+class Node:
+    __slots__ = ()
+    TYPE: str | None = None
+    KEYS: tuple[str, ...] = ()
+    ATTRS: dict[str, str] = {} # dict key -> slot
+    KINDS: dict[tuple[str | None, frozenset], type] = {} # (TYPE, dict keys) -> class
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.KEYS = tuple(slot[:-1] if slot.endswith("_") and keyword.iskeyword(slot[:-1]) else slot for slot in cls.__slots__)
+        cls.ATTRS = dict(zip(cls.KEYS, cls.__slots__))
+        keys = set(cls.KEYS) | ({"type"} if cls.TYPE is not None else set())
+        Node.KINDS[(cls.TYPE, frozenset(keys))] = cls
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+    # the read-only side of the dict these nodes replace
+    def __getitem__(self, key: str):
+        if key == "type" and self.TYPE is not None:
+            return self.TYPE
+        try:
+            return getattr(self, self.ATTRS[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    def __contains__(self, key: str) -> bool:
+        return key in self.ATTRS or key == "type" and self.TYPE is not None
+    def keys(self) -> list[str]:
+        return (["type"] if self.TYPE is not None else []) + list(self.KEYS)
+    def to_dict(self) -> dict:
+        result = {} if self.TYPE is None else {"type": self.TYPE}
+        for key, slot in self.ATTRS.items():
+            result[key] = to_dicts(getattr(self, slot))
+        return result
+    def __eq__(self, other) -> bool:
+        if type(other) is type(self):
+            # field by field, converting nothing
+            return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+        if isinstance(other, (Node, dict)):
+            return self.to_dict() == to_dicts(other)
+        return NotImplemented
+    __hash__ = None
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+def to_nodes(tree):
+    '''the node form of a Postparser tree (or any part of one)'''
+    if isinstance(tree, list):
+        return [to_nodes(item) for item in tree]
+    if not isinstance(tree, dict):
+        return tree
+    keys = frozenset(tree)
+    cls = Node.KINDS.get((tree.get("type"), keys)) or Node.KINDS.get((None, keys))
+    if cls is None:
+        return dict((key, to_nodes(value)) for key, value in tree.items())
+    return cls(*(to_nodes(tree[key]) for key in cls.KEYS))
+
+def to_dicts(tree):
+    '''the dict form of a node tree (or any part of one)'''
+    if isinstance(tree, Node):
+        return tree.to_dict()
+    if isinstance(tree, list):
+        return [to_dicts(item) for item in tree]
+    if isinstance(tree, dict):
+        return dict((key, to_dicts(value)) for key, value in tree.items())
+    return tree
+
+# FILE
+class File(Node):
+    __slots__ = ("starts", "procedures")
+class Start(Node):
+    TYPE = "start"
+    __slots__ = ("body",)
+class Procedure(Node):
+    TYPE = "procedure"
+    __slots__ = ("name", "args", "body")
+class MainBody(Node):
+    __slots__ = ("declarations", "statements")
+# DECLARATIONS
+class Declaration(Node):
+    __slots__ = ("predicate", "initial")
+class Predicate(Node):
+    __slots__ = ("name", "element", "suffixes")
+class ElementType(Node):
+    __slots__ = ("type",)
+class ArraySuffix(Node):
+    TYPE = "array"
+    __slots__ = ("size",)
+# STATEMENTS
+class Body(Node):
+    TYPE = "body"
+    __slots__ = ("statements",)
+class If(Node):
+    TYPE = "if"
+    __slots__ = ("condition", "body", "else_")
+class While(Node):
+    TYPE = "while"
+    __slots__ = ("condition", "body")
+class Do(Node):
+    TYPE = "do"
+    __slots__ = ("condition", "body")
+class For(Node):
+    TYPE = "for"
+    __slots__ = ("variable", "range", "body")
+class Case(Node):
+    TYPE = "case"
+    __slots__ = ("variable", "cases", "default")
+class CaseBranch(Node):
+    TYPE = "case"
+    __slots__ = ("test", "body")
+class Set(Node):
+    TYPE = "set"
+    __slots__ = ("lval", "expr")
+class Input(Node):
+    TYPE = "input"
+    __slots__ = ("values", "file")
+class Output(Node):
+    TYPE = "output"
+    __slots__ = ("values", "file")
+class Open(Node):
+    TYPE = "open"
+    __slots__ = ("name", "path")
+class Close(Node):
+    TYPE = "close"
+    __slots__ = ("name",)
+class ExprStmt(Node):
+    TYPE = "exprstmt"
+    __slots__ = ("value",)
+# LVALS
+class Variable(Node):
+    TYPE = "variable"
+    __slots__ = ("name",)
+class SubscriptLval(Node):
+    TYPE = "subscript"
+    __slots__ = ("head", "index")
+# EXPRESSIONS
+class Infix(Node):
+    TYPE = "infix"
+    __slots__ = ("operator", "left", "right")
+class Prefix(Node):
+    TYPE = "prefix"
+    __slots__ = ("operator", "right")
+class Term(Node):
+    TYPE = "term"
+    __slots__ = ("head", "suffix")
+class Num(Node):
+    TYPE = "num"
+    __slots__ = ("value",)
+class Float(Node):
+    TYPE = "float"
+    __slots__ = ("value",)
+class String(Node):
+    TYPE = "string"
+    __slots__ = ("value",)
+class Bool(Node):
+    TYPE = "bool"
+    __slots__ = ("value",)
+class Name(Node):
+    TYPE = "name"
+    __slots__ = ("value",)
+class Group(Node):
+    TYPE = "group"
+    __slots__ = ("value",)
+class ListExpr(Node):
+    TYPE = "list"
+    __slots__ = ("value",)
+# SUFFIXES
+class Subscript(Node):
+    TYPE = "subscript"
+    __slots__ = ("value",)
+class Call(Node):
+    TYPE = "call"
+    __slots__ = ("value",)
@@ -0,0 +1,645 @@
+from collections.abc import Sequence
+from psvisitor import Visitor, handles, STMT_KINDS, EXPR_KINDS, ATOM_KINDS
+from pstyper import TypeChecker, Basic, List
+from psinterpreter import Interpreter, BUILTINS
+from psresolve import Resolver, Layout, LOCAL, GLOBAL
+from pstranspile import procedure_scope, static_type
+from psflat import to_python
+
+'''
+constant folding and dead-branch elimination
+
+optimize rewrites a checked tree (dicts, psnodes or psflat views) into a new dict tree that runs the same:
+    constant subexpressions (and array sizes) become literals, computed with the Interpreter's own operators;
+    builtin functions called on constants are called once; errors are left for run time
+    UPPERCASE declarations with constant initializers fold into their uses, wherever psresolve proves the use can only see them
+    list literals of constants become "const" atoms, built once, where the list can't be stored (or so, mutated):
+        as an operand, subscripted, or passed to a builtin, or stored in a variable that is only ever read by subscripting it
+    if, while, do-until, for-step and case statements whose outcome is known are replaced by what they would run
+    statements after one that never completes (while true, a zero step, ...) are dropped
+declarations are kept even when every use of them folds, since procedures may still find them dynamically.
+the report lists every change, one line each, prefixed with its scope ("start" or the procedure's name).
+
+loop-invariant code motion
+
+hoist moves expressions out of while, do-until and for-step loops (conditions and bodies) into new variables set before the loop,
+when nothing the loop runs can assign what they read: set, input and open targets, for-step variables, eof (after input from a file),
+and, if the loop calls a procedure, every name any procedure assigns (callers' variables are only a dynamic lookup away).
+expressions are pure, but they can fail; a hoisted one runs even when the loop doesn't, or before what the loop would have done first,
+so only expressions that can't fail move: scalar operators and pure builtins on literals and on names sure to hold a value
+(declared with an initializer or an argument, never input, bound one way only, or an enclosing for-step variable).
+the new variables are declared in the loop's scope, under names the program doesn't use.
+'''
+
+LITERALS = ("num", "float", "string", "bool", "const")
+SCALARS = ("num", "float", "string", "bool")
+# operators and builtins that can't fail on operands the TypeChecker accepted
+TOTAL_INFIX = set("+ - * < > <= >= = <> AND OR".split())
+TOTAL_BUILTINS = set("isNumeric isWhitespace isUpper isChar isLower toString length getFirst getLast getBetween".split())
+
+def literal(value):
+    '''the literal node for VALUE, or None for values no literal can hold'''
+    match value:
+        case bool():
+            return {"type": "bool", "value": value}
+        case int():
+            return {"type": "num", "value": value}
+        case float():
+            return {"type": "float", "value": value}
+        case str():
+            return {"type": "string", "value": value}
+    return None
+
+def describe(node) -> str:
+    '''NODE (an expression) written back out as pseudocode'''
+    match node["type"]:
+        case "infix":
+            return f"{describe_operand(node['left'])} {node['operator']} {describe_operand(node['right'])}"
+        case "prefix":
+            return f"{node['operator']}{' ' if node['operator'] == 'NOT' else ''}{describe_operand(node['right'])}"
+        case "term":
+            suff = node["suffix"]
+            if suff["type"] == "subscript":
+                return f"{describe(node['head'])}[{describe(suff['value'])}]"
+            return f"{describe(node['head'])}({', '.join(describe(arg) for arg in suff['value'])})"
+        case "num" | "float":
+            return repr(node["value"])
+        case "string":
+            return '"' + node["value"] + '"'
+        case "bool":
+            return "true" if node["value"] else "false"
+        case "const":
+            return "[" + ", ".join(describe(literal(item)) for item in node["value"]) + "] (pre-built)"
+        case "name":
+            return node["value"]
+        case "group":
+            return f"({describe(node['value'])})"
+        case "list":
+            return "[" + ", ".join(describe(item) for item in node["value"]) + "]"
+        case x:
+            return f"<{x}>"
+def describe_operand(node) -> str:
+    return f"({describe(node)})" if node["type"] in ("infix", "prefix") else describe(node)
+
+def escaping(tree, names: set[str]=None) -> set[str]:
+    '''names TREE uses other than by subscripting them (x[i]): as values, arguments, assignment targets' heads...'''
+    names = set() if names is None else names
+    if isinstance(tree, Sequence) and not isinstance(tree, str):
+        for item in tree:
+            escaping(item, names)
+        return names
+    if not hasattr(tree, "keys"):
+        return names
+    if tree.get("type") == "name":
+        names.add(tree["value"])
+        return names
+    if tree.get("type") == "term":
+        suffixes = []
+        while tree["type"] == "term":
+            suffixes.append(tree["suffix"])
+            tree = tree["head"]
+        if tree["type"] != "name" or suffixes[-1]["type"] != "subscript":
+            escaping(tree, names)
+        return escaping(suffixes, names)
+    for key in tree.keys():
+        if key != "type":
+            escaping(tree[key], names)
+    return names
+
+def assigned(tree, names: set[str]=None) -> tuple[set[str], bool]:
+    '''(the names TREE's statements assign, whether it calls a procedure)'''
+    names = set() if names is None else names
+    calls = False
+    if isinstance(tree, Sequence) and not isinstance(tree, str):
+        for item in tree:
+            calls = assigned(item, names)[1] or calls
+        return names, calls
+    if not hasattr(tree, "keys"):
+        return names, False
+    match tree.get("type"):
+        case "set" if tree["lval"]["type"] == "variable":
+            names.add(tree["lval"]["name"])
+        case "input":
+            names.update(tree["values"])
+            if tree["file"] is not None:
+                names.add("eof")
+        case "open":
+            names.add(tree["name"])
+        case "for":
+            names.add(tree["variable"])
+        case "term" if tree["suffix"]["type"] == "call":
+            head = tree["head"]
+            calls = head["type"] != "name" or head["value"] not in BUILTINS
+    for key in tree.keys():
+        if key != "type":
+            calls = assigned(tree[key], names)[1] or calls
+    return names, calls
+
+def input_targets(tree, names: set[str]=None) -> set[str]:
+    '''names TREE's input statements assign'''
+    names = set() if names is None else names
+    if isinstance(tree, Sequence) and not isinstance(tree, str):
+        for item in tree:
+            input_targets(item, names)
+    elif hasattr(tree, "keys"):
+        if tree.get("type") == "input":
+            names.update(tree["values"])
+        for key in tree.keys():
+            if key != "type":
+                input_targets(tree[key], names)
+    return names
+
+def strings(tree, found: set[str]=None) -> set[str]:
+    '''every string in TREE: a superset of the names it uses'''
+    found = set() if found is None else found
+    if isinstance(tree, str):
+        found.add(tree)
+    elif isinstance(tree, Sequence):
+        for item in tree:
+            strings(item, found)
+    elif hasattr(tree, "keys"):
+        for key in tree.keys():
+            strings(tree[key], found)
+    return found
+
+class Optimizer(Visitor):
+    '''rewrites a tree; see optimize'''
+    REQUIRED = {"STMT": STMT_KINDS, "EXPR": EXPR_KINDS, "ATOM": ATOM_KINDS}
+    def __init__(self, tree):
+        self.tree = tree
+        self.resolver = Resolver(tree, BUILTINS)
+        self.addresses = self.resolver.resolve().addresses
+        self.escaping = escaping(tree)
+        self.report: list[str] = []
+        self.scope = "start"
+        self.constants: dict[str, object] = {} # the current scope's constants, as far as its declarations have run
+        self.main_constants: dict[str, object] = {}
+    def note(self, message: str):
+        self.report.append(f"{self.scope}: {message}")
+    # FILE
+    def optimize(self) -> dict:
+        start = self.tree["starts"][0]
+        main_body = self.scope_body(start["body"], ())
+        self.main_constants = self.constants
+        procedures = []
+        for proc in self.tree["procedures"]:
+            self.scope = proc["name"]
+            body = self.scope_body(proc["body"], proc["args"])
+            procedures.append({"type": "procedure", "name": proc["name"], "args": to_python(proc["args"]), "body": body})
+        return {"starts": [{"type": "start", "body": main_body}], "procedures": procedures}
+    def scope_body(self, body, args) -> dict:
+        '''BODY's declarations and statements, optimized in a scope whose arguments are ARGS'''
+        loops = Layout(None)
+        for stmt in body["statements"]:
+            self.resolver.loop_variables(loops, stmt)
+        declared = [decl["predicate"]["name"] for decl in body["declarations"]]
+        # names bound more than one way can't be trusted to hold their constant value
+        unsafe = set(loops.slots) | set(arg["name"] for arg in args) | set(name for name in declared if declared.count(name) > 1)
+        self.constants = {}
+        declarations = []
+        for decl in body["declarations"]:
+            pred = decl["predicate"]
+            name = pred["name"]
+            suffixes = [{"type": suff["type"], "size": None if suff["size"] is None else self.top_expr(suff["size"])} for suff in pred["suffixes"]]
+            initial = None
+            if decl["initial"] is not None:
+                initial = self.top_expr(decl["initial"], name not in self.escaping)
+            if initial is not None and initial["type"] in LITERALS and name == name.upper() and name not in unsafe:
+                self.constants[name] = initial["value"]
+                self.note(f"constant {name} = {describe(initial)}")
+            declarations.append({"predicate": {"name": name, "element": to_python(pred["element"]), "suffixes": suffixes}, "initial": initial})
+        statements, _ = self.block(body["statements"])
+        return {"declarations": declarations, "statements": statements}
+    # STMT: each handler returns (the new statement or None, whether control can continue after it)
+    def stmt(self, stmt) -> tuple[dict | None, bool]:
+        if stmt is None:
+            return None, True
+        return self.STMT[stmt["type"]](self, stmt)
+    def block(self, stmts) -> tuple[list, bool]:
+        result = []
+        stmts = list(stmts)
+        for n, stmt in enumerate(stmts):
+            new, completes = self.stmt(stmt)
+            if new is not None and new["type"] == "body":
+                result.extend(new["statements"])
+            elif new is not None:
+                result.append(new)
+            if not completes:
+                if n+1 < len(stmts):
+                    self.note(f"dropped {len(stmts)-n-1} unreachable statement(s) after a {stmt['type']} that never completes")
+                return result, False
+        return result, True
+    def branch(self, stmt) -> tuple[dict | None, bool]:
+        '''STMT where a statement must stay (e.g. a loop's body), as a body'''
+        new, completes = self.stmt(stmt)
+        if new is None or new["type"] == "body":
+            return {"type": "body", "statements": [] if new is None else new["statements"]}, completes
+        return {"type": "body", "statements": [new]}, completes
+    @handles("STMT", "body")
+    def o_body(self, stmt):
+        statements, completes = self.block(stmt["statements"])
+        return {"type": "body", "statements": statements}, completes
+    @handles("STMT", "if")
+    def o_if(self, stmt):
+        condition = self.top_expr(stmt["condition"])
+        if condition["type"] in LITERALS:
+            self.note(f"if {describe(condition)}: kept only the {'then' if condition['value'] else 'else'} branch")
+            return self.stmt(stmt["body"] if condition["value"] else stmt["else"])
+        body, body_completes = self.branch(stmt["body"])
+        alternative, else_completes = self.stmt(stmt["else"])
+        if alternative is not None and alternative["type"] != "body":
+            alternative = {"type": "body", "statements": [alternative]}
+        return {"type": "if", "condition": condition, "body": body, "else": alternative}, body_completes or else_completes
+    @handles("STMT", "while")
+    def o_while(self, stmt):
+        condition = self.top_expr(stmt["condition"])
+        if condition["type"] in LITERALS and not condition["value"]:
+            self.note(f"removed a while loop whose condition is {describe(condition)}")
+            return None, True
+        body, _ = self.branch(stmt["body"])
+        return {"type": "while", "condition": condition, "body": body}, condition["type"] not in LITERALS
+    @handles("STMT", "do")
+    def o_do(self, stmt):
+        body, completes = self.branch(stmt["body"])
+        condition = self.top_expr(stmt["condition"])
+        if completes and condition["type"] in LITERALS and condition["value"]:
+            self.note(f"a do loop until {describe(condition)} runs once: kept only its body")
+            return body, True
+        return {"type": "do", "condition": condition, "body": body}, completes and not (condition["type"] in LITERALS and not condition["value"])
+    @handles("STMT", "for")
+    def o_for(self, stmt):
+        parts = [self.top_expr(part) for part in stmt["range"]]
+        known = all(part["type"] in LITERALS for part in parts)
+        if known:
+            start, stop, step = (part["value"] for part in parts)
+            if step != 0 and ((start == stop) or (start < stop) != (0 < step)):
+                self.note(f"removed a for-step loop over {stmt['variable']} with an empty range")
+                return None, True
+        body, completes = self.branch(stmt["body"])
+        new = {"type": "for", "variable": stmt["variable"], "range": parts, "body": body}
+        if known and step == 0:
+            return new, False # always raises
+        return new, completes or not known
+    @handles("STMT", "case")
+    def o_case(self, stmt):
+        variable = self.top_expr(stmt["variable"])
+        cases = []
+        for case in stmt["cases"]:
+            test = self.top_expr(case["test"])
+            # while every test so far is known, the branches can be decided here
+            if not cases and variable["type"] in LITERALS and test["type"] in LITERALS:
+                if test["value"] == variable["value"]:
+                    self.note(f"case {describe(variable)}: kept only the branch {describe(test)}")
+                    return self.stmt(case["body"])
+                self.note(f"case {describe(variable)}: dropped the branch {describe(test)}")
+                continue
+            cases.append((test, case["body"]))
+        if not cases:
+            self.note(f"case {describe(variable)}: kept only the default")
+            return self.stmt(stmt["default"])
+        branches = []
+        completes = False
+        for test, body in cases:
+            body, branch_completes = self.branch(body)
+            branches.append({"type": "case", "test": test, "body": body})
+            completes = completes or branch_completes
+        default, default_completes = (None, True) if stmt["default"] is None else self.branch(stmt["default"])
+        return {"type": "case", "variable": variable, "cases": branches, "default": default}, completes or default_completes
+    @handles("STMT", "set")
+    def o_set(self, stmt):
+        lval = stmt["lval"]
+        if lval["type"] == "variable":
+            expr = self.top_expr(stmt["expr"], lval["name"] not in self.escaping)
+            return {"type": "set", "lval": {"type": "variable", "name": lval["name"]}, "expr": expr}, True
+        expr = self.top_expr(stmt["expr"])
+        return {"type": "set", "lval": {"type": "subscript", "head": self.top_expr(lval["head"]), "index": self.top_expr(lval["index"])}, "expr": expr}, True
+    @handles("STMT", "input")
+    def o_input(self, stmt):
+        file = None if stmt["file"] is None else self.top_expr(stmt["file"])
+        return {"type": "input", "values": list(stmt["values"]), "file": file}, True
+    @handles("STMT", "output")
+    def o_output(self, stmt):
+        file = None if stmt["file"] is None else self.top_expr(stmt["file"])
+        return {"type": "output", "values": [self.top_expr(part) for part in stmt["values"]], "file": file}, True
+    @handles("STMT", "open")
+    def o_open(self, stmt):
+        return {"type": "open", "name": stmt["name"], "path": self.top_expr(stmt["path"])}, True
+    @handles("STMT", "close")
+    def o_close(self, stmt):
+        return {"type": "close", "name": stmt["name"]}, True
+    @handles("STMT", "exprstmt")
+    def o_exprstmt(self, stmt):
+        value = self.top_expr(stmt["value"])
+        if value["type"] in LITERALS:
+            self.note(f"removed a statement with no effect")
+            return None, True
+        return {"type": "exprstmt", "value": value}, True
+    # EXPR: each handler returns the new expression; STORED is whether its value may end up in a variable (so, mutated)
+    def top_expr(self, expr, shareable: bool=False) -> dict:
+        '''EXPR folded, noting what changed; SHAREABLE when its value is stored somewhere only ever subscripted'''
+        result = self.expr(expr, not shareable)
+        self.changes(expr, result)
+        return result
+    def changes(self, original, result):
+        if original["type"] == "list" and result["type"] == "const":
+            self.note(f"pre-built {describe(original)}")
+        elif original["type"] == result["type"] and original["type"] not in LITERALS:
+            for key in original.keys():
+                before, after = original[key], result[key]
+                if hasattr(before, "keys") and hasattr(after, "keys") and "type" in before:
+                    self.changes(before, after)
+                elif isinstance(after, list) and not isinstance(before, str) and len(before) == len(after):
+                    for item_before, item_after in zip(before, after):
+                        if hasattr(item_before, "keys") and "type" in item_before:
+                            self.changes(item_before, item_after)
+        elif original["type"] not in LITERALS and describe(original) != describe(result):
+            self.note(f"folded {describe(original)} -> {describe(result)}")
+    def expr(self, expr, stored: bool=False) -> dict:
+        handler = self.EXPR.get(expr["type"])
+        if handler is None:
+            return self.term(expr, stored)
+        return handler(self, expr, stored)
+    @handles("EXPR", "infix")
+    def o_infix(self, expr, stored):
+        op = expr["operator"]
+        logical = op in ("AND", "OR")
+        # AND/OR return one of their operands
+        left = self.expr(expr["left"], stored and logical)
+        right = self.expr(expr["right"], stored and logical)
+        if left["type"] in LITERALS and logical:
+            return left if left["value"] == (op == "OR") else right
+        if left["type"] in LITERALS and right["type"] in LITERALS and not logical:
+            folded = self.fold(lambda: Interpreter.function_infix(op, left["value"], right["value"]))
+            if folded is not None:
+                return folded
+        return {"type": "infix", "operator": op, "left": left, "right": right}
+    @handles("EXPR", "prefix")
+    def o_prefix(self, expr, stored):
+        right = self.expr(expr["right"])
+        if right["type"] in LITERALS:
+            folded = self.fold(lambda: Interpreter.function_prefix(expr["operator"], right["value"]))
+            if folded is not None:
+                return folded
+        return {"type": "prefix", "operator": expr["operator"], "right": right}
+    @staticmethod
+    def fold(function) -> dict | None:
+        '''the literal of what FUNCTION returns, or None if it fails (at run time, it would fail the same way)'''
+        try:
+            return literal(function())
+        except Exception:
+            return None
+    def term(self, term, stored: bool=False) -> dict:
+        suffixes = []
+        while term["type"] == "term":
+            suffixes.append(term["suffix"])
+            term = term["head"]
+        suffixes.reverse()
+        head = self.atom(term, stored and not suffixes)
+        builtin = term["type"] == "name" and term["value"] in BUILTINS
+        for suff in suffixes:
+            if suff["type"] == "subscript":
+                index = self.expr(suff["value"])
+                folded = None
+                if head["type"] in LITERALS and index["type"] in LITERALS:
+                    folded = self.fold(lambda: head["value"][index["value"]])
+                head = folded or {"type": "term", "head": head, "suffix": {"type": "subscript", "value": index}}
+            else:
+                # builtins can't keep their arguments; procedures can
+                args = [self.expr(arg, not builtin) for arg in suff["value"]]
+                folded = None
+                if builtin and all(arg["type"] in LITERALS for arg in args):
+                    function = BUILTINS[term["value"]]
+                    folded = self.fold(lambda: function(*(arg["value"] for arg in args)))
+                head = folded or {"type": "term", "head": head, "suffix": {"type": "call", "value": args}}
+            builtin = False
+        return head
+    def atom(self, atom, stored: bool=False) -> dict:
+        return self.ATOM[atom["type"]](self, atom, stored)
+    @handles("ATOM", "num", "float", "string", "bool")
+    def o_literal(self, atom, stored):
+        return {"type": atom["type"], "value": atom["value"]}
+    @handles("ATOM", "name")
+    def o_name(self, atom, stored):
+        kind, _, name = self.addresses[id(atom)]
+        constants = self.constants if kind == LOCAL else self.main_constants if kind == GLOBAL else {}
+        if name in constants:
+            value = constants[name]
+            return {"type": "const", "value": value} if isinstance(value, list) else literal(value)
+        return {"type": "name", "value": atom["value"]}
+    @handles("ATOM", "group")
+    def o_group(self, atom, stored):
+        value = self.expr(atom["value"], stored)
+        if value["type"] in LITERALS:
+            return value
+        return {"type": "group", "value": value}
+    @handles("ATOM", "list")
+    def o_list(self, atom, stored):
+        # a list's elements are stored in it
+        items = [self.expr(item, True) for item in atom["value"]]
+        if not stored and all(item["type"] in LITERALS and item["type"] != "const" for item in items):
+            return {"type": "const", "value": [item["value"] for item in items]}
+        return {"type": "list", "value": items}
+
+def optimize(tree) -> tuple[dict, list[str]]:
+    '''(the optimized dict tree of the checked TREE, a line per change)'''
+    optimizer = Optimizer(tree)
+    return optimizer.optimize(), optimizer.report
+
+class Hoister(Visitor):
+    '''moves loop-invariant expressions out of a dict tree's loops, in place; see hoist'''
+    REQUIRED = {"STMT": STMT_KINDS}
+    LOOPS = {"while": "while", "do": "do-until", "for": "for-step"}
+    def __init__(self, tree, types: tuple):
+        self.tree = tree
+        self.resolver = Resolver(tree, BUILTINS)
+        self.addresses = self.resolver.resolve().addresses
+        self.checker = TypeChecker(types[0], types[1])
+        self.used = strings(tree)
+        self.inputs = input_targets(tree)
+        self.procedure_writes = set()
+        for proc in tree["procedures"]:
+            assigned(proc["body"]["statements"], self.procedure_writes)
+        self.report: list[str] = []
+        self.scope = "start"
+        self.count = 0
+        self.main_bound: set[str] = set()
+        self.main_arrays: set[str] = set()
+        self.main_types: dict[str, Basic] = {}
+    def note(self, message: str):
+        self.report.append(f"{self.scope}: {message}")
+    # FILE
+    def hoist(self):
+        start = self.tree["starts"][0]
+        self.scope_body(start["body"], (), {"eof"})
+        self.main_bound, self.main_arrays, self.main_types = self.bound, self.arrays, self.temporaries
+        for proc in self.tree["procedures"]:
+            self.scope = proc["name"]
+            self.checker.append(*procedure_scope(self.checker, proc))
+            self.scope_body(proc["body"], proc["args"])
+            self.checker.pop()
+    def scope_body(self, body, args, bound: set[str]=frozenset()):
+        '''hoist out of BODY's loops, in a scope whose arguments are ARGS and where BOUND are always bound'''
+        loops = Layout(None)
+        for stmt in body["statements"]:
+            self.resolver.loop_variables(loops, stmt)
+        predicates = list(args) + [decl["predicate"] for decl in body["declarations"]]
+        names = [pred["name"] for pred in predicates]
+        # a name bound more than one way may be unbound (or garbage) when read; input may store null
+        once = set(name for name in names if names.count(name) == 1) - set(loops.slots) - self.inputs
+        initialized = set(arg["name"] for arg in args) | set(decl["predicate"]["name"] for decl in body["declarations"] if decl["initial"] is not None)
+        self.bound = set(bound) | (initialized & once)
+        self.arrays = set(pred["name"] for pred in predicates if pred["suffixes"]) & once # lists are never garbage
+        self.active: set[str] = set() # enclosing for-step variables
+        self.temporaries: dict[str, Basic] = {}
+        self.checker.append({}, self.temporaries)
+        body["statements"] = self.block(body["statements"])
+        self.checker.pop()
+        for name, t in self.temporaries.items():
+            body["declarations"].append({"predicate": {"name": name, "element": {"type": t.name}, "suffixes": []}, "initial": None})
+    # STMT: each handler returns the statements to run in place of STMT
+    def block(self, stmts: list) -> list:
+        result = []
+        for stmt in stmts:
+            result.extend(self.stmt(stmt))
+        return result
+    def stmt(self, stmt) -> list:
+        return self.STMT[stmt["type"]](self, stmt)
+    def inner(self, stmt):
+        '''STMT, where a single statement must stay'''
+        if stmt is None:
+            return None
+        new = self.stmt(stmt)
+        return new[0] if len(new) == 1 else {"type": "body", "statements": new}
+    @handles("STMT", "body")
+    def h_body(self, stmt):
+        stmt["statements"] = self.block(stmt["statements"])
+        return [stmt]
+    @handles("STMT", "if")
+    def h_if(self, stmt):
+        stmt["body"] = self.inner(stmt["body"])
+        stmt["else"] = self.inner(stmt["else"])
+        return [stmt]
+    @handles("STMT", "case")
+    def h_case(self, stmt):
+        for case in stmt["cases"]:
+            case["body"] = self.inner(case["body"])
+        stmt["default"] = self.inner(stmt["default"])
+        return [stmt]
+    @handles("STMT", "while", "do")
+    def h_loop(self, stmt):
+        sets = self.invariants(stmt, ("condition", "body"))
+        stmt["body"] = self.inner(stmt["body"])
+        return sets + [stmt]
+    @handles("STMT", "for")
+    def h_for(self, stmt):
+        # the range is only evaluated once
+        sets = self.invariants(stmt, ("body",))
+        variable = stmt["variable"]
+        outer = variable in self.active
+        self.active.add(variable)
+        self.checker.append({}, {variable: static_type(self.checker, stmt["range"][0])})
+        stmt["body"] = self.inner(stmt["body"])
+        self.checker.pop()
+        if not outer:
+            self.active.discard(variable)
+        return sets + [stmt]
+    @handles("STMT", "set", "input", "output", "open", "close", "exprstmt")
+    def h_simple(self, stmt):
+        return [stmt]
+    # INVARIANTS
+    def invariants(self, loop, keys) -> list:
+        '''replace LOOP's invariant expressions (under KEYS) with new variables; the statements that set them'''
+        self.variant, calls = assigned(loop)
+        if calls:
+            self.variant |= self.procedure_writes
+        self.hoisted: dict[str, str] = {} # each expression's variable, by its text
+        self.sets = []
+        self.kind = self.LOOPS[loop["type"]]
+        for key in keys:
+            self.sweep(loop, key)
+        return self.sets
+    def sweep(self, parent, key):
+        node = parent[key]
+        if isinstance(node, list):
+            for n in range(len(node)):
+                self.sweep(node, n)
+        elif isinstance(node, dict):
+            if self.movable(node):
+                parent[key] = self.temporary(node)
+                return
+            for sub in node:
+                if sub != "type":
+                    self.sweep(node, sub)
+    def movable(self, node) -> bool:
+        inner = node
+        while inner.get("type") == "group":
+            inner = inner["value"]
+        if inner.get("type") not in ("infix", "prefix", "term") or not self.total(node):
+            return False
+        if inner["type"] == "prefix" and inner["right"]["type"] in LITERALS:
+            return False # a negative literal
+        t = static_type(self.checker, node)
+        return isinstance(t, Basic) and t.name in SCALARS
+    def temporary(self, node) -> dict:
+        text = describe(node)
+        if text not in self.hoisted:
+            self.count += 1
+            while f"hoisted{self.count}" in self.used:
+                self.count += 1
+            name = self.hoisted[text] = f"hoisted{self.count}"
+            self.temporaries[name] = static_type(self.checker, node)
+            self.sets.append({"type": "set", "lval": {"type": "variable", "name": name}, "expr": node})
+            self.note(f"hoisted {text} out of a {self.kind} loop")
+        return {"type": "name", "value": self.hoisted[text]}
+    def total(self, node) -> bool:
+        '''whether NODE reads nothing the loop assigns, and can't fail'''
+        match node["type"]:
+            case "num" | "float" | "string" | "bool":
+                return True
+            case "name":
+                return self.readable(node) and self.scalar(node)
+            case "group":
+                return self.total(node["value"])
+            case "prefix":
+                return self.total(node["right"])
+            case "infix":
+                right = node["right"]
+                if node["operator"] not in TOTAL_INFIX and not (right["type"] in ("num", "float") and right["value"] != 0):
+                    return False
+                return self.total(node["left"]) and self.total(right)
+            case "term":
+                head, suffix = node["head"], node["suffix"]
+                if suffix["type"] != "call" or head["type"] != "name" or head["value"] not in TOTAL_BUILTINS:
+                    return False
+                args = suffix["value"]
+                # a list's length only changes when it's replaced
+                if head["value"] == "length" and len(args) == 1 and args[0]["type"] == "name":
+                    if self.readable(args[0], True) and isinstance(static_type(self.checker, args[0]), List):
+                        return True
+                return all(self.total(arg) for arg in args)
+        return False
+    def readable(self, atom, array: bool=False) -> bool:
+        '''whether the name ATOM is sure to hold a value the loop doesn't change; ARRAY when any declared list will do'''
+        name = atom["value"]
+        if name in self.variant:
+            return False
+        if name in self.temporaries:
+            return True
+        address = self.addresses.get(id(atom))
+        if address is None:
+            return False
+        if address[0] == LOCAL:
+            return name in self.bound or name in self.active or (array and name in self.arrays)
+        return address[0] == GLOBAL and (name in self.main_bound or (array and name in self.main_arrays))
+    def scalar(self, atom) -> bool:
+        t = static_type(self.checker, atom)
+        return isinstance(t, Basic) and t.name in SCALARS
+
+def hoist(tree, types: tuple) -> tuple[dict, tuple, list[str]]:
+    '''(the dict tree of the checked TREE with its loop invariants hoisted, TYPES with the start block's new variables, a line per change)'''
+    tree = to_python(tree)
+    hoister = Hoister(tree, types)
+    hoister.hoist()
+    global_variables = dict(types[1])
+    global_variables.update(hoister.main_types)
+    return tree, (types[0], global_variables) + tuple(types[2:]), hoister.report
@@ -0,0 +1,69 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pslexer import scan
+from psparser import Parser, Postparser, KEYWORDS, KEYOPS
+
+'''
+parallel front end
+
+every top-level item ('start' or 'NAME(') begins at column 0, so the source is cut in front of
+each such line and the pieces are lexed, parsed and post-parsed in a process pool.
+a cut can land somewhere a whole-file lex would not split (inside a multi-line string or an open
+bracket); such a piece fails to lex or to parse completely, and the whole source is then parsed
+serially instead, which also reproduces the exact error a serial parse would raise.
+'''
+
+BOUNDARY = re.compile(r"^(?=start\b|[A-Za-z][^\W_]*\()", re.MULTILINE)
+BATCHES_PER_WORKER = 4
+
+def split_items(code: str) -> list[str]:
+    '''cut CODE in front of every column-0 line that looks like the beginning of a top-level item'''
+    cuts = [m.start() for m in BOUNDARY.finditer(code)]
+    if not cuts or cuts[0] != 0:
+        cuts.insert(0, 0)
+    cuts.append(len(code))
+    return [code[a:b] for a, b in zip(cuts, cuts[1:])]
+
+def batch(pieces: list[str], count: int) -> list[str]:
+    '''join consecutive pieces into at most COUNT batches of similar length'''
+    target = sum(len(piece) for piece in pieces) / max(count, 1)
+    batches = []
+    current = []
+    size = 0
+    for piece in pieces:
+        current.append(piece)
+        size += len(piece)
+        if size >= target:
+            batches.append("".join(current))
+            current = []
+            size = 0
+    if current:
+        batches.append("".join(current))
+    return batches
+
+def parse_piece(code: str) -> tuple[bool, list, list]:
+    '''(complete, starts, procedures) of one piece; complete is False if any of it was left unparsed'''
+    try:
+        tokens = list(scan(code, KEYWORDS, KEYOPS))
+        ok, index, raw_tree = Parser(tokens).p_general(0, ("rule", "file"))
+    except SyntaxError:
+        return False, [], []
+    if not ok or index != len(tokens) - 1:
+        return False, [], []
+    tree = Postparser(0).p_file(raw_tree)
+    return True, tree["starts"], tree["procedures"]
+
+def parallel_tree(code: str, workers: int|None=None):
+    '''the post-parsed tree of CODE, as Postparser.p_file would return it'''
+    pieces = batch(split_items(code), (workers or 1) * BATCHES_PER_WORKER)
+    starts = []
+    procedures = []
+    with ProcessPoolExecutor(workers) as pool:
+        for complete, piece_starts, piece_procedures in pool.map(parse_piece, pieces):
+            if not complete:
+                break
+            starts += piece_starts
+            procedures += piece_procedures
+        else:
+            return {"starts": starts, "procedures": procedures}
+    return Postparser(0).p_file(Parser.parse(code)[2])
@@ -1,5 +1,7 @@
-from pslexer import lex
+from pslexer import scan, TokenStore, KIND_IDS, KIND_NAMES
 from psmagic import magic_parse_tree
+from psvisitor import Visitor, handles
+import sys
 
 # for the AST, this parser will just use
 # JSON: type = bool | int | str | list[JSON] | dict[str, JSON]
@@ -83,29 +85,226 @@ def convert_literal(token: str):
 def is_valid_name(name: str) -> bool:
     return name.isalnum() and name[0].isalpha() and name not in KEYWORDS
 
-STACK = []
+FIRST = tuple[frozenset[str], bool, bool]
+
+class FirstSets:
+    '''
+    static analysis of a GENERAL table; for every rule:
+        first: the token kinds it can begin with
+        nullable: whether it can succeed without consuming a token
+        eager: whether it can raise a SyntaxError on a token outside its FIRST set
+    an option alternative can only matter for the next token if that token is in its FIRST set,
+    or the alternative is nullable or eager; the rest can be skipped without changing any result or error
+    '''
+    def __init__(self, general: dict):
+        self.general = general
+        self.named: dict[str, FIRST] = dict((name, (frozenset(), False, False)) for name in general)
+        changed = True
+        while changed:
+            changed = False
+            for name, rule in general.items():
+                new = self.analyze(rule)
+                if new != self.named[name]:
+                    self.named[name] = new
+                    changed = True
+    def analyze(self, rule) -> FIRST:
+        key, arg = rule
+        match key:
+            case "rule":
+                return self.named[arg]
+            case "type":
+                search, err = arg if isinstance(arg, tuple) else (arg, None)
+                return frozenset([search]), False, err is not None
+            case "filter":
+                return self.analyze(arg[1])
+            case "maybe" | "repeat":
+                first, _, eager = self.analyze(arg)
+                return first, True, eager
+            case "cycle":
+                first, _, eager = self.sequence(arg)
+                return first, True, eager
+            case "split":
+                primary, _, err = arg
+                first, nullable, eager = self.analyze(primary)
+                return first, nullable, eager or err is not None
+            case "all":
+                parts, err = arg if isinstance(arg, tuple) else (arg, None)
+                first, nullable, eager = self.sequence(parts)
+                return first, nullable, eager or err is not None
+            case "list":
+                left, right, sep, elem, err = arg
+                middle = elem if sep is None else ("cycle", [elem, sep])
+                first, nullable, eager = self.sequence([left, middle, right])
+                if self.analyze(left)[1]:
+                    eager = eager or err is not None
+                return first, nullable, eager
+            case "option":
+                parts, err = arg if isinstance(arg, tuple) else (arg, None)
+                first, nullable, eager = frozenset(), False, err is not None
+                for part in parts.values():
+                    f, n, e = self.analyze(part)
+                    first, nullable, eager = first | f, nullable or n, eager or e
+                return first, nullable, eager
+            case "obligatory":
+                first, nullable, _ = self.analyze(arg[0])
+                return first, nullable, True
+            case "ABA":
+                first, _, eager = self.sequence(list(arg))
+                for part in arg:
+                    f, _, e = self.analyze(part)
+                    first, eager = first | f, eager or e
+                return first, True, eager
+            case x:
+                raise NotImplementedError(f"undefined parse instruction '{x}'")
+    def sequence(self, parts) -> FIRST:
+        '''the parts are parsed in order; only a nullable prefix exposes what comes after it'''
+        first, eager = frozenset(), False
+        for part in parts:
+            f, nullable, e = self.analyze(part)
+            first, eager = first | f, eager or e
+            if not nullable:
+                return first, False, eager
+        return first, True, eager
+    def viable(self, rule) -> frozenset[str] | None:
+        '''the token kinds RULE must be tried on, or None if it must be tried on every token'''
+        first, nullable, eager = self.analyze(rule)
+        return None if nullable or eager else first
+    def option_dispatch(self) -> dict:
+        '''
+        id(option dict) -> (kind -> names worth trying in order, names worth trying on any other kind)
+        covers every ("option", ...) nested anywhere in the table
+        '''
+        tables = {}
+        def walk(rule):
+            key, arg = rule
+            match key:
+                case "rule" | "type":
+                    return
+                case "option":
+                    parts, _ = arg if isinstance(arg, tuple) else (arg, None)
+                    viable = dict((name, self.viable(part)) for name, part in parts.items())
+                    kinds = set().union(*(v for v in viable.values() if v is not None))
+                    table = {}
+                    for kind in kinds:
+                        table[kind] = tuple(name for name, v in viable.items() if v is None or kind in v)
+                    always = tuple(name for name, v in viable.items() if v is None)
+                    tables[id(parts)] = (table, always)
+                    for part in parts.values():
+                        walk(part)
+                case "filter":
+                    walk(arg[1])
+                case "maybe" | "repeat":
+                    walk(arg)
+                case _:
+                    for part in self.children(key, arg):
+                        walk(part)
+        for rule in self.general.values():
+            walk(rule)
+        return tables
+    @staticmethod
+    def children(key, arg) -> list:
+        match key:
+            case "cycle":
+                return list(arg)
+            case "split":
+                return [arg[0], arg[1]]
+            case "all":
+                return list(arg[0] if isinstance(arg, tuple) else arg)
+            case "list":
+                left, right, sep, elem, _ = arg
+                return [left, right, elem] + ([] if sep is None else [sep])
+            case "obligatory":
+                return [arg[0]]
+            case "ABA":
+                return list(arg)
+        return []
+
 class Parser:
     @classmethod
-    def parse(cls, code: str) -> RESULT:
-        tokens = list(lex(code, KEYWORDS, KEYOPS))
-        return cls(tokens).p_general(0, ("rule", "file"))
-    def __init__(self, src: list[TOKEN]):
+    def parse(cls, code: str, packed: bool=False, packrat: bool=False, trace=False) -> RESULT:
+        '''
+        packed: hold tokens in a TokenStore (int kinds + source offsets) instead of a list of tuples
+        packrat: memoize named rules; see p_packrat
+        trace: keep the stack of active rules; see p_traced
+        '''
+        if packed:
+            tokens = TokenStore.scan(code, KEYWORDS, KEYOPS)
+        else:
+            tokens = list(scan(code, KEYWORDS, KEYOPS))
+        return cls(tokens, packrat, trace).p_root(0, "file")
+    def __init__(self, src: list[TOKEN] | TokenStore, packrat: bool=False, trace=False):
         self.src = src
+        self.kinds = src.kinds if isinstance(src, TokenStore) else None
         self.funcs = {
             "magic": self.magic,
         }
+        self.memo: dict[int, dict[str, RESULT]] | None = None
+        self.trace = trace
+        self.stack: list | None = None
+        if packrat:
+            self.memo = {}
+            # every recursive self.p_general call now goes through the memo
+            self.p_general = self.p_packrat
+        if trace:
+            self.stack = []
+            self.p_general = self.p_traced
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "GENERAL" in cls.__dict__:
+            cls.DISPATCH = FirstSets(cls.GENERAL).option_dispatch()
     def next_any(self, index) -> TOKEN:
         return self.src[index] if index < len(self.src) else EOF
+    def next_kind(self, index) -> str:
+        kinds = self.kinds
+        if kinds is None:
+            return self.next_any(index)[0]
+        return KIND_NAMES[kinds[index]] if index < len(kinds) else "EOF"
     def nearby(self, index, message):
-        return {"message": message, "stack": STACK, "before": self.src[max(index-5,0):index], "after": self.src[index:index+6]}
+        return {"message": message, "stack": self.rule_stack(), "before": self.src[max(index-5,0):index], "after": self.src[index:index+6]}
+    def describe(self, rule) -> list[str]:
+        '''the names a rule redirects through, followed by the instruction it ends at'''
+        key, arg = rule
+        names = []
+        while key == "rule" and len(names) <= len(self.GENERAL):
+            names.append(arg)
+            key, arg = self.GENERAL[arg]
+        return names + [key]
+    def active_rules(self) -> list:
+        '''
+        the rules being parsed right now, outermost first
+        without tracing they are read off the interpreter's frames, which costs nothing until an error
+        '''
+        if self.stack is not None:
+            return list(self.stack)
+        rules = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            if frame.f_locals.get("self") is self:
+                if code is Parser.p_general.__code__:
+                    rules.append(frame.f_locals["rule"])
+                elif code is Parser.p_root.__code__ and self.memo is not None:
+                    rules.append(("rule", frame.f_locals["name"]))
+            frame = frame.f_back
+        rules.reverse()
+        return rules
+    def rule_stack(self) -> list[list[str]]:
+        return [self.describe(rule) for rule in self.active_rules()]
+    @staticmethod
+    def magic_term(part):
+        '''the operand magic_parse_tree gets for PART, a 'term' item of an expression'''
+        return part
     def magic(self, index, tree) -> RESULT:
         if not tree:
             return False, index, tree
+        if len(tree) == 1 and tree[0]["type"] == "term":
+            # most expressions are a lone term, which resolves to itself
+            return True, index, self.magic_term(tree[0])
         parts = []
         for part in tree:
             match part["type"]:
                 case "term":
-                    parts.append(part)
+                    parts.append(self.magic_term(part))
                 case "op" | "eq":
                     parts.append(part["value"]["value"])
                 case x:
@@ -115,6 +314,59 @@ class Parser:
             raise SyntaxError(result)
         return True, index, result
     #
+    def p_packrat(self, index, rule) -> RESULT:
+        '''p_general, memoizing ("rule", NAME) results by (NAME, index)'''
+        if rule[0] != "rule":
+            return Parser.p_general(self, index, rule)
+        table = self.memo.get(index)
+        if table is None:
+            table = self.memo[index] = {}
+        else:
+            found = table.get(rule[1])
+            if found is not None:
+                return found
+        result = table[rule[1]] = Parser.p_general(self, index, rule)
+        return result
+    def p_traced(self, index, rule) -> RESULT:
+        '''
+        p_general, keeping self.stack of the active rules
+        if trace is callable, it is called with (stack, index) on entry to every rule
+        '''
+        stack = self.stack
+        stack.append(rule)
+        if callable(self.trace):
+            self.trace(stack, index)
+        try:
+            if self.memo is not None:
+                return self.p_packrat(index, rule)
+            return Parser.p_general(self, index, rule)
+        finally:
+            stack.pop()
+    def p_root(self, index, name) -> RESULT:
+        '''
+        p_general(index, ("rule", NAME))
+        when packrat parsing a root of the form ("repeat", X), nothing before a completed X is ever re-read,
+        so the memo is trimmed behind each one and stays proportional to the largest X
+        '''
+        key, arg = self.GENERAL[name]
+        if self.memo is None or key != "repeat":
+            return self.p_general(index, ("rule", name))
+        if self.stack is not None:
+            self.stack.append(("rule", name))
+        results = []
+        while True:
+            ok, index, result = self.p_general(index, arg)
+            if not ok:
+                if self.stack is not None:
+                    self.stack.pop()
+                return True, index, results
+            results.append(result)
+            self.forget(index)
+    def forget(self, index):
+        '''drop memo entries before INDEX'''
+        memo = self.memo
+        for old in [i for i in memo if i < index]:
+            del memo[old]
     def p_general(self, index, rule) -> RESULT:
         '''
         ("rule", NAME): refer to a rule in GENERAL
@@ -139,16 +391,12 @@ class Parser:
         '''
         original = index
         key, arg = rule
-        seen = set()
-        STACK.append([])
+        hops = 0
         while key == "rule":
-            STACK[-1].append(arg)
-            if arg in seen:
+            hops += 1
+            if hops > len(self.GENERAL):
                 raise RecursionError(f"definition of rule ({rule[1]}) is part of a trivial cycle")
-            seen.add(arg)
             key, arg = self.GENERAL[arg]
-        STACK[-1].append(key)
-        ttype, tvalue = self.next_any(index)
         match key:
             case "filter":
                 name, part = arg
@@ -156,30 +404,29 @@ class Parser:
                 if ok:
                     ok, index, result = self.funcs[name](index, result)
                     if ok:
-                        STACK.pop()
                         return True, index, result
-                STACK.pop()
                 return False, original, None
             case "type":
                 search, err = arg if isinstance(arg, tuple) else (arg, None)
-                if ttype == search:
-                    STACK.pop()
-                    return True, index+1, {"type": ttype, "value": tvalue}
+                kinds = self.kinds
+                if kinds is None:
+                    ttype, tvalue = self.next_any(index)
+                    if ttype == search:
+                        return True, index+1, {"type": ttype, "value": tvalue}
+                elif index < len(kinds) and kinds[index] == KIND_IDS.get(search):
+                    return True, index+1, {"type": search, "value": self.src.value(index)}
                 if err is None:
-                    STACK.pop()
                     return False, index, None
                 raise SyntaxError(self.nearby(index, err))
             case "maybe":
                 ok, index, result = self.p_general(index, arg)
                 results = [result] if ok else []
-                STACK.pop()
                 return True, index, results
             case "repeat":
                 results = []
                 while True:
                     ok, index, result = self.p_general(index, arg)
                     if not ok:
-                        STACK.pop()
                         return True, index, results
                     results.append(result)
             case "cycle":
@@ -189,7 +436,6 @@ class Parser:
                     for part in arg:
                         ok, index, result = self.p_general(index, part)
                         if not ok:
-                            STACK.pop()
                             return True, index, results
                         results.append(result)
             case "split":
@@ -197,7 +443,6 @@ class Parser:
                 ok, index, p = self.p_general(index, primary)
                 if not ok:
                     if err is None:
-                        STACK.pop()
                         return False, original, None
                     raise SyntaxError(self.nearby(index, err))
                 results = []
@@ -208,7 +453,6 @@ class Parser:
                     if ok:
                         results.append(s)
                         ok, index, p = self.p_general(index, primary)
-                STACK.pop()
                 return True, original, results
             case "all":
                 parts, err = arg if isinstance(arg, tuple) else (arg, None)
@@ -217,17 +461,14 @@ class Parser:
                     ok, index, result = self.p_general(index, part)
                     if not ok:
                         if err is None:
-                            STACK.pop()
                             return False, original, None
                         raise SyntaxError(self.nearby(index, err))
                     results.append(result)
-                STACK.pop()
                 return True, index, results
             case "list":
                 left, right, sep, elem, err = arg
                 ok, index, _ = self.p_general(index, left)
                 if not ok:
-                    STACK.pop()
                     return False, original, None
                 if sep is None:
                     ok, index, result = self.p_general(index, elem)
@@ -237,25 +478,23 @@ class Parser:
                     ok, index, _ = self.p_general(index, right)
                 if not ok:
                     if err is None:
-                        STACK.pop()
                         return False, original, None
                     raise SyntaxError(self.nearby(index, err))
-                STACK.pop()
                 return True, index, result
             case "option":
                 parts, err = arg if isinstance(arg, tuple) else (arg, None)
-                for name, part in parts.items():
-                    ok, index, result = self.p_general(index, part)
+                dispatch = self.DISPATCH.get(id(parts))
+                names = parts if dispatch is None else dispatch[0].get(self.next_kind(index), dispatch[1])
+                for name in names:
+                    ok, index, result = self.p_general(index, parts[name])
                     if ok:
-                        STACK.pop()
                         return True, index, {"type": name, "value": result}
-                if err is None: 
-                    STACK.pop()
+                if err is None:
                     return False, original, None
                 raise SyntaxError(self.nearby(index, err))
             case "obligatory":
-                rule, err = arg
-                ok, index, result = self.p_general(index, rule)
+                part, err = arg
+                ok, index, result = self.p_general(index, part)
                 if not ok:
                     raise SyntaxError(self.nearby(index, err))
                 return ok, index, result
@@ -348,22 +587,24 @@ class Parser:
         "proctype": ("all", [("type", "proc"), ("list", (("type", "("), ("type", ")"), ("type", ","), ("all", [("type", "elementtype"), ("repeat", ("rule", "arraytypesuffix"))]), "proc type parse failed"))]),
         # "proc" "(" (ELEMENTTYPE ARRAYTYPESUFFIX* % ",") ")"
     }
+    # option alternatives worth trying per next token kind; subclasses with their own GENERAL get theirs in __init_subclass__
+    DISPATCH = {}
+Parser.DISPATCH = FirstSets(Parser.GENERAL).option_dispatch()
 
-class Postparser:
+class Postparser(Visitor):
+    # every alternative the grammar can produce needs a handler; see psvisitor
+    REQUIRED = {
+        "STMT": set(Parser.GENERAL["stmt"][1]),
+        "EXPR": {"term", "infix", "prefix"},
+        "ATOM": set(Parser.GENERAL["atom"][1]),
+        "SUFFIX": set(Parser.GENERAL["suffix"][1]),
+        "BODY": set(Parser.GENERAL["body"][1][0]),
+    }
     @staticmethod
     def head_suffix(head, suffix):
         return {"type": "term", "head": head, "suffix": suffix}
     def __init__(self, tree):
         self.tree = tree
-    def __getattribute__(self, name: str):
-        try:
-            return object.__getattribute__(self, name)
-        except AttributeError as a:
-            if name.startswith("p_"):
-                print(a)
-                print(f"def {name}(self, tree):\n        self.test(tree, \"{name[2:]}\")")
-                quit()
-            raise a
     def _test(self, tree, depth=0):
         if isinstance(tree, dict):
             if "type" not in tree:
@@ -434,15 +675,19 @@ class Postparser:
     def p_condition(self, tree):
         return self.p_expr(tree)
     def p_expr(self, tree):
-        match tree["type"]:
-            case "term":
-                return self.p_term(tree["value"])
-            case "infix":
-                return INFIX_TREE(tree["operator"], self.p_expr(tree["left"]), self.p_expr(tree["right"]))
-            case "prefix":
-                return PREFIX_TREE(tree["operator"], self.p_expr(tree["right"]))
-            case x:
-                raise NotImplementedError(f"expression type {repr(x)}")
+        handler = self.EXPR.get(tree["type"])
+        if handler is None:
+            raise NotImplementedError(f"expression type {repr(tree['type'])}")
+        return handler(self, tree)
+    @handles("EXPR", "term")
+    def p_term_expr(self, tree):
+        return self.p_term(tree["value"])
+    @handles("EXPR", "infix")
+    def p_infix(self, tree):
+        return INFIX_TREE(tree["operator"], self.p_expr(tree["left"]), self.p_expr(tree["right"]))
+    @handles("EXPR", "prefix")
+    def p_prefix(self, tree):
+        return PREFIX_TREE(tree["operator"], self.p_expr(tree["right"]))
     def p_term(self, tree):
         raw_atom, raw_suffixes = tree
         atom = self.p_atom(raw_atom)
@@ -450,21 +695,25 @@ class Postparser:
             atom = self.head_suffix(atom, self.p_suffix(suff))
         return atom
     def p_atom(self, tree):
-        x = tree["type"]
-        match x:
-            case "num" | "float" | "string" | "bool":
-                return convert_literal_new((x, tree["value"]["value"]))
-            case "name":
-                return {"type": x, "value": tree["value"]["value"]}
-            case "group":
-                return {"type": "group", "value": self.p_expr(tree["value"])}
-            case "list":
-                elements = []
-                for element in tree["value"][::2]:
-                    elements.append(self.p_expr(element))
-                return {"type": "list", "value": elements}
-            case x:
-                raise NotImplementedError(f"atom type {repr(x)}")
+        handler = self.ATOM.get(tree["type"])
+        if handler is None:
+            raise NotImplementedError(f"atom type {repr(tree['type'])}")
+        return handler(self, tree)
+    @handles("ATOM", "num", "float", "string", "bool")
+    def p_literal(self, tree):
+        return convert_literal_new((tree["type"], tree["value"]["value"]))
+    @handles("ATOM", "name")
+    def p_name(self, tree):
+        return {"type": "name", "value": tree["value"]["value"]}
+    @handles("ATOM", "group")
+    def p_group(self, tree):
+        return {"type": "group", "value": self.p_expr(tree["value"])}
+    @handles("ATOM", "list")
+    def p_list(self, tree):
+        elements = []
+        for element in tree["value"][::2]:
+            elements.append(self.p_expr(element))
+        return {"type": "list", "value": elements}
     def p_type_suffix(self, tree):
         if not tree:
             return {"type": "array", "size": None}
@@ -473,70 +722,56 @@ class Postparser:
         raw_name, predicates, mainbody, _ = tree
         name = raw_name["value"]
         args = []
-        for pred in predicates:
+        for pred in predicates[::2]: # predicates and the ',' between them
             args.append(self.p_predicate(pred))
         body = self.p_mainbody(mainbody)
         return {"type": "procedure", "name": name, "args": args, "body": body}
     def p_stmt(self, tree):
-        match tree["type"]:
-            case "if":
-                return self.p_if(tree["value"])
-            case "while":
-                return self.p_while(tree["value"])
-            case "for":
-                return self.p_for(tree["value"])
-            case "case":
-                return self.p_case(tree["value"])
-            case "do":
-                return self.p_do(tree["value"])
-            case "set":
-                return self.p_set(tree["value"])
-            case "input":
-                return self.p_input(tree["value"])
-            case "output":
-                return self.p_output(tree["value"])
-            case "open":
-                return self.p_open(tree["value"])
-            case "close":
-                return self.p_close(tree["value"])
-            case "exprstmt":
-                return {"type": "exprstmt", "value": self.p_term(tree["value"])}
-            case x:
-                raise NotImplementedError(x)
+        handler = self.STMT.get(tree["type"])
+        if handler is None:
+            raise NotImplementedError(tree["type"])
+        return handler(self, tree["value"])
+    @handles("STMT", "exprstmt")
+    def p_exprstmt(self, tree):
+        return {"type": "exprstmt", "value": self.p_term(tree)}
+    @handles("STMT", "while")
     def p_while(self, tree):
         _, raw_cond, raw_body, _, _ = tree
         condition = self.p_condition(raw_cond)
         body = self.p_body(raw_body)
         return {"type": "while", "condition": condition, "body": body}
+    @handles("STMT", "do")
     def p_do(self, tree):
         _, raw_body, _, _, raw_cond = tree
         condition = self.p_condition(raw_cond)
         body = self.p_body(raw_body)
         return {"type": "do", "condition": condition, "body": body}
     def p_body(self, tree):
+        handler = self.BODY.get(tree["type"])
+        if handler is None:
+            raise NotImplementedError(f"body type {repr(tree['type'])}")
+        return {"type": "body", "statements": handler(self, tree["value"])}
+    @handles("BODY", "indented")
+    def p_indented(self, tree):
         stmts = []
-        match tree["type"]:
-            case "indented":
-                for stmt in tree["value"][::2]:
-                    stmts.append(self.p_stmt(stmt))
-            case "unindented":
-                stmts.append(self.p_stmt(tree["value"]))
-            case x:
-                raise NotImplementedError(f"body type {repr(x)}")
-        return {"type": "body", "statements": stmts}
+        for stmt in tree[::2]:
+            stmts.append(self.p_stmt(stmt))
+        return stmts
+    @handles("BODY", "unindented")
+    def p_unindented(self, tree):
+        return [self.p_stmt(tree)]
     def p_suffix(self, tree):
-        match tree["type"]:
-            case "subscript":
-                return {"type": "subscript", "value": self.p_subscript(tree["value"])}
-            case "call":
-                return {"type": "call", "value": self.p_call(tree["value"])}
-            case x:
-                raise NotImplementedError(f"suffix type {repr(x)}")
+        handler = self.SUFFIX.get(tree["type"])
+        if handler is None:
+            raise NotImplementedError(f"suffix type {repr(tree['type'])}")
+        return {"type": tree["type"], "value": handler(self, tree["value"])}
+    @handles("SUFFIX", "call")
     def p_call(self, tree):
         args = []
-        for arg in tree:
+        for arg in tree[::2]: # arguments and the ',' between them
             args.append(self.p_expr(arg))
         return args
+    @handles("STMT", "input")
     def p_input(self, tree):
         _, raw_targets, maybe_file = tree
         file = None
@@ -547,6 +782,7 @@ class Postparser:
         for target in raw_targets[::2]:
             targets.append(target["value"])
         return {"type": "input", "values": targets, "file": file}
+    @handles("STMT", "output")
     def p_output(self, tree):
         _, raw_targets, maybe_file = tree
         file = None
@@ -565,13 +801,16 @@ class Postparser:
         for part in subscripts[:-1]:
             head = self.head_suffix(head, self.p_subscript(part))
         return {"type": "subscript", "head": head, "index": self.p_subscript(subscripts[-1])}
+    @handles("STMT", "set")
     def p_set(self, tree):
         _, lval, _, expr = tree
         lval = self.p_lval(lval)
         expr = self.p_expr(expr)
         return {"type": "set", "lval": lval, "expr": expr}
+    @handles("SUFFIX", "subscript")
     def p_subscript(self, tree):
         return self.p_expr(tree)
+    @handles("STMT", "if")
     def p_if(self, tree):
         _, raw_cond, _, raw_body, m_else, _, _ = tree
         condition = self.p_condition(raw_cond)
@@ -583,6 +822,7 @@ class Postparser:
     def p_else(self, tree):
         _, _, body = tree
         return self.p_body(body)
+    @handles("STMT", "case")
     def p_case(self, tree):
         _, raw_variable, _, mcases, _, mdefault, _, _, _ = tree
         variable = self.p_expr(raw_variable)
@@ -602,6 +842,7 @@ class Postparser:
     def p_default_case(self, tree):
         _, _, body = tree
         return self.p_body(body)
+    @handles("STMT", "for")
     def p_for(self, tree):
         _, name, _, initial, _, final, _, step, raw_body, _, _ = tree
         parts = [
@@ -611,10 +852,12 @@ class Postparser:
         ]
         body = self.p_body(raw_body)
         return {"type": "for", "variable": name["value"], "range": parts, "body": body}
+    @handles("STMT", "open")
     def p_open(self, tree):
         _, name, raw_atom = tree
         atom = self.p_atom(raw_atom)
         return {"type": "open", "name": name["value"], "path": atom}
+    @handles("STMT", "close")
     def p_close(self, tree):
         _, name = tree
         return {"type": "close", "name": name["value"]}
@@ -0,0 +1,238 @@
+from psvisitor import Visitor, handles, TREE_KINDS
+from pstyper import Type, Basic, List, SIMPLE_TYPES
+
+'''
+static name resolution
+
+the Interpreter's frames are fixed-size lists instead of dicts of Variables: every scope (the start block, and each procedure)
+gets a Layout with one slot per name it can bind (eof, arguments, declarations, and for-step variables), in that order.
+resolve walks the tree once, next to the TypeChecker's pass, and gives every place a name is used an address:
+    (LOCAL, slot, name)       a slot of the innermost frame: the scope's own names
+    (GLOBAL, slot, name)      a slot of the start block's frame: names no procedure binds, used inside procedures
+    (BUILTIN, value, name)    a builtin function, which names can't shadow
+    (PROCEDURE, tree, name)   a procedure no frame can shadow
+    (DYNAMIC, None, name)     anything else: looked up through the frames at run time
+scoping stays dynamic: a procedure's free names are still found in whatever frames called it (so 'prompt' sees its caller's globals),
+and a slot holding UNBOUND (not declared yet, or a for-step variable outside its loop) falls back to that same lookup.
+addresses are keyed by the id of the node that uses the name (the statement, for input, open, close and for);
+psnodes and psflat trees keep their nodes alive, and a dict tree must not be changed once resolved.
+'''
+
+UNBOUND = type("Unbound", (), {"__repr__": lambda self: "UNBOUND"})()
+LOCAL, GLOBAL, BUILTIN, PROCEDURE, DYNAMIC = range(5)
+
+def predicate_type(pred) -> Type:
+    '''the declared type of PRED, without array sizes (which only the Interpreter can evaluate)'''
+    element = pred["element"]["type"]
+    if element not in SIMPLE_TYPES:
+        raise NotImplementedError(f"type-elements {repr(element)}")
+    result = Basic(element)
+    for suff in pred["suffixes"]:
+        result = List(result)
+    return result
+
+class Layout:
+    '''the slots of one scope's frames'''
+    __slots__ = ("name", "slots", "types")
+    def __init__(self, name: str | None):
+        self.name = name # None for the start block
+        self.slots: dict[str, int] = {}
+        self.types: list[Type] = []
+    def add(self, name: str, t: Type):
+        if name not in self.slots:
+            self.slots[name] = len(self.types)
+            self.types.append(t)
+    def frame(self) -> list:
+        '''a new frame, with nothing bound'''
+        return [UNBOUND] * len(self.types)
+    def __repr__(self) -> str:
+        return f"<layout {self.name or 'start'}: {', '.join(self.slots)}>"
+
+class Resolution:
+    '''what resolve found: the layouts, and the address of every name in the tree'''
+    def __init__(self, tree, main: Layout, procedures: dict[str, Layout], addresses: dict[int, tuple]):
+        self.tree = tree # the addresses are only valid while its nodes live
+        self.main = main
+        self.procedures = procedures
+        self.addresses = addresses
+
+class Resolver(Visitor):
+    REQUIRED = TREE_KINDS
+    def __init__(self, tree, builtins: dict):
+        self.tree = tree
+        self.builtins = builtins
+        self.procedures = dict((proc["name"], proc) for proc in tree["procedures"])
+        self.main = Layout(None)
+        self.main.add("eof", Basic("bool"))
+        self.layouts: dict[str, Layout] = {}
+        self.addresses: dict[int, tuple] = {}
+        self.layout = self.main # the scope being resolved
+    # LAYOUTS
+    def build_layout(self, layout: Layout, args, body):
+        for pred in args:
+            layout.add(pred["name"], predicate_type(pred))
+        for decl in body["declarations"]:
+            layout.add(decl["predicate"]["name"], predicate_type(decl["predicate"]))
+        for stmt in body["statements"]:
+            self.loop_variables(layout, stmt)
+    @classmethod
+    def loop_variables(cls, layout: Layout, stmt):
+        if stmt is None:
+            return
+        match stmt["type"]:
+            case "for":
+                layout.add(stmt["variable"], Basic("num"))
+                cls.loop_variables(layout, stmt["body"])
+            case "body":
+                for sub in stmt["statements"]:
+                    cls.loop_variables(layout, sub)
+            case "if":
+                cls.loop_variables(layout, stmt["body"])
+                cls.loop_variables(layout, stmt["else"])
+            case "while" | "do":
+                cls.loop_variables(layout, stmt["body"])
+            case "case":
+                for case in stmt["cases"]:
+                    cls.loop_variables(layout, case["body"])
+                cls.loop_variables(layout, stmt["default"])
+    # ADDRESSES
+    def resolve(self) -> Resolution:
+        main_body = self.tree["starts"][0]["body"]
+        self.build_layout(self.main, (), main_body)
+        for proc in self.tree["procedures"]:
+            self.layouts[proc["name"]] = layout = Layout(proc["name"])
+            self.build_layout(layout, proc["args"], proc["body"])
+        # names some procedure's frame can bind: only these can shadow the start block's names or the procedures
+        self.shadowing = set()
+        for layout in self.layouts.values():
+            self.shadowing.update(layout.slots)
+        self.body(self.main, main_body)
+        for proc in self.tree["procedures"]:
+            self.body(self.layouts[proc["name"]], proc["body"])
+        return Resolution(self.tree, self.main, self.layouts, self.addresses)
+    def body(self, layout: Layout, body):
+        self.layout = layout
+        for decl in body["declarations"]:
+            for suff in decl["predicate"]["suffixes"]:
+                if suff["size"] is not None:
+                    self.expr(suff["size"])
+            if decl["initial"] is not None:
+                self.expr(decl["initial"])
+        for stmt in body["statements"]:
+            self.stmt(stmt)
+    def address(self, name: str) -> tuple:
+        if name in self.builtins:
+            return (BUILTIN, self.builtins[name], name)
+        if name in self.layout.slots:
+            return (LOCAL, self.layout.slots[name], name)
+        if name in self.shadowing:
+            return (DYNAMIC, None, name)
+        if name in self.main.slots:
+            return (GLOBAL, self.main.slots[name], name)
+        if name in self.procedures:
+            return (PROCEDURE, self.procedures[name], name)
+        return (DYNAMIC, None, name)
+    # STMT
+    def stmt(self, stmt):
+        if stmt is None:
+            return
+        self.STMT[stmt["type"]](self, stmt)
+    @handles("STMT", "body")
+    def r_body(self, stmt):
+        for sub in stmt["statements"]:
+            self.stmt(sub)
+    @handles("STMT", "if")
+    def r_if(self, stmt):
+        self.expr(stmt["condition"])
+        self.stmt(stmt["body"])
+        self.stmt(stmt["else"])
+    @handles("STMT", "while", "do")
+    def r_loop(self, stmt):
+        self.expr(stmt["condition"])
+        self.stmt(stmt["body"])
+    @handles("STMT", "for")
+    def r_for(self, stmt):
+        for part in stmt["range"]:
+            self.expr(part)
+        self.addresses[id(stmt)] = self.layout.slots[stmt["variable"]]
+        self.stmt(stmt["body"])
+    @handles("STMT", "case")
+    def r_case(self, stmt):
+        self.expr(stmt["variable"])
+        for case in stmt["cases"]:
+            self.expr(case["test"])
+            self.stmt(case["body"])
+        self.stmt(stmt["default"])
+    @handles("STMT", "set")
+    def r_set(self, stmt):
+        self.expr(stmt["expr"])
+        lval = stmt["lval"]
+        match lval["type"]:
+            case "variable":
+                self.addresses[id(lval)] = self.address(lval["name"])
+            case "subscript":
+                self.expr(lval["head"])
+                self.expr(lval["index"])
+    @handles("STMT", "input")
+    def r_input(self, stmt):
+        self.addresses[id(stmt)] = tuple(self.address(name) for name in stmt["values"])
+        if stmt["file"] is not None:
+            self.expr(stmt["file"])
+    @handles("STMT", "output")
+    def r_output(self, stmt):
+        for part in stmt["values"]:
+            self.expr(part)
+        if stmt["file"] is not None:
+            self.expr(stmt["file"])
+    @handles("STMT", "open")
+    def r_open(self, stmt):
+        self.addresses[id(stmt)] = self.address(stmt["name"])
+        self.expr(stmt["path"])
+    @handles("STMT", "close")
+    def r_close(self, stmt):
+        self.addresses[id(stmt)] = self.address(stmt["name"])
+    @handles("STMT", "exprstmt")
+    def r_exprstmt(self, stmt):
+        self.expr(stmt["value"])
+    # EXPR
+    def expr(self, expr):
+        handler = self.EXPR.get(expr["type"])
+        if handler is None:
+            return self.term(expr)
+        handler(self, expr)
+    @handles("EXPR", "infix")
+    def r_infix(self, expr):
+        self.expr(expr["left"])
+        self.expr(expr["right"])
+    @handles("EXPR", "prefix")
+    def r_prefix(self, expr):
+        self.expr(expr["right"])
+    def term(self, term):
+        while term["type"] == "term":
+            self.SUFFIX[term["suffix"]["type"]](self, term["suffix"])
+            term = term["head"]
+        self.ATOM[term["type"]](self, term)
+    @handles("ATOM", "num", "float", "string", "bool", "const")
+    def r_literal(self, atom):
+        pass
+    @handles("ATOM", "name")
+    def r_name(self, atom):
+        self.addresses[id(atom)] = self.address(atom["value"])
+    @handles("ATOM", "group")
+    def r_group(self, atom):
+        self.expr(atom["value"])
+    @handles("ATOM", "list")
+    def r_list(self, atom):
+        for e in atom["value"]:
+            self.expr(e)
+    @handles("SUFFIX", "subscript")
+    def r_subscript(self, suff):
+        self.expr(suff["value"])
+    @handles("SUFFIX", "call")
+    def r_call(self, suff):
+        for arg in suff["value"]:
+            self.expr(arg)
+
+def resolve(tree, builtins: dict) -> Resolution:
+    '''the layouts and name addresses of TREE, whose builtin functions are BUILTINS'''
+    return Resolver(tree, builtins).resolve()
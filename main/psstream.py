@@ -0,0 +1,107 @@
+import codecs
+import mmap
+from typing import Iterator
+from pslexer import scan_stream
+from psparser import Parser, Postparser, KEYWORDS, KEYOPS, TOKEN, TREE, EOF
+
+'''
+streaming front end for very large programs
+
+source text is pulled chunk by chunk (through mmap where possible), tokens are pulled lazily by the parser,
+and each top-level item is post-parsed as soon as it is parsed, so neither the whole source,
+the whole token list nor the raw tree ever exist at once.
+'''
+
+class SourceReader:
+    '''read(size) -> str over a utf-8 file, through mmap when the file can be mapped'''
+    def __init__(self, path: str, use_mmap: bool=True):
+        self.file = open(path, "rb")
+        self.view = None
+        if use_mmap:
+            try:
+                self.view = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                pass # empty files and pipes cannot be mapped; fall back to plain reads
+        self.position = 0
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+    def read_bytes(self, size: int) -> bytes:
+        if self.view is None:
+            return self.file.read(size)
+        chunk = self.view[self.position:self.position+size]
+        self.position += len(chunk)
+        return chunk
+    def read(self, size: int) -> str:
+        while True:
+            chunk = self.read_bytes(size)
+            text = self.decoder.decode(chunk, final=not chunk)
+            if text or not chunk:
+                return text
+    def close(self):
+        if self.view is not None:
+            self.view.close()
+        self.file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *_):
+        self.close()
+
+class TokenWindow:
+    '''
+    list-like view over a token iterator
+    tokens are pulled on demand and dropped once released; reading a released token is an error
+    '''
+    def __init__(self, tokens: Iterator[TOKEN]):
+        self.tokens = tokens
+        self.buffer: list[TOKEN] = []
+        self.base = 0
+    def fill(self, index: int) -> bool:
+        '''pull tokens until INDEX is buffered; False if the stream ends first'''
+        while self.base + len(self.buffer) <= index:
+            token = next(self.tokens, None)
+            if token is None:
+                return False
+            self.buffer.append(token)
+        return True
+    def release(self, index: int):
+        '''forget every token before INDEX'''
+        if index > self.base:
+            del self.buffer[:index-self.base]
+            self.base = index
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop = max(index.start or 0, self.base), index.stop
+            self.fill(stop-1)
+            return self.buffer[start-self.base:stop-self.base]
+        if index < self.base:
+            raise IndexError(f"token {index} was released; the window starts at {self.base}")
+        if not self.fill(index):
+            raise IndexError(index)
+        return self.buffer[index-self.base]
+
+class StreamParser(Parser):
+    '''
+    parses the 'file' rule one top-level item at a time from a TokenWindow
+    p_general never backtracks across a completed top-level item, so everything before the
+    current item is released, save a few tokens of context for error messages ('nearby')
+    '''
+    CONTEXT = 5
+    FILE_ITEM = Parser.GENERAL["file"][1]
+    def __init__(self, tokens: Iterator[TOKEN]):
+        super().__init__(TokenWindow(tokens))
+    def next_any(self, index) -> TOKEN:
+        return self.src[index] if self.src.fill(index) else EOF
+    def items(self) -> Iterator[TREE]:
+        '''the elements of the raw 'file' tree, as they are parsed'''
+        index = 0
+        while True:
+            ok, index, tree = self.p_general(index, self.FILE_ITEM)
+            if not ok:
+                return
+            self.src.release(index - self.CONTEXT)
+            yield tree
+
+def stream_tree(path: str, chunk_size: int=1<<16, use_mmap: bool=True):
+    '''the post-parsed tree of the file at PATH, as Postparser.p_file would return it'''
+    with SourceReader(path, use_mmap) as reader:
+        tokens = scan_stream(reader.read, KEYWORDS, KEYOPS, chunk_size)
+        return Postparser(0).p_file(StreamParser(tokens).items())
@@ -0,0 +1,558 @@
+import ast
+from collections.abc import Sequence
+import json
+import marshal
+import re
+import sys
+import pscache
+from psvisitor import Visitor, handles, TREE_KINDS
+from pstyper import TypeChecker, Type, Any, Basic
+from psinterpreter import Interpreter, BUILTINS, accept_number_input
+
+'''
+python backend
+
+a checked program becomes a python module, built with the ast module and run with compile() & exec() in place of Interpreter.start.
+every procedure becomes a python function and the start block becomes the function 'main';
+while, do-until, for-step and case become python's own while, for and if-elif chains,
+and '/' becomes '//' when both operands are 'num' (or '/' when either is 'float'; otherwise Runtime.div decides, as the interpreter does).
+I/O goes through Runtime, which keeps the interpreter's semantics (open file bookkeeping, input conversion, eof, output format).
+
+names are prefixed so they can't collide with python's: variables and procedures get 'v_', builtins 'b_'.
+globals are module globals and a procedure's own names are python locals, except where the interpreter's dynamic lookup shows:
+a procedure reading a name it doesn't declare sees the innermost active frame that has it, which may be a caller's local.
+so a local that some procedure reads or writes as a free name is kept in the module globals while its procedure runs
+(saved on entry, restored on exit: shallow binding), as is a for-step variable the procedure doesn't declare,
+and a name whose own declarations read it before binding it (the interpreter looks that read up in the callers' frames).
+reading a declared variable that was never assigned fails with the interpreter's NameError, not python's.
+'''
+
+PREFIX = "v_"
+BUILTIN_PREFIX = "b_"
+CODE_SUFFIX = f".{sys.implementation.cache_tag}.pspy"
+UNSET = object()
+KEEP = object() # a shallow-bound name the procedure no longer binds: its caller's value stays on exit
+
+def name_of(name: str) -> str:
+    return (BUILTIN_PREFIX if name in BUILTINS else PREFIX) + name
+
+class Runtime:
+    '''what transpiled programs call for I/O and the interpreter's less pythonic semantics'''
+    def __init__(self, interpreter: type=Interpreter):
+        self.open_files = {}
+        self.print = interpreter.canonical_print
+        self.input = interpreter.canonical_input
+    @staticmethod
+    def div(left, right):
+        return Interpreter.function_infix("/", left, right)
+    @staticmethod
+    def steps(start, stop, step) -> Sequence:
+        '''the values a for-step loop takes, as Interpreter.do_for_step computes them'''
+        if step == 0:
+            raise ZeroDivisionError("step value cannot be zero")
+        if (start == stop) or (start < stop) != (0 < step):
+            return ()
+        if type(start) is int and type(stop) is int and type(step) is int:
+            return range(start, stop, step)
+        negative = step < 0
+        if negative:
+            step, start, stop = -step, -start, -stop
+        values = []
+        index = 0
+        parameter = start
+        while parameter < stop:
+            values.append(-parameter if negative else parameter)
+            index += 1
+            parameter = start + step * index
+        return values
+    @staticmethod
+    def garbage(sizes: list):
+        '''the initial value of an array declared with SIZES (innermost first; None where unsized)'''
+        if not sizes:
+            return None
+        *inner, outer = sizes
+        if outer is None:
+            return []
+        return [Runtime.garbage(inner) for _ in range(outer)]
+    @staticmethod
+    def restore(namespace: dict, name: str, saved):
+        if saved is KEEP:
+            return
+        if saved is UNSET:
+            namespace.pop(name, None)
+        else:
+            namespace[name] = saved
+    @staticmethod
+    def convert(kind: str, value):
+        if kind == "num":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        if kind == "string":
+            return value
+        raise NotImplementedError("undefined input type")
+    def read_console(self, kinds: tuple[str, ...]):
+        if len(kinds) != 1:
+            raise NotImplementedError
+        kind = kinds[0]
+        if kind == "num":
+            return accept_number_input(self.print, self.input, False)
+        if kind == "float":
+            return float(accept_number_input(self.print, self.input, True))
+        if kind == "string":
+            return input()
+        raise NotImplementedError("undefined input type")
+    def read_file(self, file, kinds: tuple[str, ...]) -> list | None:
+        '''the converted values of FILE's next line, or None at its end'''
+        string = file.readline()
+        if not string:
+            return None
+        if string[-1] == "\n":
+            string = string[:-1]
+        results = json.loads("["+string+"]")
+        if len(results) < len(kinds):
+            print("Input warning: not enough values for variables")
+        elif len(results) > len(kinds):
+            print("Input warning: too many values for variables")
+        return [self.convert(kind, result) for kind, result in zip(kinds, results)]
+    def write(self, parts: list, file):
+        # printing as 'true' and 'false' necessary for JSON
+        file.write(", ".join('true' if i is True else 'false' if i is False else repr(i) for i in parts)+"\n")
+    def open(self, path: str, mode: str):
+        if path in self.open_files:
+            raise PermissionError("cannot open a file while it's open")
+        file = open(path, mode)
+        self.open_files[path] = file
+        return file
+    def close(self, file):
+        key = None
+        for k,v in self.open_files.items():
+            if v == file:
+                key = k
+                break
+        file.close()
+        if key is None:
+            raise ValueError("actual file does not correspond to any previously opened path")
+        del self.open_files[key]
+    def run(self, code):
+        '''execute the module CODE, closing its open files if it fails'''
+        namespace = {"rt": self, "UNSET": UNSET, "KEEP": KEEP}
+        namespace["_g"] = namespace
+        for name, function in BUILTINS.items():
+            namespace[BUILTIN_PREFIX + name] = function
+        try:
+            exec(code, namespace)
+            namespace["main"]()
+        except Exception as e:
+            for file in self.open_files.values():
+                file.close()
+            if isinstance(e, NameError):
+                name = self.unprefixed(e)
+                if name is not None:
+                    raise NameError(f"{repr(name)} read before assignment") from None
+            raise e
+    @staticmethod
+    def unprefixed(error: NameError) -> str | None:
+        '''the variable ERROR failed to read, if it's one of the program's: declared, but never assigned'''
+        name = error.name
+        if name is None: # UnboundLocalError only says it in the message
+            found = re.search(r"local variable '(\w+)'", str(error))
+            name = found and found.group(1)
+        if name and name.startswith(PREFIX):
+            return name[len(PREFIX):]
+        return None
+
+# NAMES: what each procedure declares and refers to
+def referenced(tree, names: set[str]=None, loops: set[str]=None) -> tuple[set[str], set[str]]:
+    '''(names TREE refers to, names of its for-step variables)'''
+    names = set() if names is None else names
+    loops = set() if loops is None else loops
+    if isinstance(tree, Sequence) and not isinstance(tree, str):
+        for item in tree:
+            referenced(item, names, loops)
+        return names, loops
+    if not hasattr(tree, "keys"):
+        return names, loops
+    match tree.get("type"):
+        case "name":
+            names.add(tree["value"])
+        case "variable" if isinstance(tree["name"], str):
+            names.add(tree["name"])
+        case "input":
+            names.update(tree["values"])
+        case "open" | "close":
+            names.add(tree["name"])
+        case "for":
+            names.add(tree["variable"])
+            loops.add(tree["variable"])
+    for key in tree.keys():
+        if key != "type":
+            referenced(tree[key], names, loops)
+    return names, loops
+
+def declared(procedure) -> set[str]:
+    return set(arg["name"] for arg in procedure["args"]) | set(decl["predicate"]["name"] for decl in procedure["body"]["declarations"])
+
+def read_early(procedure, own: set[str]) -> set[str]:
+    '''names in OWN that PROCEDURE's declarations read before binding them: the interpreter finds those in the callers' frames'''
+    bound = set(arg["name"] for arg in procedure["args"])
+    early = set()
+    for decl in procedure["body"]["declarations"]:
+        names, _ = referenced([suff["size"] for suff in decl["predicate"]["suffixes"]])
+        referenced(decl["initial"], names)
+        early |= (names & own) - bound
+        bound.add(decl["predicate"]["name"])
+    return early
+
+# STATIC TYPES: what the checker knows at a point of the program, for choosing operations
+def procedure_scope(checker: TypeChecker, proc) -> tuple[dict, dict]:
+    '''the constants & variables PROC's arguments and declarations add to CHECKER's scope'''
+    try:
+        _, (con, var) = checker.gather_proctype(proc["args"])
+        return checker.gather_decls(proc["body"]["declarations"], con, var)
+    except (TypeError, NameError, NotImplementedError):
+        return {}, {}
+
+def static_type(checker: TypeChecker, expr) -> Type:
+    '''the type of EXPR in CHECKER's scope, or Any when the checker can't tell'''
+    try:
+        return checker.check_expr(expr)
+    except (TypeError, NameError, NotImplementedError, KeyError):
+        return Any()
+
+def static_kind(checker: TypeChecker, name: str) -> str:
+    '''the basic type of the variable NAME in CHECKER's scope, or "unknown"'''
+    try:
+        t = checker.read_var(name)
+    except NameError:
+        return "unknown"
+    return t.name if isinstance(t, Basic) else "unknown"
+
+class Transpiler(Visitor):
+    '''builds the python module of a checked tree'''
+    REQUIRED = TREE_KINDS
+    COMPARE = {"<": ast.Lt, "<=": ast.LtE, ">": ast.Gt, ">=": ast.GtE, "=": ast.Eq, "<>": ast.NotEq}
+    ARITHMETIC = {"+": ast.Add, "-": ast.Sub, "*": ast.Mult, "%": ast.Mod}
+    def __init__(self, tree, types: tuple):
+        self.tree = tree
+        constants, global_variables = types[0], types[1]
+        self.checker = TypeChecker(constants, global_variables)
+        self.global_names = set(global_variables) | set(constants) | {"eof"}
+        frames = []
+        self.free: set[str] = set()
+        for proc in tree["procedures"]:
+            names, loops = referenced(proc["body"])
+            own = declared(proc)
+            frames.append(own | loops)
+            # own names read before they're bound are looked up like free names
+            self.free |= names - own - loops - set(BUILTINS) | read_early(proc, own | loops)
+        # frame names other procedures may see through the interpreter's dynamic lookup
+        self.exposed = set().union(*frames) & self.free if frames else set()
+        self.temporaries = 0
+    # SCOPES
+    def enter(self, local: set[str], bound: set[str], main: bool=False):
+        '''start a python function: LOCAL are its python locals, BOUND its names kept in the module globals'''
+        self.local = local
+        self.bound = bound
+        self.in_main = main
+        self.saved: dict[str, str] = {} # bound name -> temporary holding its value from before the call
+        self.stored: set[str] = set()
+    def temporary(self) -> str:
+        self.temporaries += 1
+        return f"_t{self.temporaries}"
+    def load(self, name: str) -> ast.expr:
+        return ast.Name(name_of(name), ast.Load())
+    def store(self, name: str) -> ast.expr:
+        self.stored.add(name)
+        return ast.Name(name_of(name), ast.Store())
+    def type_of(self, expr) -> Type:
+        return static_type(self.checker, expr)
+    def kind_of(self, name: str) -> str:
+        return static_kind(self.checker, name)
+    @staticmethod
+    def call(function: str, *args: ast.expr) -> ast.expr:
+        names = function.split(".")
+        head = ast.Name(names[0], ast.Load())
+        for attribute in names[1:]:
+            head = ast.Attribute(head, attribute, ast.Load())
+        return ast.Call(head, list(args), [])
+    def save(self, name: str, temporary: str) -> ast.stmt:
+        return ast.Assign([ast.Name(temporary, ast.Store())], self.call("_g.get", ast.Constant(name_of(name)), ast.Name("UNSET", ast.Load())))
+    def restore(self, name: str, temporary: str) -> ast.stmt:
+        return ast.Expr(self.call("rt.restore", ast.Name("_g", ast.Load()), ast.Constant(name_of(name)), ast.Name(temporary, ast.Load())))
+    @staticmethod
+    def body_or_pass(stmts: list[ast.stmt]) -> list[ast.stmt]:
+        return stmts or [ast.Pass()]
+    # FILE
+    def module(self) -> ast.Module:
+        functions = [self.procedure(proc) for proc in self.tree["procedures"]]
+        functions.append(self.main(self.tree["starts"][0]["body"]))
+        return ast.fix_missing_locations(ast.Module(functions, []))
+    def main(self, body) -> ast.FunctionDef:
+        self.enter(set(), set(), True)
+        stmts = [ast.Assign([self.store("eof")], ast.Constant(False))]
+        stmts += self.declarations(body["declarations"]) + self.statements(body["statements"])
+        return self.function("main", [], stmts)
+    def function(self, name: str, args: list[str], stmts: list[ast.stmt]) -> ast.FunctionDef:
+        module_names = sorted(name_of(n) for n in self.stored if n not in self.local)
+        if module_names:
+            stmts.insert(0, ast.Global(module_names))
+        arguments = ast.arguments(posonlyargs=[], args=[ast.arg(arg) for arg in args], kwonlyargs=[], kw_defaults=[], defaults=[])
+        return ast.FunctionDef(name=name, args=arguments, body=self.body_or_pass(stmts), decorator_list=[])
+    def procedure(self, proc) -> ast.FunctionDef:
+        own = declared(proc)
+        _, loops = referenced(proc["body"])
+        loose = loops - own # for-step variables the procedure doesn't declare
+        local = (own - self.exposed) | (loose - self.exposed - self.global_names)
+        self.enter(local, own & self.exposed)
+        self.checker.append(*procedure_scope(self.checker, proc))
+        stmts = []
+        for name in sorted(self.bound):
+            self.saved[name] = self.temporary()
+            stmts.append(self.save(name, self.saved[name]))
+        args = []
+        for arg in proc["args"]:
+            name = arg["name"]
+            if name in self.bound:
+                args.append(f"a_{name}")
+                stmts.append(ast.Assign([self.store(name)], ast.Name(f"a_{name}", ast.Load())))
+            else:
+                args.append(name_of(name))
+        stmts += self.declarations(proc["body"]["declarations"])
+        stmts += self.statements(proc["body"]["statements"])
+        for name, temporary in self.saved.items():
+            stmts.append(self.restore(name, temporary))
+        self.checker.pop()
+        return self.function(name_of(proc["name"]), args, stmts)
+    def declarations(self, decls) -> list[ast.stmt]:
+        stmts = []
+        for decl in decls:
+            pred = decl["predicate"]
+            name = pred["name"]
+            if decl["initial"] is not None:
+                stmts.append(ast.Assign([self.store(name)], self.expr(decl["initial"])))
+                continue
+            sizes = [None if suff["size"] is None else self.expr(suff["size"]) for suff in pred["suffixes"]]
+            if sizes:
+                value = self.call("rt.garbage", ast.List([ast.Constant(None) if size is None else size for size in sizes], ast.Load()))
+                stmts.append(ast.Assign([self.store(name)], value))
+            elif name in self.bound:
+                # read before assignment is a NameError, as in the interpreter
+                self.stored.add(name)
+                stmts.append(ast.Expr(self.call("_g.pop", ast.Constant(name_of(name)), ast.Constant(None))))
+        return stmts
+    # STMT
+    def statements(self, stmts) -> list[ast.stmt]:
+        result = []
+        for stmt in stmts:
+            result += self.stmt(stmt)
+        return result
+    def branch(self, stmt) -> list[ast.stmt]:
+        '''a body, or None'''
+        return [] if stmt is None else self.stmt(stmt)
+    def stmt(self, stmt) -> list[ast.stmt]:
+        handler = self.STMT.get(stmt["type"])
+        if handler is None:
+            raise NotImplementedError(f"statement type '{stmt['type']}'")
+        return handler(self, stmt)
+    @handles("STMT", "body")
+    def t_body(self, stmt) -> list[ast.stmt]:
+        return self.statements(stmt["statements"])
+    @handles("STMT", "if")
+    def t_if(self, stmt) -> list[ast.stmt]:
+        return [ast.If(self.expr(stmt["condition"]), self.body_or_pass(self.stmt(stmt["body"])), self.branch(stmt["else"]))]
+    @handles("STMT", "while")
+    def t_while(self, stmt) -> list[ast.stmt]:
+        return [ast.While(self.expr(stmt["condition"]), self.body_or_pass(self.stmt(stmt["body"])), [])]
+    @handles("STMT", "do")
+    def t_do(self, stmt) -> list[ast.stmt]:
+        until = ast.If(self.expr(stmt["condition"]), [ast.Break()], [])
+        return [ast.While(ast.Constant(True), self.stmt(stmt["body"]) + [until], [])]
+    @handles("STMT", "for")
+    def t_for(self, stmt) -> list[ast.stmt]:
+        name = stmt["variable"]
+        start, stop, step = (self.expr(part) for part in stmt["range"])
+        values = self.temporary()
+        stmts = [ast.Assign([ast.Name(values, ast.Store())], self.call("rt.steps", start, stop, step))]
+        loop_type = self.type_of(stmt["range"][0])
+        self.checker.append({}, {name: loop_type})
+        body = self.stmt(stmt["body"])
+        self.checker.pop()
+        target = self.store(name)
+        # the interpreter sets the loop variable's slot to UNBOUND once the loop has run, so it reads as unset
+        if self.in_main or name in self.local:
+            after = [ast.Delete([ast.Name(name_of(name), ast.Del())])]
+        elif name in self.bound:
+            # afterwards the name is the callers' again, and so are writes to it; a later loop shadows it anew
+            saved = ast.Name(self.saved[name], ast.Store())
+            unbound = ast.Compare(ast.Name(self.saved[name], ast.Load()), [ast.Is()], [ast.Name("KEEP", ast.Load())])
+            stmts.insert(0, ast.If(unbound, [self.save(name, self.saved[name])], []))
+            after = [self.restore(name, self.saved[name]), ast.Assign([saved], ast.Name("KEEP", ast.Load()))]
+        else:
+            # a for-step variable the procedure doesn't declare: bound in the module globals for the loop only
+            saved = self.temporary()
+            stmts.insert(0, self.save(name, saved))
+            after = [self.restore(name, saved)]
+        stmts.append(ast.For(target, ast.Name(values, ast.Load()), self.body_or_pass(body), []))
+        stmts.append(ast.If(ast.Name(values, ast.Load()), after, []))
+        return stmts
+    @handles("STMT", "case")
+    def t_case(self, stmt) -> list[ast.stmt]:
+        value = self.temporary()
+        stmts = [ast.Assign([ast.Name(value, ast.Store())], self.expr(stmt["variable"]))]
+        chain = self.branch(stmt["default"])
+        for case in reversed(list(stmt["cases"])):
+            test = ast.Compare(ast.Name(value, ast.Load()), [ast.Eq()], [self.atom(case["test"])])
+            chain = [ast.If(test, self.body_or_pass(self.stmt(case["body"])), chain)]
+        return stmts + chain
+    @handles("STMT", "set")
+    def t_set(self, stmt) -> list[ast.stmt]:
+        value = self.expr(stmt["expr"])
+        lval = stmt["lval"]
+        match lval["type"]:
+            case "variable":
+                name = lval["name"]
+                if name in BUILTINS:
+                    error = self.call("TypeError", ast.Constant(f"cannot assign to builtin constant {name}"))
+                    return [ast.Expr(value), ast.Raise(error, None)]
+                return [ast.Assign([self.store(name)], value)]
+            case "subscript":
+                target = ast.Subscript(self.term(lval["head"]), self.expr(lval["index"]), ast.Store())
+                return [ast.Assign([target], value)]
+            case x:
+                raise NotImplementedError(f"lval type {repr(x)}")
+    @handles("STMT", "input")
+    def t_input(self, stmt) -> list[ast.stmt]:
+        names = list(stmt["values"])
+        if len(set(names)) != len(names):
+            error = self.call("NameError", ast.Constant("cannot assign to the same variable multiple times in the same input statement"))
+            return [ast.Raise(error, None)]
+        kinds = ast.Tuple([ast.Constant(self.kind_of(name)) for name in names], ast.Load())
+        values = self.temporary()
+        if stmt["file"] is None:
+            read = self.call("rt.read_console", kinds)
+            return [ast.Assign([self.store(names[0])], read)] if len(names) == 1 else [ast.Expr(read)]
+        read = ast.Assign([ast.Name(values, ast.Store())], self.call("rt.read_file", self.atom(stmt["file"]), kinds))
+        assignments = []
+        for n, name in enumerate(names):
+            available = ast.Compare(self.call("len", ast.Name(values, ast.Load())), [ast.Gt()], [ast.Constant(n)])
+            item = ast.Subscript(ast.Name(values, ast.Load()), ast.Constant(n), ast.Load())
+            assignments.append(ast.If(available, [ast.Assign([self.store(name)], item)], []))
+        at_end = ast.Compare(ast.Name(values, ast.Load()), [ast.Is()], [ast.Constant(None)])
+        return [read, ast.If(at_end, [ast.Assign([self.store("eof")], ast.Constant(True))], self.body_or_pass(assignments))]
+    @handles("STMT", "output")
+    def t_output(self, stmt) -> list[ast.stmt]:
+        parts = [self.expr(part) for part in stmt["values"]]
+        if stmt["file"] is None:
+            return [ast.Expr(self.call("rt.print", *parts))]
+        return [ast.Expr(self.call("rt.write", ast.List(parts, ast.Load()), self.atom(stmt["file"])))]
+    @handles("STMT", "open")
+    def t_open(self, stmt) -> list[ast.stmt]:
+        kind = self.kind_of(stmt["name"])
+        if kind not in ("InputFile", "OutputFile"):
+            return [ast.Raise(self.call("TypeError", ast.Constant("unsupported file type")), None)]
+        mode = "r" if kind == "InputFile" else "w"
+        return [ast.Assign([self.store(stmt["name"])], self.call("rt.open", self.atom(stmt["path"]), ast.Constant(mode)))]
+    @handles("STMT", "close")
+    def t_close(self, stmt) -> list[ast.stmt]:
+        return [ast.Expr(self.call("rt.close", self.load(stmt["name"])))]
+    @handles("STMT", "exprstmt")
+    def t_exprstmt(self, stmt) -> list[ast.stmt]:
+        return [ast.Expr(self.expr(stmt["value"]))]
+    # EXPR
+    def expr(self, expr) -> ast.expr:
+        handler = self.EXPR.get(expr["type"])
+        if handler is None:
+            return self.term(expr)
+        return handler(self, expr)
+    @handles("EXPR", "infix")
+    def t_infix(self, expr) -> ast.expr:
+        op = expr["operator"]
+        left = self.expr(expr["left"])
+        right = self.expr(expr["right"])
+        if op in ("AND", "OR"):
+            return ast.BoolOp(ast.And() if op == "AND" else ast.Or(), [left, right])
+        if op in self.COMPARE:
+            return ast.Compare(left, [self.COMPARE[op]()], [right])
+        if op in self.ARITHMETIC:
+            return ast.BinOp(left, self.ARITHMETIC[op](), right)
+        if op == "/":
+            types = self.type_of(expr["left"]), self.type_of(expr["right"])
+            if all(t is Basic("num") for t in types):
+                return ast.BinOp(left, ast.FloorDiv(), right)
+            if any(t is Basic("float") for t in types):
+                return ast.BinOp(left, ast.Div(), right)
+            return self.call("rt.div", left, right)
+        raise NotImplementedError(f"infix '{op}' not implemented")
+    @handles("EXPR", "prefix")
+    def t_prefix(self, expr) -> ast.expr:
+        match expr["operator"]:
+            case "NOT":
+                return ast.UnaryOp(ast.Not(), self.expr(expr["right"]))
+            case "-":
+                return ast.UnaryOp(ast.USub(), self.expr(expr["right"]))
+            case x:
+                raise NotImplementedError(f"prefix '{x}' not implemented")
+    def term(self, term) -> ast.expr:
+        suffixes = []
+        while term["type"] == "term":
+            suffixes.append(term["suffix"])
+            term = term["head"]
+        head = self.atom(term)
+        for suff in reversed(suffixes):
+            head = self.SUFFIX[suff["type"]](self, head, suff)
+        return head
+    def atom(self, atom) -> ast.expr:
+        handler = self.ATOM.get(atom["type"])
+        if handler is None:
+            raise NotImplementedError(f"atom type {repr(atom['type'])}")
+        return handler(self, atom)
+    @handles("ATOM", "num", "float", "string", "bool")
+    def t_literal(self, atom) -> ast.expr:
+        return ast.Constant(atom["value"])
+    @handles("ATOM", "const")
+    def t_const(self, atom) -> ast.expr:
+        # code objects can't hold lists; a display of constants is cheap to rebuild
+        return ast.List([ast.Constant(item) for item in atom["value"]], ast.Load())
+    @handles("ATOM", "name")
+    def t_name(self, atom) -> ast.expr:
+        return self.load(atom["value"])
+    @handles("ATOM", "group")
+    def t_group(self, atom) -> ast.expr:
+        return self.expr(atom["value"])
+    @handles("ATOM", "list")
+    def t_list(self, atom) -> ast.expr:
+        return ast.List([self.expr(e) for e in atom["value"]], ast.Load())
+    @handles("SUFFIX", "subscript")
+    def t_subscript(self, head, suff) -> ast.expr:
+        return ast.Subscript(head, self.expr(suff["value"]), ast.Load())
+    @handles("SUFFIX", "call")
+    def t_call(self, head, suff) -> ast.expr:
+        return ast.Call(head, [self.expr(arg) for arg in suff["value"]], [])
+
+def transpile(tree, types: tuple) -> ast.Module:
+    '''the python module of TREE, checked with TYPES (as TypeChecker.check_file returns them)'''
+    return Transpiler(tree, types).module()
+
+def source(tree, types: tuple) -> str:
+    '''the python source of TREE, for reading'''
+    return ast.unparse(transpile(tree, types))
+
+def compile_program(tree, types: tuple, directory: str=None, key: str=None):
+    '''the code object of TREE's module, from (and stored to) the pscache DIRECTORY when KEY is given'''
+    name = key + CODE_SUFFIX if directory and key else None
+    if name is not None:
+        data = pscache.get_bytes(directory, name)
+        if data is not None:
+            try:
+                return marshal.loads(data)
+            except (EOFError, ValueError, TypeError):
+                pass
+    code = compile(transpile(tree, types), "<pseudocode>", "exec")
+    if name is not None:
+        pscache.put_bytes(directory, name, marshal.dumps(code))
+    return code
+
+def run(tree, types: tuple, directory: str=None, key: str=None, interpreter: type=Interpreter):
+    '''run TREE through the python backend, as Interpreter(TREE).start() would'''
+    Runtime(interpreter).run(compile_program(tree, types, directory, key))
@@ -1,5 +1,6 @@
 
 # TODO: change all type signatures to use Type instances
+from psvisitor import Visitor, handles, TREE_KINDS, STMT_KINDS, LVAL_KINDS
 
 SIMPLE_TYPES = set("num string float bool InputFile OutputFile".split())
 
@@ -181,16 +182,9 @@ INFIX_TYPES, PREFIX_TYPES, BUILTIN_FUNCTIONS, LIST_FUNCTIONS = build_builtins()
 TYPE_MAP = dict[str, Type]
 EXPR_RESULT = Type
 
-class TypeChecker:
-    def __getattribute__(self, name: str):
-        try:
-            return object.__getattribute__(self, name)
-        except AttributeError as a:
-            if name.startswith("p_"):
-                print(a)
-                print(f"def {name}(self, tree) -> _RESULT:\n        print(\"NotImplemented: {name[2:]}\")\n        quit()")
-                quit()
-            raise a
+class TypeChecker(Visitor):
+    # every node kind the Postparser can produce needs a handler; see psvisitor
+    REQUIRED = TREE_KINDS | {"STMT": STMT_KINDS - {"body"}, "LVAL": LVAL_KINDS}
     def __init__(self, constants: TYPE_MAP, global_variables: TYPE_MAP):
         '''
         constants:
@@ -341,31 +335,16 @@ class TypeChecker:
             self.check_stmt(stmt)
     check_else = check_body
     def check_stmt(self, stmt):
-        match stmt["type"]:
-            case "if":
-                return self.check_if(stmt)
-            case "while" | "do":
-                return self.check_while(stmt)
-            case "for":
-                return self.check_for(stmt)
-            case "case":
-                return self.check_case(stmt)
-            case "set":
-                return self.check_set(stmt)
-            case "input":
-                return self.check_input(stmt)
-            case "output":
-                return self.check_output(stmt)
-            case "open":
-                return self.check_open(stmt)
-            case "close":
-                return self.check_close(stmt)
-            case "exprstmt":
-                # procedures return _void_ which can only appear here, where types aren't checked
-                # _void_ is incompatible with all types, including itself, like float('Nan')
-                self.check_term(stmt["value"])
-            case x:
-                raise NotImplementedError(x)
+        handler = self.STMT.get(stmt["type"])
+        if handler is None:
+            raise NotImplementedError(stmt["type"])
+        return handler(self, stmt)
+    @handles("STMT", "exprstmt")
+    def check_exprstmt(self, stmt):
+        # procedures return _void_ which can only appear here, where types aren't checked
+        # _void_ is incompatible with all types, including itself, like float('Nan')
+        self.check_term(stmt["value"])
+    @handles("STMT", "if")
     def check_if(self, stmt):
         if self.check_cond(stmt["condition"]) != Basic("bool"):
             raise TypeError(f"'if' condition must evaluate to a boolean")
@@ -373,10 +352,12 @@ class TypeChecker:
         alternative = stmt["else"]
         if alternative is not None:
             self.check_else(alternative)
+    @handles("STMT", "while", "do")
     def check_while(self, stmt):
         if self.check_cond(stmt["condition"]) != Basic("bool"):
             raise TypeError(f"'while' condition must evaluate to a boolean")
         self.check_body(stmt["body"])
+    @handles("STMT", "for")
     def check_for(self, stmt):
         parts = []
         for i in stmt["range"]:
@@ -388,6 +369,7 @@ class TypeChecker:
         self.append({}, {stmt["variable"]: parts[0]})
         self.check_body(stmt["body"])
         self.pop()
+    @handles("STMT", "case")
     def check_case(self, stmt):
         argument = self.check_expr(stmt["variable"])
         for case in stmt["cases"]:
@@ -396,6 +378,7 @@ class TypeChecker:
             self.check_body(case["body"])
         if stmt["default"] is not None:
             self.check_body(stmt["default"])
+    @handles("STMT", "input")
     def check_input(self, stmt):
         if stmt["file"] is not None:
             if self.check_atom(stmt["file"]) != Basic("InputFile"):
@@ -411,6 +394,7 @@ class TypeChecker:
                 if i.elem in seen:
                     raise TypeError("inputting to multiple lists of the same element type")
                 seen.append(i.elem)
+    @handles("STMT", "output")
     def check_output(self, stmt):
         if stmt["file"] is not None:
             if self.check_atom(stmt["file"]) != Basic("OutputFile"):
@@ -420,14 +404,17 @@ class TypeChecker:
             targets.append(self.check_expr(target))
         if not all(i.printable() for i in targets):
             raise TypeError("outputting an unprintable type")
+    @handles("STMT", "open")
     def check_open(self, stmt):
         if self.read_var(stmt["name"]) not in [Basic("InputFile"), Basic("OutputFile")]:
             raise TypeError("cannot open a file into a non-file variable")
         if self.check_atom(stmt["path"]) != Basic("string"):
             raise TypeError("filepaths must be strings")
+    @handles("STMT", "close")
     def check_close(self, stmt):
         if self.read_var(stmt["name"]) not in [Basic("InputFile"), Basic("OutputFile")]:
             raise TypeError("cannot close a non-file variable")
+    @handles("STMT", "set")
     def check_set(self, stmt):
         right = self.check_expr(stmt["expr"])
         left = self.check_lval(stmt["lval"])
@@ -435,45 +422,51 @@ class TypeChecker:
             raise TypeError("invalid assignment")
     # special
     def apply_suffix(self, head, suff) -> Type:
-        match suff["type"]:
-            case "subscript": # x[y]
-                index = self.check_expr(suff["value"])
-                return self.decide_subscript_type(head, index)
-            case "call": # x(...)
-                args = []
-                for arg in suff["value"]:
-                    args.append(self.check_expr(arg))
-                return self.decide_call_type(head, args)
-            case x:
-                raise NotImplementedError(f"suffix type {repr(x)}")
+        handler = self.SUFFIX.get(suff["type"])
+        if handler is None:
+            raise NotImplementedError(f"suffix type {repr(suff['type'])}")
+        return handler(self, head, suff)
+    @handles("SUFFIX", "subscript")
+    def apply_subscript(self, head, suff) -> Type: # x[y]
+        index = self.check_expr(suff["value"])
+        return self.decide_subscript_type(head, index)
+    @handles("SUFFIX", "call")
+    def apply_call(self, head, suff) -> Type: # x(...)
+        args = []
+        for arg in suff["value"]:
+            args.append(self.check_expr(arg))
+        return self.decide_call_type(head, args)
     # EXPR
     def check_cond(self, cond) -> Type:
         return self.check_expr(cond)
     def check_expr(self, expr) -> Type:
-        match expr["type"]:
-            case "infix":
-                op = expr["operator"]
-                left = self.check_expr(expr["left"])
-                right = self.check_expr(expr["right"])
-                if op not in INFIX_TYPES:
-                    raise NotImplementedError(f"infix type {repr(op)}")
-                if op == "+" and left == right == List(Any()):
-                    return left.merge(right)
-                for ftype in INFIX_TYPES[op]:
-                    if [left, right] == ftype.args:
-                        return ftype.result
-                raise TypeError(f"invalid operand types for infix {repr(op)}")
-            case "prefix":
-                op = expr["operator"]
-                right = self.check_expr(expr["right"])
-                if op not in PREFIX_TYPES:
-                    raise NotImplementedError(f"prefix type {repr(op)}")
-                for ftype in PREFIX_TYPES[op]:
-                    if [right] == ftype.args:
-                        return ftype.result
-                raise TypeError(f"invalid operand types for prefix {repr(op)}")
-            case _:
-                return self.check_term(expr)
+        handler = self.EXPR.get(expr["type"])
+        if handler is None:
+            return self.check_term(expr)
+        return handler(self, expr)
+    @handles("EXPR", "infix")
+    def check_infix(self, expr) -> Type:
+        op = expr["operator"]
+        left = self.check_expr(expr["left"])
+        right = self.check_expr(expr["right"])
+        if op not in INFIX_TYPES:
+            raise NotImplementedError(f"infix type {repr(op)}")
+        if op == "+" and left == right == List(Any()):
+            return left.merge(right)
+        for ftype in INFIX_TYPES[op]:
+            if [left, right] == ftype.args:
+                return ftype.result
+        raise TypeError(f"invalid operand types for infix {repr(op)}")
+    @handles("EXPR", "prefix")
+    def check_prefix(self, expr) -> Type:
+        op = expr["operator"]
+        right = self.check_expr(expr["right"])
+        if op not in PREFIX_TYPES:
+            raise NotImplementedError(f"prefix type {repr(op)}")
+        for ftype in PREFIX_TYPES[op]:
+            if [right] == ftype.args:
+                return ftype.result
+        raise TypeError(f"invalid operand types for prefix {repr(op)}")
     def check_term(self, term) -> Type:
         suffixes = []
         while term["type"] == "term":
@@ -484,35 +477,42 @@ class TypeChecker:
             head = self.apply_suffix(head, suff)
         return head
     def check_atom(self, atom) -> Type:
-        x = atom["type"]
-        match x:
-            case "num" | "float" | "string" | "bool":
-                return Basic(x)
-            case "name":
-                return self.read_var(atom["value"])
-            case "group":
-                return self.check_expr(atom["value"])
-            case "list":
-                elements = []
-                for e in atom["value"]:
-                    elements.append(self.check_expr(e))
-                if not elements:
-                    return List(Any())
-                first = elements.pop()
-                for e in elements:
-                    if first != e:
-                        raise TypeError("incompatible elements of a list")
-                    first = first.merge(e)
-                return List(first)
-            case x:
-                raise NotImplementedError(f"atom type {repr(x)}")
+        handler = self.ATOM.get(atom["type"])
+        if handler is None:
+            raise NotImplementedError(f"atom type {repr(atom['type'])}")
+        return handler(self, atom)
+    @handles("ATOM", "num", "float", "string", "bool")
+    def check_literal(self, atom) -> Type:
+        return Basic(atom["type"])
+    @handles("ATOM", "name")
+    def check_name(self, atom) -> Type:
+        return self.read_var(atom["value"])
+    @handles("ATOM", "group")
+    def check_group(self, atom) -> Type:
+        return self.check_expr(atom["value"])
+    @handles("ATOM", "list")
+    def check_list(self, atom) -> Type:
+        elements = []
+        for e in atom["value"]:
+            elements.append(self.check_expr(e))
+        if not elements:
+            return List(Any())
+        first = elements.pop()
+        for e in elements:
+            if first != e:
+                raise TypeError("incompatible elements of a list")
+            first = first.merge(e)
+        return List(first)
     def check_lval(self, lval) -> Type:
-        match lval["type"]:
-            case "variable":
-                return self.read_var(lval["name"], True)
-            case "subscript":
-                head = self.check_term(lval["head"])
-                index = self.check_expr(lval["index"])
-                return self.decide_subscript_type(head, index)
-            case x:
-                raise NotImplementedError(f"lval type {repr(x)}")
+        handler = self.LVAL.get(lval["type"])
+        if handler is None:
+            raise NotImplementedError(f"lval type {repr(lval['type'])}")
+        return handler(self, lval)
+    @handles("LVAL", "variable")
+    def check_variable(self, lval) -> Type:
+        return self.read_var(lval["name"], True)
+    @handles("LVAL", "subscript")
+    def check_subscript(self, lval) -> Type:
+        head = self.check_term(lval["head"])
+        index = self.check_expr(lval["index"])
+        return self.decide_subscript_type(head, index)
@@ -0,0 +1,43 @@
+'''
+table-driven visitors
+
+a method decorated with @handles(TABLE, KIND...) is entered in the dispatch table TABLE under every KIND;
+each table is a class attribute named TABLE, built when the class is defined, so dispatching a node is one dict lookup.
+subclasses inherit the tables, and overriding a handler by name replaces it in every table it was registered in.
+REQUIRED maps tables to the kinds they must cover: a class missing any of them fails at definition,
+listing a stub for every missing handler, rather than when the first such node turns up.
+'''
+
+# the node kinds of the post-parsed tree, which visitors of it list in their REQUIRED
+STMT_KINDS = frozenset("body if while do for case set input output open close exprstmt".split())
+EXPR_KINDS = frozenset({"infix", "prefix"}) # anything else is a term
+ATOM_KINDS = frozenset("num float string bool name group list".split())
+SUFFIX_KINDS = frozenset({"subscript", "call"})
+LVAL_KINDS = frozenset({"variable", "subscript"})
+TREE_KINDS = {"STMT": STMT_KINDS, "EXPR": EXPR_KINDS, "ATOM": ATOM_KINDS, "SUFFIX": SUFFIX_KINDS}
+
+def handles(table: str, *kinds: str):
+    '''register the decorated method as TABLE's handler for each of KINDS'''
+    def register(function):
+        function.handles = getattr(function, "handles", ()) + ((table, kinds),)
+        return function
+    return register
+
+class Visitor:
+    REQUIRED: dict[str, set[str]] = {}
+    HANDLERS: dict[str, dict[str, str]] = {} # table -> kind -> method name
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        handlers = dict((table, dict(kinds)) for table, kinds in cls.HANDLERS.items())
+        for name, value in cls.__dict__.items():
+            for table, kinds in getattr(value, "handles", ()):
+                for kind in kinds:
+                    handlers.setdefault(table, {})[kind] = name
+        cls.HANDLERS = handlers
+        for table in set(handlers) | set(cls.REQUIRED):
+            setattr(cls, table, dict((kind, getattr(cls, name)) for kind, name in handlers.get(table, {}).items()))
+        missing = [(table, kind) for table, kinds in cls.REQUIRED.items() for kind in sorted(kinds) if kind not in handlers.get(table, {})]
+        if missing:
+            stubs = "\n".join(f"    @handles({table!r}, {kind!r})\n    def {table.lower()}_{kind}(self, node):\n        raise NotImplementedError"
+                              for table, kind in missing)
+            raise TypeError(f"{cls.__name__} lacks handlers for {', '.join(f'{t}[{k!r}]' for t, k in missing)}:\n{stubs}")
@@ -0,0 +1,576 @@
+from psvisitor import Visitor, handles, TREE_KINDS
+from pstyper import TypeChecker, Basic
+from psinterpreter import Interpreter, BUILTINS
+from pstranspile import Runtime, procedure_scope, static_type, static_kind
+
+'''
+bytecode VM
+
+Compiler turns a checked tree into one linear instruction array (parallel lists of opcodes and arguments):
+the start block from 0 up to HALT, then each procedure from its entry point up to RETURN.
+if, while, do-until and for-step compile to jumps, AND/OR to short-circuit jumps,
+case to a jump table when every test is a literal (and to a chain of tests otherwise),
+and calls push a frame and a return address, so running a program never recurses in python.
+VM.run executes it in a single dispatch loop over a value stack.
+
+names keep the interpreter's semantics: builtins are resolved when compiling,
+and every other name is looked up at run time through the active frames, innermost first, then the procedures
+(so a procedure still sees its caller's locals). frames are plain dicts of values; types are only needed when compiling.
+
+superinstructions fuse common pairs: a named array and its subscript (LOAD_SUBSCRIPT),
+and an arithmetic or comparison operator with a literal right operand (ADD_CONST, SUB_CONST, LT_CONST, EQ_CONST).
+'''
+
+(CONST, LOAD, STORE, DECLARE, POP, SUBSCRIPT, LOAD_SUBSCRIPT, STORE_SUBSCRIPT, LIST,
+ ADD, SUB, MUL, MOD, DIV, FLOORDIV, LT, LE, GT, GE, EQ, NE, NOT, NEG,
+ ADD_CONST, SUB_CONST, LT_CONST, EQ_CONST,
+ JUMP, JUMP_IF_FALSE, AND_JUMP, OR_JUMP, CASE_TABLE, FOR_PREP, FOR_ITER,
+ CASE_TEST, CALL, RETURN, HALT, GARBAGE, INPUT, OUTPUT, OPEN, CLOSE, RAISE) = range(44)
+OPNAMES = """CONST LOAD STORE DECLARE POP SUBSCRIPT LOAD_SUBSCRIPT STORE_SUBSCRIPT LIST
+ADD SUB MUL MOD DIV FLOORDIV LT LE GT GE EQ NE NOT NEG
+ADD_CONST SUB_CONST LT_CONST EQ_CONST
+JUMP JUMP_IF_FALSE AND_JUMP OR_JUMP CASE_TABLE FOR_PREP FOR_ITER
+CASE_TEST CALL RETURN HALT GARBAGE INPUT OUTPUT OPEN CLOSE RAISE""".split()
+
+BINARY = {"+": ADD, "-": SUB, "*": MUL, "%": MOD, "<": LT, "<=": LE, ">": GT, ">=": GE, "=": EQ, "<>": NE}
+WITH_CONST = {ADD: ADD_CONST, SUB: SUB_CONST, LT: LT_CONST, EQ: EQ_CONST}
+END = object() # FOR_ITER's exhausted-iterator marker
+
+class VMProcedure:
+    '''a procedure's value: where its code starts and what its arguments are called'''
+    __slots__ = ("name", "params", "entry")
+    def __init__(self, name: str, params: tuple[str, ...], entry: int):
+        self.name = name
+        self.params = params
+        self.entry = entry
+    def __repr__(self) -> str:
+        return f"<procedure {self.name}>"
+
+class Code:
+    '''a compiled program'''
+    def __init__(self, ops: list[int], args: list, procedures: dict[str, VMProcedure]):
+        self.ops = ops
+        self.args = args
+        self.procedures = procedures
+    def dis(self) -> str:
+        '''a readable listing of the instructions'''
+        entries = dict((proc.entry, name) for name, proc in self.procedures.items())
+        lines = []
+        for pc, (op, arg) in enumerate(zip(self.ops, self.args)):
+            if pc in entries:
+                lines.append(f"{entries[pc]}:")
+            lines.append(f"{pc:>6} {OPNAMES[op]:<16} {'' if arg is None else repr(arg)}")
+        return "\n".join(lines)
+
+class Compiler(Visitor):
+    '''builds the Code of a checked tree'''
+    REQUIRED = TREE_KINDS
+    def __init__(self, tree, types: tuple):
+        self.tree = tree
+        self.checker = TypeChecker(types[0], types[1])
+        self.ops: list[int] = []
+        self.args: list = []
+    def emit(self, op: int, arg=None) -> int:
+        self.ops.append(op)
+        self.args.append(arg)
+        return len(self.ops) - 1
+    def here(self) -> int:
+        return len(self.ops)
+    def patch(self, at: int, target: int):
+        '''point the jump at AT to TARGET'''
+        arg = self.args[at]
+        self.args[at] = (arg[0], target) if isinstance(arg, tuple) else target
+    # FILE
+    def compile(self) -> Code:
+        self.declarations(self.tree["starts"][0]["body"]["declarations"])
+        self.statements(self.tree["starts"][0]["body"]["statements"])
+        self.emit(HALT)
+        procedures = {}
+        for proc in self.tree["procedures"]:
+            procedures[proc["name"]] = VMProcedure(proc["name"], tuple(arg["name"] for arg in proc["args"]), self.here())
+            self.checker.append(*procedure_scope(self.checker, proc))
+            self.declarations(proc["body"]["declarations"])
+            self.statements(proc["body"]["statements"])
+            self.checker.pop()
+            self.emit(RETURN)
+        return Code(self.ops, self.args, procedures)
+    def declarations(self, decls):
+        for decl in decls:
+            pred = decl["predicate"]
+            if decl["initial"] is not None:
+                self.expr(decl["initial"])
+            elif pred["suffixes"]:
+                for suff in pred["suffixes"]:
+                    if suff["size"] is None:
+                        self.emit(CONST, None)
+                    else:
+                        self.expr(suff["size"])
+                self.emit(GARBAGE, len(pred["suffixes"]))
+            else:
+                self.emit(CONST, None)
+            self.emit(DECLARE, pred["name"])
+    # STMT
+    def statements(self, stmts):
+        for stmt in stmts:
+            self.stmt(stmt)
+    def stmt(self, stmt):
+        if stmt is None:
+            return
+        handler = self.STMT.get(stmt["type"])
+        if handler is None:
+            raise NotImplementedError(f"statement type '{stmt['type']}'")
+        handler(self, stmt)
+    @handles("STMT", "body")
+    def c_body(self, stmt):
+        self.statements(stmt["statements"])
+    @handles("STMT", "if")
+    def c_if(self, stmt):
+        self.expr(stmt["condition"])
+        skip = self.emit(JUMP_IF_FALSE)
+        self.stmt(stmt["body"])
+        if stmt["else"] is None:
+            self.patch(skip, self.here())
+            return
+        done = self.emit(JUMP)
+        self.patch(skip, self.here())
+        self.stmt(stmt["else"])
+        self.patch(done, self.here())
+    @handles("STMT", "while")
+    def c_while(self, stmt):
+        top = self.here()
+        self.expr(stmt["condition"])
+        done = self.emit(JUMP_IF_FALSE)
+        self.stmt(stmt["body"])
+        self.emit(JUMP, top)
+        self.patch(done, self.here())
+    @handles("STMT", "do")
+    def c_do(self, stmt):
+        top = self.here()
+        self.stmt(stmt["body"])
+        self.expr(stmt["condition"])
+        self.emit(JUMP_IF_FALSE, top)
+    @handles("STMT", "for")
+    def c_for(self, stmt):
+        for part in stmt["range"]:
+            self.expr(part)
+        name = stmt["variable"]
+        prep = self.emit(FOR_PREP)
+        top = self.emit(FOR_ITER, (name, None))
+        self.checker.append({}, {name: static_type(self.checker, stmt["range"][0])})
+        self.stmt(stmt["body"])
+        self.checker.pop()
+        self.emit(JUMP, top)
+        self.patch(top, self.here())
+        self.patch(prep, self.here())
+    @handles("STMT", "case")
+    def c_case(self, stmt):
+        self.expr(stmt["variable"])
+        cases = list(stmt["cases"])
+        ends = []
+        if all(case["test"]["type"] in ("num", "float", "string", "bool") for case in cases):
+            table = {}
+            jump = self.emit(CASE_TABLE, (table, None))
+            for case in cases:
+                # the first of equal tests wins, as in the interpreter
+                table.setdefault(case["test"]["value"], self.here())
+                self.stmt(case["body"])
+                ends.append(self.emit(JUMP))
+            self.patch(jump, self.here())
+        else:
+            for case in cases:
+                # the value stays on the stack while it's compared; each branch starts by dropping it
+                self.atom(case["test"])
+                self.emit(CASE_TEST)
+                skip = self.emit(JUMP_IF_FALSE)
+                self.emit(POP)
+                self.stmt(case["body"])
+                ends.append(self.emit(JUMP))
+                self.patch(skip, self.here())
+            self.emit(POP)
+        self.stmt(stmt["default"])
+        for end in ends:
+            self.patch(end, self.here())
+    @handles("STMT", "set")
+    def c_set(self, stmt):
+        self.expr(stmt["expr"])
+        lval = stmt["lval"]
+        match lval["type"]:
+            case "variable":
+                name = lval["name"]
+                if name in BUILTINS:
+                    self.emit(RAISE, (TypeError, f"cannot assign to builtin constant {name}"))
+                else:
+                    self.emit(STORE, name)
+            case "subscript":
+                self.term(lval["head"])
+                self.expr(lval["index"])
+                self.emit(STORE_SUBSCRIPT)
+            case x:
+                raise NotImplementedError(f"lval type {repr(x)}")
+    @handles("STMT", "input")
+    def c_input(self, stmt):
+        names = tuple(stmt["values"])
+        if len(set(names)) != len(names):
+            self.emit(RAISE, (NameError, "cannot assign to the same variable multiple times in the same input statement"))
+            return
+        kinds = tuple(static_kind(self.checker, name) for name in names)
+        if stmt["file"] is not None:
+            self.atom(stmt["file"])
+        self.emit(INPUT, (names, kinds, stmt["file"] is not None))
+    @handles("STMT", "output")
+    def c_output(self, stmt):
+        for part in stmt["values"]:
+            self.expr(part)
+        if stmt["file"] is not None:
+            self.atom(stmt["file"])
+        self.emit(OUTPUT, (len(stmt["values"]), stmt["file"] is not None))
+    @handles("STMT", "open")
+    def c_open(self, stmt):
+        kind = static_kind(self.checker, stmt["name"])
+        if kind not in ("InputFile", "OutputFile"):
+            self.emit(RAISE, (TypeError, "unsupported file type"))
+            return
+        self.atom(stmt["path"])
+        self.emit(OPEN, (stmt["name"], "r" if kind == "InputFile" else "w"))
+    @handles("STMT", "close")
+    def c_close(self, stmt):
+        self.emit(CLOSE, stmt["name"])
+    @handles("STMT", "exprstmt")
+    def c_exprstmt(self, stmt):
+        self.expr(stmt["value"])
+        self.emit(POP)
+    # EXPR
+    def expr(self, expr):
+        handler = self.EXPR.get(expr["type"])
+        if handler is None:
+            return self.term(expr)
+        return handler(self, expr)
+    @handles("EXPR", "infix")
+    def c_infix(self, expr):
+        op = expr["operator"]
+        self.expr(expr["left"])
+        if op in ("AND", "OR"):
+            jump = self.emit(AND_JUMP if op == "AND" else OR_JUMP)
+            self.expr(expr["right"])
+            self.patch(jump, self.here())
+            return
+        right = expr["right"]
+        if op == "/":
+            left_type, right_type = static_type(self.checker, expr["left"]), static_type(self.checker, right)
+            self.expr(right)
+            self.emit(FLOORDIV if left_type is Basic("num") and right_type is Basic("num") else DIV)
+            return
+        if op not in BINARY:
+            raise NotImplementedError(f"infix '{op}' not implemented")
+        if BINARY[op] in WITH_CONST and right["type"] in ("num", "float", "string", "bool"):
+            self.emit(WITH_CONST[BINARY[op]], right["value"])
+            return
+        self.expr(right)
+        self.emit(BINARY[op])
+    @handles("EXPR", "prefix")
+    def c_prefix(self, expr):
+        self.expr(expr["right"])
+        match expr["operator"]:
+            case "NOT":
+                self.emit(NOT)
+            case "-":
+                self.emit(NEG)
+            case x:
+                raise NotImplementedError(f"prefix '{x}' not implemented")
+    def term(self, term):
+        suffixes = []
+        while term["type"] == "term":
+            suffixes.append(term["suffix"])
+            term = term["head"]
+        suffixes.reverse()
+        if suffixes and suffixes[0]["type"] == "subscript" and term["type"] == "name" and term["value"] not in BUILTINS:
+            # builtin calls have no side effects, so the index can't change what the name refers to
+            self.expr(suffixes[0]["value"])
+            self.emit(LOAD_SUBSCRIPT, term["value"])
+            suffixes = suffixes[1:]
+        else:
+            self.atom(term)
+        for suff in suffixes:
+            self.SUFFIX[suff["type"]](self, suff)
+    def atom(self, atom):
+        handler = self.ATOM.get(atom["type"])
+        if handler is None:
+            raise NotImplementedError(f"atom type {repr(atom['type'])}")
+        handler(self, atom)
+    @handles("ATOM", "num", "float", "string", "bool", "const")
+    def c_literal(self, atom):
+        self.emit(CONST, atom["value"])
+    @handles("ATOM", "name")
+    def c_name(self, atom):
+        name = atom["value"]
+        if name in BUILTINS:
+            self.emit(CONST, BUILTINS[name])
+        else:
+            self.emit(LOAD, name)
+    @handles("ATOM", "group")
+    def c_group(self, atom):
+        self.expr(atom["value"])
+    @handles("ATOM", "list")
+    def c_list(self, atom):
+        for e in atom["value"]:
+            self.expr(e)
+        self.emit(LIST, len(atom["value"]))
+    @handles("SUFFIX", "subscript")
+    def c_subscript(self, suff):
+        self.expr(suff["value"])
+        self.emit(SUBSCRIPT)
+    @handles("SUFFIX", "call")
+    def c_call(self, suff):
+        for arg in suff["value"]:
+            self.expr(arg)
+        self.emit(CALL, len(suff["value"]))
+
+class VM:
+    '''runs Code'''
+    def __init__(self, code: Code, runtime: Runtime=None):
+        self.code = code
+        self.runtime = Runtime() if runtime is None else runtime
+        self.frames: list[dict] = [{"eof": False}]
+    # NAMES, as Interpreter.read_var, get_var and assign_to_lval resolve them
+    def read(self, name: str):
+        for frame in reversed(self.frames):
+            if name in frame:
+                value = frame[name]
+                if value is None:
+                    raise NameError(f"{repr(name)} read before assignment")
+                return value
+        if name in self.code.procedures:
+            return self.code.procedures[name]
+        raise NameError(f"{repr(name)} referenced before declaration- how did this escape the typechecker?")
+    def write(self, name: str, value, strict: bool=False):
+        for frame in reversed(self.frames):
+            if name in frame:
+                frame[name] = value
+                return
+        if strict:
+            raise NameError(f"writing to undeclared variable {repr(name)}")
+    def variable(self, name: str):
+        for frame in reversed(self.frames):
+            if name in frame:
+                return frame[name]
+        raise NameError(f"writing to undeclared variable {repr(name)}")
+    def run(self):
+        '''execute the program, closing its open files if it fails'''
+        try:
+            self.execute()
+        except Exception as e:
+            for file in self.runtime.open_files.values():
+                file.close()
+            raise e
+    def execute(self):
+        ops, args = self.code.ops, self.code.args
+        frames = self.frames
+        runtime = self.runtime
+        read = self.read
+        stack = []
+        push, pop = stack.append, stack.pop
+        calls = []
+        pc = 0
+        while True:
+            op = ops[pc]
+            arg = args[pc]
+            pc += 1
+            if op == LOAD:
+                top = frames[-1]
+                value = top[arg] if arg in top else read(arg)
+                if value is None:
+                    raise NameError(f"{repr(arg)} read before assignment")
+                push(value)
+            elif op == CONST:
+                push(arg)
+            elif op == STORE:
+                top = frames[-1]
+                if arg in top:
+                    top[arg] = pop()
+                else:
+                    self.write(arg, pop())
+            elif op == LOAD_SUBSCRIPT:
+                top = frames[-1]
+                value = top[arg] if arg in top else read(arg)
+                if value is None:
+                    raise NameError(f"{repr(arg)} read before assignment")
+                stack[-1] = value[stack[-1]]
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == ADD_CONST:
+                stack[-1] = stack[-1] + arg
+            elif op == LT_CONST:
+                stack[-1] = stack[-1] < arg
+            elif op == EQ_CONST:
+                stack[-1] = stack[-1] == arg
+            elif op == SUB_CONST:
+                stack[-1] = stack[-1] - arg
+            elif op == FOR_ITER:
+                iterator, frame = stack[-1]
+                value = next(iterator, END)
+                if value is END:
+                    pop()
+                    # the interpreter sets the loop variable's slot to UNBOUND once the loop has run, so it reads as unset
+                    frame.pop(arg[0], None)
+                    pc = arg[1]
+                else:
+                    frame[arg[0]] = value
+            elif op == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == MOD:
+                right = pop()
+                stack[-1] = stack[-1] % right
+            elif op == FLOORDIV:
+                right = pop()
+                stack[-1] = stack[-1] // right
+            elif op == DIV:
+                right = pop()
+                stack[-1] = Runtime.div(stack[-1], right)
+            elif op == LT:
+                right = pop()
+                stack[-1] = stack[-1] < right
+            elif op == LE:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+            elif op == GT:
+                right = pop()
+                stack[-1] = stack[-1] > right
+            elif op == GE:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+            elif op == EQ:
+                right = pop()
+                stack[-1] = stack[-1] == right
+            elif op == NE:
+                right = pop()
+                stack[-1] = stack[-1] != right
+            elif op == SUBSCRIPT:
+                index = pop()
+                stack[-1] = stack[-1][index]
+            elif op == STORE_SUBSCRIPT:
+                index = pop()
+                head = pop()
+                head[index] = pop()
+            elif op == AND_JUMP:
+                # false AND x -> false; true AND x -> x
+                if stack[-1] == False:
+                    pc = arg
+                else:
+                    pop()
+            elif op == OR_JUMP:
+                # true OR x -> true; false OR x -> x
+                if stack[-1] == True:
+                    pc = arg
+                else:
+                    pop()
+            elif op == NOT:
+                stack[-1] = not stack[-1]
+            elif op == NEG:
+                stack[-1] = -stack[-1]
+            elif op == CALL:
+                if arg:
+                    values = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    values = []
+                head = pop()
+                if type(head) is VMProcedure:
+                    frames.append(dict(zip(head.params, values)))
+                    calls.append(pc)
+                    pc = head.entry
+                else:
+                    push(head(*values))
+            elif op == RETURN:
+                frames.pop()
+                pc = calls.pop()
+                push(None)
+            elif op == POP:
+                pop()
+            elif op == LIST:
+                if arg:
+                    values = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    values = []
+                push(values)
+            elif op == CASE_TEST:
+                # the case value stays under its test
+                stack[-1] = stack[-1] == stack[-2]
+            elif op == CASE_TABLE:
+                table, default = arg
+                value = pop()
+                try:
+                    pc = table.get(value, default)
+                except TypeError: # unhashable
+                    pc = default
+            elif op == FOR_PREP:
+                step = pop()
+                stop = pop()
+                start = pop()
+                values = Runtime.steps(start, stop, step)
+                if values:
+                    push((iter(values), frames[-1]))
+                else:
+                    pc = arg
+            elif op == DECLARE:
+                frames[-1][arg] = pop()
+            elif op == GARBAGE:
+                sizes = stack[-arg:]
+                del stack[-arg:]
+                push(Runtime.garbage(sizes))
+            elif op == OUTPUT:
+                count, to_file = arg
+                file = pop() if to_file else None
+                parts = stack[len(stack)-count:]
+                del stack[len(stack)-count:]
+                if to_file:
+                    runtime.write(parts, file)
+                else:
+                    runtime.print(*parts)
+            elif op == INPUT:
+                names, kinds, from_file = arg
+                for name in names:
+                    self.variable(name)
+                if not from_file:
+                    self.write(names[0], runtime.read_console(kinds), True)
+                    continue
+                values = runtime.read_file(pop(), kinds)
+                if values is None:
+                    self.write("eof", True, True)
+                    continue
+                for name, value in zip(names, values):
+                    self.write(name, value, True)
+            elif op == OPEN:
+                name, mode = arg
+                path = pop()
+                if path in runtime.open_files:
+                    raise PermissionError("cannot open a file while it's open")
+                self.variable(name)
+                self.write(name, runtime.open(path, mode), True)
+            elif op == CLOSE:
+                runtime.close(self.variable(arg))
+            elif op == RAISE:
+                error, message = arg
+                raise error(message)
+            elif op == HALT:
+                return
+            else:
+                raise NotImplementedError(f"opcode {op}")
+
+def compile_program(tree, types: tuple) -> Code:
+    '''the Code of TREE, checked with TYPES (as TypeChecker.check_file returns them)'''
+    return Compiler(tree, types).compile()
+
+def run(tree, types: tuple, interpreter: type=Interpreter):
+    '''run TREE on the VM, as Interpreter(TREE).start() would'''
+    VM(compile_program(tree, types), Runtime(interpreter)).run()